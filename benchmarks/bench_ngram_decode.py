@@ -0,0 +1,59 @@
+"""Benchmark decoding ``{"word period": frequency}`` payloads from the ``/ngram_*`` endpoints.
+
+Compares the ``from_dict`` / ``MultiIndex`` / ``pd.concat`` decoding that
+``ngram_book``, ``ngram_periodicals`` and ``ngram_news`` used to have with
+``dhlab.api.dhlab_api._decode_word_periods``.
+
+Run with ``python benchmarks/bench_ngram_decode.py [n_words] [n_periods] [density]``.
+"""
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from dhlab.api.dhlab_api import _decode_word_periods
+
+
+def legacy_decode(payload):
+    """The previous implementation, one ``.loc`` lookup per word."""
+    df = pd.DataFrame.from_dict(payload, orient="index")
+    df.index = df.index.map(lambda x: tuple(x.split()))
+    columns = df.index.levels[0]
+    df = pd.concat([df.loc[x] for x in columns], axis=1)
+    df.columns = columns
+    return df
+
+
+def make_payload(n_words, n_periods, density, seed=0):
+    rng = np.random.default_rng(seed)
+    payload = {}
+    for word in range(n_words):
+        periods = np.flatnonzero(rng.random(n_periods) < density)
+        for period, freq in zip(periods, rng.integers(1, 1000, size=len(periods)).tolist()):
+            payload[f"w{word} {1800 + period}"] = freq
+    return payload
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main(n_words=500, n_periods=220, density=0.8):
+    payload = make_payload(int(n_words), int(n_periods), float(density))
+    print(f"{n_words} words, {n_periods} periods, {len(payload)} counts")
+
+    new, new_time = timed(_decode_word_periods, payload)
+    print(f"vectorized: {new_time:8.3f} s")
+    old, old_time = timed(legacy_decode, payload)
+    print(f"legacy:     {old_time:8.3f} s  ({old_time / new_time:.0f}x slower)")
+
+    old = old.loc[new.index, new.columns]
+    assert np.array_equal(old.to_numpy(), new.to_numpy(), equal_nan=True), "results differ"
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,65 @@
+"""Benchmark building a sparse word by document frame from ``/frequencies`` counts.
+
+Compares the per-document ``pd.Series`` implementation that
+``dhlab.api.dhlab_api._create_sparse_matrix`` used to have with the
+vectorized :py:class:`dhlab.api.sparse.SparseCounts` builder.
+
+Run with ``python benchmarks/bench_sparse_matrix.py [n_docs] [words_per_doc] [vocab_size]``.
+"""
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from pandas import SparseDtype
+
+from dhlab.api.dhlab_api import _create_sparse_matrix
+
+
+def legacy_create_sparse_matrix(structure):
+    """The previous implementation, one dense reindexed Series per document."""
+    all_words = list(set(word for dct in structure.values() for word in dct))
+    sparse_cols = {}
+    for dhlabid, wordfreqs in structure.items():
+        sparse_cols[dhlabid] = (
+            pd.Series(wordfreqs, index=all_words, dtype=int).fillna(0).astype(SparseDtype(int, 0))
+        )
+    return pd.DataFrame(sparse_cols)
+
+
+def make_structure(n_docs, words_per_doc, vocab_size, seed=0):
+    rng = np.random.default_rng(seed)
+    vocab = np.array([f"w{i}" for i in range(vocab_size)], dtype=object)
+    # Zipf-like word distribution, like real text
+    probs = 1 / np.arange(1, vocab_size + 1)
+    probs /= probs.sum()
+    structure = {}
+    for doc in range(n_docs):
+        words = np.unique(rng.choice(vocab, size=words_per_doc, p=probs))
+        structure[100000000 + doc] = dict(zip(words, rng.integers(1, 100, size=len(words)).tolist()))
+    return structure
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main(n_docs=1000, words_per_doc=500, vocab_size=50000):
+    structure = make_structure(n_docs, words_per_doc, vocab_size)
+    nnz = sum(len(d) for d in structure.values())
+    print(f"{n_docs} documents, {nnz} counts, vocabulary {vocab_size}")
+
+    new, new_time = timed(_create_sparse_matrix, structure)
+    print(f"vectorized: {new_time:8.3f} s")
+    old, old_time = timed(legacy_create_sparse_matrix, structure)
+    print(f"legacy:     {old_time:8.3f} s  ({old_time / new_time:.0f}x slower)")
+
+    old = old.loc[new.index, new.columns]
+    assert (old.sparse.to_coo() != new.sparse.to_coo()).nnz == 0, "results differ"
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -31,7 +31,11 @@ from .text.conc_coll import (
     Concordance as Concordance,
     Counts as Counts,
 )
-from .text.corpus import Corpus as Corpus
+from .text.corpus import (
+    Corpus as Corpus,
+    CorpusBuilder as CorpusBuilder,
+    LazyCorpus as LazyCorpus,
+)
 from .text.dispersion import Dispersion as Dispersion
 from .text.geo_data import GeoData as GeoData
 from .text.parse import (
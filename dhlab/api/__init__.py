@@ -5,9 +5,15 @@ import lazy_loader # See `dhlab/__init__.py`
 __getattr__, __dir__, _ = lazy_loader.attach(
     __name__,
     submodules = [
+        "aio",
+        "cache",
         "dhlab_api",
         "nb_ngram_api",
         "nb_search_api",
+        "ratelimit",
+        "sharding",
+        "sparse",
+        "streaming",
         "utils",
     ]
 )
@@ -0,0 +1,185 @@
+"""Asyncio versions of the core :py:mod:`dhlab.api.dhlab_api` functions.
+
+The coroutines return the same DataFrames as their blocking counterparts, and
+run the requests on a bounded pool of worker threads sharing the pooled
+session from :py:mod:`dhlab.api.utils`. At most :func:`get_concurrency`
+requests are in flight at the same time, so many calls can be gathered at once:
+
+.. code-block:: python
+
+    import asyncio
+    from dhlab.api import aio
+
+    async def main(urns):
+        return await asyncio.gather(*[aio.get_metadata(urns=[urn]) for urn in urns])
+
+    frames = asyncio.run(main(urns))
+"""
+
+import asyncio
+import functools
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple, Union
+
+from pandas import DataFrame, Series
+
+from dhlab.api import dhlab_api
+from dhlab.api.utils import session_manager
+
+_lock = threading.Lock()
+_concurrency = session_manager.pool_maxsize
+_executor: ThreadPoolExecutor | None = None
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def set_concurrency(limit: int) -> None:
+    """Set the max number of concurrent requests.
+
+    The connection pool of the shared session is enlarged if it is smaller than ``limit``.
+    Calls that are already running, or waiting, finish on the old worker threads and
+    session, which are retired once they are done; new calls use the new limit.
+    """
+    global _concurrency, _executor
+    if limit < 1:
+        raise ValueError("`limit` must be a positive integer")
+    with _lock:
+        _concurrency = limit
+        retired, _executor = _executor, None
+        _semaphores.clear()
+    if retired is not None:
+        # lets the submitted calls finish, then stops the threads
+        retired.shutdown(wait=False)
+    if session_manager.pool_maxsize < limit:
+        session_manager.configure(pool_maxsize=limit, close_current=False)
+
+
+def get_concurrency() -> int:
+    """The max number of concurrent requests."""
+    return _concurrency
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_concurrency, thread_name_prefix="dhlab-aio")
+        return _executor
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    # A semaphore is bound to the event loop it is first used in
+    loop = asyncio.get_running_loop()
+    with _lock:
+        if loop not in _semaphores:
+            _semaphores[loop] = asyncio.Semaphore(_concurrency)
+        return _semaphores[loop]
+
+
+async def _call(func, *args, **kwargs):
+    async with _get_semaphore():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), functools.partial(func, *args, **kwargs))
+
+
+async def concordance(
+    urns: list | None = None, words: str | None = None, window: int = 25, limit: int = 100
+) -> DataFrame:
+    """Async version of :func:`dhlab.api.dhlab_api.concordance`."""
+    return await _call(dhlab_api.concordance, urns=urns, words=words, window=window, limit=limit)
+
+
+async def get_document_frequencies(
+    urns: List[str], cutoff: int = 0, words: List[str] | None = None, sparse: bool = False
+) -> DataFrame:
+    """Async version of :func:`dhlab.api.dhlab_api.get_document_frequencies`."""
+    return await _call(
+        dhlab_api.get_document_frequencies, urns=urns, cutoff=cutoff, words=words, sparse=sparse
+    )
+
+
+async def urn_collocation(
+    urns: List[str] | None = None,
+    word: str = "arbeid",
+    before: int = 5,
+    after: int = 0,
+    samplesize: int = 200000,
+) -> DataFrame:
+    """Async version of :func:`dhlab.api.dhlab_api.urn_collocation`."""
+    return await _call(
+        dhlab_api.urn_collocation,
+        urns=urns,
+        word=word,
+        before=before,
+        after=after,
+        samplesize=samplesize,
+    )
+
+
+async def get_metadata(
+    urns: List[str] | None = None, dhlabids: List[int] | None = None
+) -> DataFrame:
+    """Async version of :func:`dhlab.api.dhlab_api.get_metadata`."""
+    return await _call(dhlab_api.get_metadata, urns=urns, dhlabids=dhlabids)
+
+
+async def ngram_book(
+    word: Union[List, str] = ["."],
+    title: str | None = None,
+    period: Tuple[int, int] | None = None,
+    publisher: str | None = None,
+    lang: str | None = None,
+    city: str | None = None,
+    ddk: str | None = None,
+    topic: str | None = None,
+) -> DataFrame:
+    """Async version of :func:`dhlab.api.dhlab_api.ngram_book`."""
+    return await _call(
+        dhlab_api.ngram_book,
+        word=word,
+        title=title,
+        period=period,
+        publisher=publisher,
+        lang=lang,
+        city=city,
+        ddk=ddk,
+        topic=topic,
+    )
+
+
+async def ngram_news(
+    word: Union[List, str] = ["."],
+    title: str | None = None,
+    period: Tuple[int, int] | None = None,
+) -> DataFrame:
+    """Async version of :func:`dhlab.api.dhlab_api.ngram_news`."""
+    return await _call(dhlab_api.ngram_news, word=word, title=title, period=period)
+
+
+async def get_dispersion(
+    urn: str | None = None,
+    words: List | None = None,
+    window: int = 300,
+    pr: int = 100,
+) -> Series:
+    """Async version of :func:`dhlab.api.dhlab_api.get_dispersion`."""
+    return await _call(dhlab_api.get_dispersion, urn=urn, words=words, window=window, pr=pr)
+
+
+async def geo_lookup(
+    places: List,
+    feature_class: str | None = None,
+    feature_code: str | None = None,
+    field: str = "alternatename",
+) -> DataFrame:
+    """Async version of :func:`dhlab.api.dhlab_api.geo_lookup`."""
+    return await _call(
+        dhlab_api.geo_lookup,
+        places,
+        feature_class=feature_class,
+        feature_code=feature_code,
+        field=field,
+    )
@@ -0,0 +1,224 @@
+"""Opt-in, persistent cache of DHLAB API responses.
+
+Responses are stored in a local SQLite file, keyed on the request method,
+URL and the canonicalized query parameters and JSON body. Enable it with
+:func:`enable_cache`; every call through :func:`dhlab.api.utils.api_request`
+is then served from disk when an identical request has been made before.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from dhlab.constants import BASE_URL, CACHE_PATH
+
+
+def endpoint_name(url: str) -> str:
+    """Name of the endpoint of ``url``, e.g. ``"/frequencies"`` for ``f"{BASE_URL}/frequencies"``."""
+    if url.startswith(BASE_URL):
+        return url[len(BASE_URL):].split("?")[0] or "/"
+    return urlsplit(url).path or "/"
+
+
+def endpoint_matches(endpoint: str, names) -> bool:
+    """Check if ``endpoint`` is one of ``names``, or a sub-path of one, like ``"/totals/50"`` of ``"/totals"``."""
+    return any(endpoint == name or endpoint.startswith(name.rstrip("/") + "/") for name in names)
+
+
+class ResponseCache:
+    """Response cache stored in a SQLite file.
+
+    :param str path: Path to the SQLite file. Defaults to :py:obj:`~dhlab.constants.CACHE_PATH`.
+    :param ttl: Seconds before an entry expires. ``None`` means entries never expire.
+    :param int max_size: Max total size in bytes of the cached responses.
+        The least recently used entries are evicted first.
+    :param endpoints: Only cache these endpoints, e.g. ``["/frequencies", "/get_metadata"]``.
+        Defaults to all endpoints.
+    """
+
+    def __init__(
+        self,
+        path: str | None = None,
+        ttl: float | None = 7 * 24 * 3600,
+        max_size: int = 1024**3,
+        endpoints: list[str] | None = None,
+    ):
+        self.path = CACHE_PATH if path is None else path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.endpoints = None if endpoints is None else set(endpoints)
+        self.disabled_endpoints = set()
+
+        self._lock = threading.Lock()
+        self._hits = {}
+        self._misses = {}
+
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, endpoint TEXT, url TEXT, headers TEXT,"
+                " content BLOB, size INTEGER, created REAL, accessed REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    def enable_endpoint(self, endpoint: str) -> None:
+        """Cache responses from ``endpoint``."""
+        self.disabled_endpoints.discard(endpoint)
+        if self.endpoints is not None:
+            self.endpoints.add(endpoint)
+
+    def disable_endpoint(self, endpoint: str) -> None:
+        """Stop caching responses from ``endpoint``."""
+        self.disabled_endpoints.add(endpoint)
+
+    def is_enabled_for(self, url: str) -> bool:
+        """Check if responses from the endpoint of ``url`` are cached."""
+        endpoint = endpoint_name(url)
+        if endpoint_matches(endpoint, self.disabled_endpoints):
+            return False
+        return self.endpoints is None or endpoint_matches(endpoint, self.endpoints)
+
+    @staticmethod
+    def make_key(method: str, url: str, params: dict | None = None, json_body=None) -> str:
+        """Hash of the request, independent of the key order of ``params`` and ``json_body``."""
+        canonical = json.dumps(
+            [method.upper(), url, params, json_body],
+            sort_keys=True,
+            separators=(",", ":"),
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, method: str, url: str, params: dict | None = None, json_body=None) -> requests.Response | None:
+        """Look up a cached response. Returns ``None`` on a miss."""
+        key = self.make_key(method, url, params, json_body)
+        endpoint = endpoint_name(url)
+        now = time.time()
+
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT url, headers, content, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl is not None and now - row[3] > self.ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self._misses[endpoint] = self._misses.get(endpoint, 0) + 1
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._hits[endpoint] = self._hits.get(endpoint, 0) + 1
+
+        cached_url, headers, content, _ = row
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.url = cached_url
+        response.headers = CaseInsensitiveDict(json.loads(headers))
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response._content = bytes(content)
+        response._content_consumed = True
+        return response
+
+    def set(
+        self, method: str, url: str, params: dict | None, json_body, response: requests.Response
+    ) -> None:
+        """Store a successful response, evicting the least recently used entries if needed."""
+        key = self.make_key(method, url, params, json_body)
+        content = response.content
+        headers = {k: v for k, v in response.headers.items() if k.lower() == "content-type"}
+        now = time.time()
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, endpoint_name(url), response.url or url, json.dumps(headers),
+                 sqlite3.Binary(content), len(content), now, now),
+            )
+            self._evict()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_size:
+            return
+        stale = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed ASC"):
+            if total <= self.max_size:
+                break
+            stale.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+
+    def stats(self) -> dict:
+        """Hits and misses since the cache was opened, and the current number and size of entries."""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+            endpoints = sorted(set(self._hits) | set(self._misses))
+            return {
+                "hits": sum(self._hits.values()),
+                "misses": sum(self._misses.values()),
+                "entries": entries,
+                "size": size,
+                "endpoints": {
+                    e: {"hits": self._hits.get(e, 0), "misses": self._misses.get(e, 0)}
+                    for e in endpoints
+                },
+            }
+
+    def clear(self) -> None:
+        """Delete all cached responses."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_cache: ResponseCache | None = None
+
+
+def enable_cache(
+    path: str | None = None,
+    ttl: float | None = 7 * 24 * 3600,
+    max_size: int = 1024**3,
+    endpoints: list[str] | None = None,
+) -> ResponseCache:
+    """Cache API responses on disk. See :py:class:`ResponseCache` for the parameters."""
+    global _cache
+    disable_cache()
+    _cache = ResponseCache(path=path, ttl=ttl, max_size=max_size, endpoints=endpoints)
+    return _cache
+
+
+def disable_cache() -> None:
+    """Stop caching API responses. The cache file is kept on disk."""
+    global _cache
+    if _cache is not None:
+        _cache.close()
+    _cache = None
+
+
+def get_cache() -> ResponseCache | None:
+    """The active response cache, or ``None`` if caching is disabled."""
+    return _cache
+
+
+def cache_stats() -> dict:
+    """Hit/miss statistics of the active response cache."""
+    if _cache is None:
+        return {}
+    return _cache.stats()
@@ -1,13 +1,28 @@
+from array import array
 from io import StringIO
-from typing import Dict, List, Tuple, Union, Optional
+from typing import Dict, Iterator, List, Tuple, Union, Optional
 
+import numpy as np
 import pandas as pd
 
 # from requests import HTTPError, JSONDecodeError, ConnectionError
-from pandas import DataFrame, Series, SparseDtype
+from pandas import DataFrame, Series
 
 from dhlab.constants import BASE_URL
 from dhlab.api.utils import api_get, api_post, DHLabApiError
+from dhlab.api.sharding import (
+    concat_frames,
+    concat_lists,
+    fan_out,
+    iter_fan_out,
+    run_sharded,
+    shard,
+    sharding_settings,
+    shard_terms,
+    split_samplesize,
+)
+from dhlab.api.sparse import SparseCounts
+from dhlab.api.streaming import iter_array_items, iter_text, read_frame
 
 pd.options.display.max_rows = 100
 
@@ -191,14 +206,17 @@ def get_metadata(
     """
 
     if dhlabids is not None:
-        payload = {"dhlabids": dhlabids}
+        key, identifiers = "dhlabids", dhlabids
     elif urns is not None:
-        payload = {"urns": urns}
+        key, identifiers = "urns", urns
     else:
         raise ValueError("You must provide either `urns` or `dhlabids`")
 
-    r = api_post(f"{BASE_URL}/get_metadata", json=payload)
-    return DataFrame(r.json())
+    def request(batch):
+        r = api_post(f"{BASE_URL}/get_metadata", json={key: batch})
+        return DataFrame(r.json())
+
+    return run_sharded(request, identifiers, concat_frames, desc="get_metadata")
 
 
 def get_identifiers(identifiers: list | None = None) -> list:
@@ -260,11 +278,13 @@ def evaluate_documents(wordbags: Dict | None = None, urns: List[str] | None = No
     :return: a ``pandas.DataFrame`` with the topics as columns, indexed by the dhlabids of the
         documents.
     """
-    res = api_post(
-        f"{BASE_URL}/evaluate", json={"wordbags": wordbags, "urns": urns}
-    )
-    df = pd.DataFrame(res.json()).transpose()
-    return df
+    def request(batch):
+        res = api_post(
+            f"{BASE_URL}/evaluate", json={"wordbags": wordbags, "urns": batch}
+        )
+        return pd.DataFrame(res.json()).transpose()
+
+    return run_sharded(request, urns, pd.concat, desc="evaluate")
 
 
 def get_reference(
@@ -314,6 +334,33 @@ def find_urns(docids: Union[Dict, DataFrame] | None = None, mode: str = "json")
     return pd.DataFrame.from_dict(resp.json(), orient="index", columns=["urn"])
 
 
+def _decode_word_periods(payload: Dict[str, float]) -> DataFrame:
+    """Pivot a ``{"word period": frequency}`` payload from the ``/ngram_*`` endpoints
+    into a frame with one row per period and one column per word.
+
+    The keys are split at the last space in one array operation, words and
+    periods are factorized to integer codes, and the frequencies are placed in
+    a preallocated array. Periods are sorted, words are in alphabetical order,
+    and missing counts are ``nan``.
+    """
+    if not payload:
+        # none of the words were found
+        return DataFrame()
+    keys = np.array(list(payload), dtype=str)
+    words, separators, periods = np.char.rpartition(keys, " ").T
+    if (separators == "").any():
+        raise DHLabApiError("Expected an ngram payload keyed by 'word period'")
+
+    word_codes, word_index = pd.factorize(words, sort=True)
+    period_codes, period_index = pd.factorize(periods, sort=True)
+    values = np.full((len(period_index), len(word_index)), np.nan)
+    values[period_codes, word_codes] = np.fromiter(payload.values(), dtype=float, count=len(payload))
+    return DataFrame(values, index=pd.Index(period_index), columns=pd.Index(word_index))
+
+
+NGRAM_DOC_BATCH_SIZE = 50  #: Max number of words in one request to the ``/ngram_*`` endpoints
+
+
 def _ngram_doc(
     doctype: str = "",
     word: List | str | None = None,
@@ -324,6 +371,8 @@ def _ngram_doc(
     city: str | None = None,
     ddk: str | None = None,
     topic: str | None = None,
+    batch_size: int = NGRAM_DOC_BATCH_SIZE,
+    max_workers: int | None = None,
 ) -> DataFrame:
     """Count occurrences of one or more words over a time period.
 
@@ -331,6 +380,9 @@ def _ngram_doc(
     Filter the selection of documents with metadata.
     Use % as wildcard where appropriate - no wildcards in `word` or `lang`.
 
+    Long word lists are split into batches of `batch_size` words, which are
+    requested concurrently and joined on the time period.
+
     Args:
         doctype: API endpoint for the document type to get ngrams for.
             Can be `'book'`, `'periodicals'`, or `'newspapers'`.
@@ -344,6 +396,8 @@ def _ngram_doc(
         city: City of publication.
         ddk: [Dewey Decimal Classification](https://no.wikipedia.org/wiki/Deweys_desimalklassifikasjon) identifier.
         topic: Topic of the documents.
+        batch_size: Max number of words per request.
+        max_workers: Number of batches requested concurrently.
 
     Returns:
         a `pandas.DataFrame` with the resulting frequency counts of the word(s),
@@ -351,23 +405,24 @@ def _ngram_doc(
     """
     if word is None:
         word = ["."]
-
-    params = {"doctype": doctype, "word": word, "title": title, "period": period,
-              "publisher": publisher, "lang": lang, "city": city, "ddk": ddk, "topic": topic}
     if isinstance(word, str):
         # assume a comma separated string
         word = [w.strip() for w in word.split(",")]
-    params["word"] = tuple(word)
+    words = list(dict.fromkeys(word))
+
+    params = {"title": title, "period": period, "publisher": publisher,
+              "lang": lang, "city": city, "ddk": ddk, "topic": topic}
     params = {x: params[x] for x in params if params[x] is not None}
-    r = api_post(BASE_URL + "/ngram_" + doctype, json=params)
-    df = pd.DataFrame.from_dict(r.json(), orient="index")
-    df.index = df.index.map(lambda x: tuple(x.split()))
-    if not isinstance(df.index, pd.MultiIndex):
-        raise DHLabApiError(f"{isinstance(df.index, pd.MultiIndex)=}")
-    columns = df.index.levels[0]
-    df = pd.concat([df.loc[x] for x in columns], axis=1)
-    df.columns = columns
-    return df
+
+    def request(batch):
+        r = api_post(BASE_URL + "/ngram_" + doctype, json={"word": tuple(batch), **params})
+        return _decode_word_periods(r.json())
+
+    batches = shard_terms(words, batch_size)
+    if len(batches) <= 1:
+        return request(words)
+    frames = fan_out(request, batches, max_workers=max_workers, desc="ngram_" + doctype)
+    return pd.concat(frames, axis=1).sort_index().sort_index(axis=1)
 
 
 def reference_words(
@@ -413,6 +468,8 @@ def ngram_book(
     city: str | None = None,
     ddk: str | None = None,
     topic: str | None = None,
+    batch_size: int = NGRAM_DOC_BATCH_SIZE,
+    max_workers: int | None = None,
 ) -> DataFrame:
     """Count occurrences of one or more words in books over a given time period.
 
@@ -435,25 +492,17 @@ def ngram_book(
     :param str ddk: `Dewey Decimal Classification
         <https://no.wikipedia.org/wiki/Deweys_desimalklassifikasjon>`_ identifier.
     :param str topic: Topic of the documents.
+    :param int batch_size: max number of words per request.
+        Longer word lists are requested concurrently in batches.
+    :param int max_workers: number of batches requested concurrently.
     :return: a ``pandas.DataFrame`` with the resulting frequency counts of the word(s),
         spread across years. One year per row.
     """
-    params = {"word": word, "title": title, "period": period, "publisher": publisher,
-              "lang": lang, "city": city, "ddk": ddk, "topic": topic}
-    if isinstance(word, str):
-        # assume a comma separated string
-        word = [w.strip() for w in word.split(",")]
-    params["word"] = tuple(word)
-    params = {x: params[x] for x in params if params[x] is not None}
-    r = api_post(BASE_URL + "/ngram_book", json=params)
-    df = pd.DataFrame.from_dict(r.json(), orient="index")
-    df.index = df.index.map(lambda x: tuple(x.split()))
-    if not isinstance(df.index, pd.MultiIndex):
-        raise DHLabApiError(f"{isinstance(df.index, pd.MultiIndex)=}")
-    columns = df.index.levels[0]
-    df = pd.concat([df.loc[x] for x in columns], axis=1)
-    df.columns = columns
-    return df
+    return _ngram_doc(
+        "book", word=word, title=title, period=period, publisher=publisher,
+        lang=lang, city=city, ddk=ddk, topic=topic,
+        batch_size=batch_size, max_workers=max_workers,
+    )
 
 
 # @_docstring_parameters_from(_ngram_doc, drop="doctype")
@@ -466,6 +515,8 @@ def ngram_periodicals(
     city: str | None = None,
     ddk: str | None = None,
     topic: str | None = None,
+    batch_size: int = NGRAM_DOC_BATCH_SIZE,
+    max_workers: int | None = None,
     **kwargs,
 ) -> DataFrame:
     """Get a time series of frequency counts for ``word`` in periodicals.
@@ -486,31 +537,25 @@ def ngram_periodicals(
     :param str ddk: `Dewey Decimal Classification
         <https://no.wikipedia.org/wiki/Deweys_desimalklassifikasjon>`_ identifier.
     :param str topic: Topic of the documents.
+    :param int batch_size: max number of words per request.
+        Longer word lists are requested concurrently in batches.
+    :param int max_workers: number of batches requested concurrently.
     :return: a ``pandas.DataFrame`` with the resulting frequency counts of the word(s),
         spread across years. One year per row.
     """
-    params = {"word": word, "title": title, "period": period, "publisher": publisher,
-              "lang": lang, "city": city, "ddk": ddk, "topic": topic}
-    if isinstance(word, str):
-        # assume a comma separated string
-        word = [w.strip() for w in word.split(",")]
-    params["word"] = tuple(word)
-    params = {x: params[x] for x in params if params[x] is not None}
-    r = api_post(BASE_URL + "/ngram_periodicals", json=params)
-    df = pd.DataFrame.from_dict(r.json(), orient="index")
-    df.index = df.index.map(lambda x: tuple(x.split()))
-    if not isinstance(df.index, pd.MultiIndex):
-        raise DHLabApiError(f"{isinstance(df.index, pd.MultiIndex)=}")
-    columns = df.index.levels[0]
-    df = pd.concat([df.loc[x] for x in columns], axis=1)
-    df.columns = columns
-    return df
+    return _ngram_doc(
+        "periodicals", word=word, title=title, period=period, publisher=publisher,
+        lang=lang, city=city, ddk=ddk, topic=topic,
+        batch_size=batch_size, max_workers=max_workers,
+    )
 
 
 def ngram_news(
     word: Union[List, str] = ["."],
     title: str | None = None,
     period: Tuple[int, int] | None = None,
+    batch_size: int = NGRAM_DOC_BATCH_SIZE,
+    max_workers: int | None = None,
 ) -> DataFrame:
     """Get a time series of frequency counts for ``word`` in newspapers.
 
@@ -524,45 +569,91 @@ def ngram_news(
     :param period: Start and end years or dates of a time period,
         given as ``(YYYY, YYYY)`` or ``(YYYYMMDD, YYYYMMDD)``.
     :type period: tuple of ints
+    :param int batch_size: max number of words per request.
+        Longer word lists are requested concurrently in batches.
+    :param int max_workers: number of batches requested concurrently.
     :return: a ``pandas.DataFrame`` with the resulting frequency counts of the word(s),
         spread across the dates given in the time period. Either one year or one day per row.
     """
-    params = {"word": word, "title": title, "period": period}
-    if isinstance(word, str):
-        # assume a comma separated string
-        word = [w.strip() for w in word.split(",")]
-    params["word"] = tuple(word)
-    params = {x: params[x] for x in params if params[x] is not None}
-    r = api_post(BASE_URL + "/ngram_newspapers", json=params)
-    df = pd.DataFrame.from_dict(r.json(), orient="index")
-    df.index = df.index.map(lambda x: tuple(x.split()))
-    if not isinstance(df.index, pd.MultiIndex):
-        raise DHLabApiError(f"{isinstance(df.index, pd.MultiIndex)=}")
-    columns = df.index.levels[0]
-    df = pd.concat([df.loc[x] for x in columns], axis=1)
-    df.columns = columns
-    return df
+    return _ngram_doc(
+        "newspapers", word=word, title=title, period=period,
+        batch_size=batch_size, max_workers=max_workers,
+    )
 
 def _create_sparse_matrix(structure: dict[str, dict[str, int]]):
-    """Create a sparse DataFrame from an API counts object."""
+    """Create a sparse DataFrame from an API counts object.
 
-    # TODO: This should maybe be sorted
-    all_words = list(set(word for dct in structure.values() for word in dct))
+    The words are mapped to integer ids once, and the frame is assembled from
+    flat (word, document, frequency) arrays without densifying any column.
+    """
+    return SparseCounts.from_dict(structure).to_frame()
 
-    # sparse_cols: {dhlabid: sparse_series, ...}
-    # https://pandas.pydata.org/docs/reference/api/pandas.SparseDtype.html
-    sparse_cols = {}
 
-    for dhlabid, wordfreqs in structure.items():
-        sparse_cols[dhlabid] = pd.Series(
-            wordfreqs,
-            index=all_words,
-            dtype=int # See below
-        # SparseDtype(int) does not allow NaN. Convert NaN to 0 first.
-        ).fillna(0).astype(SparseDtype(int, 0))
+class _FrequencyTriplets:
+    """Flat ``(dhlabid, word, frequency)`` arrays from a ``/frequencies`` response.
 
-    # Sparse DataFrame
-    return pd.DataFrame(sparse_cols)
+    Words and dhlabids are stored as integer codes into ``vocab`` and ``docs``.
+    """
+
+    def __init__(self):
+        self.vocab = {}
+        self.docs = {}
+        self.word_codes = array("q")
+        self.doc_codes = array("q")
+        self.freqs = array("q")
+
+    def append(self, dhlabid, word: str, freq: int) -> None:
+        self.doc_codes.append(self.docs.setdefault(dhlabid, len(self.docs)))
+        self.word_codes.append(self.vocab.setdefault(word, len(self.vocab)))
+        self.freqs.append(freq)
+
+    @classmethod
+    def from_response(cls, response) -> "_FrequencyTriplets":
+        """Read the triplets one by one from a streamed response.
+
+        The response is a list with one list of ``[dhlabid, word, frequency]`` per document.
+        """
+        triplets = cls()
+        for dhlabid, word, freq in iter_array_items(iter_text(response), depth=2):
+            triplets.append(dhlabid, word, freq)
+        return triplets
+
+    @classmethod
+    def concat(cls, parts: List["_FrequencyTriplets"]) -> "_FrequencyTriplets":
+        """Merge the triplets of several responses, recoding words and documents."""
+        merged = cls()
+        for part in parts:
+            word_map = np.array(
+                [merged.vocab.setdefault(w, len(merged.vocab)) for w in part.vocab], dtype=np.int64
+            )
+            doc_map = np.array(
+                [merged.docs.setdefault(d, len(merged.docs)) for d in part.docs], dtype=np.int64
+            )
+            merged.word_codes.frombytes(word_map[np.frombuffer(part.word_codes, dtype=np.int64)].tobytes())
+            merged.doc_codes.frombytes(doc_map[np.frombuffer(part.doc_codes, dtype=np.int64)].tobytes())
+            merged.freqs.extend(part.freqs)
+        return merged
+
+    def _arrays(self):
+        return (
+            np.frombuffer(self.word_codes, dtype=np.int64),
+            np.frombuffer(self.doc_codes, dtype=np.int64),
+            np.frombuffer(self.freqs, dtype=np.int64),
+        )
+
+    def to_sparse_counts(self) -> SparseCounts:
+        rows, cols, data = self._arrays()
+        return SparseCounts.from_codes(rows, cols, data, list(self.vocab), list(self.docs))
+
+    def to_frame(self, sparse: bool = False) -> DataFrame:
+        """Word by document frequency table, with zeros for missing words."""
+        if sparse:
+            return self.to_sparse_counts().to_frame()
+
+        rows, cols, data = self._arrays()
+        values = np.zeros((len(self.vocab), len(self.docs)), dtype=np.int64)
+        values[rows, cols] = data
+        return pd.DataFrame(values, index=pd.Index(list(self.vocab)), columns=pd.Index(list(self.docs)))
 
 def get_document_frequencies(
     urns: List[str], cutoff: int = 0, words: List[str] | None = None, sparse: bool = False
@@ -578,34 +669,19 @@ def get_document_frequencies(
     :param list words: a list of words to be counted - if left None, whole document is returned. If not None both the counts and their relative frequency is returned.
     :param bool sparse: create a sparse matrix for memory efficiency
     """
-    params = {"urns": urns, "cutoff": cutoff, "words": words}
-
-    r = api_post(f"{BASE_URL}/frequencies", json=params)
-    result = r.json()
-
     # check if words are passed - return differs a bit
     if words is None:
-        structure = {}
-
-        # result: [
-        #   [ [dhlabid_1, word, frequency], [dhlabid_1, ...], ...]
-        #   [ [dhlabid_2, word, frequency], [dhlabid_2, ...], ...]
-        # ]
-        for res_for_urn in result:
-            try:
-                # structure: {dhlabid: {word: frequency, ...}, ...}
-                dhlabid = res_for_urn[0][0]
-                structure[dhlabid] = {x[1]: x[2] for x in res_for_urn}
-            except IndexError:
-                pass
-
-        if sparse == True:
-            df = _create_sparse_matrix(structure)
-        else:
-            df = pd.DataFrame(structure)
-        
-        df = df.sort_values(by=df.columns[0], ascending=False).fillna(0)
+        df = _fetch_frequency_triplets(urns, cutoff).to_frame(sparse=sparse == True)
+
+        if len(df.columns) > 0:
+            df = df.sort_values(by=df.columns[0], ascending=False).fillna(0)
     else:
+        def request(batch):
+            params = {"urns": batch, "cutoff": cutoff, "words": words}
+            r = api_post(f"{BASE_URL}/frequencies", json=params)
+            return r.json()
+
+        result = run_sharded(request, urns, concat_lists, desc="frequencies")
         df = pd.DataFrame(result)
         df.columns = ["urn", "word", "freq", "urncount"]
         df["relfreq"] = df["freq"] / df.urncount
@@ -615,6 +691,34 @@ def get_document_frequencies(
     return df
 
 
+def _fetch_frequency_triplets(urns: List[str], cutoff: int = 0) -> _FrequencyTriplets:
+    # The response for whole documents can be very large, so it is streamed:
+    # [
+    #   [ [dhlabid_1, word, frequency], [dhlabid_1, ...], ...]
+    #   [ [dhlabid_2, word, frequency], [dhlabid_2, ...], ...]
+    # ]
+    def request(batch):
+        params = {"urns": batch, "cutoff": cutoff, "words": None}
+        r = api_post(f"{BASE_URL}/frequencies", json=params, stream=True)
+        return _FrequencyTriplets.from_response(r)
+
+    return run_sharded(request, urns, _FrequencyTriplets.concat, desc="frequencies")
+
+
+def get_sparse_frequencies(urns: List[str], cutoff: int = 0) -> SparseCounts:
+    """Fetch frequency counts of all words in documents (``urns``) as a sparse matrix.
+
+    Call the API :py:obj:`~dhlab.constants.BASE_URL` endpoint
+    `/frequencies`.
+
+    :param list urns: list of uniform resource name strings, for example:
+        ``["URN:NBN:no-nb_digibok_2008051404065", "URN:NBN:no-nb_digibok_2010092120011"]``
+    :param int cutoff: minimum frequency of a word to be counted
+    :return: a :py:class:`~dhlab.api.sparse.SparseCounts` with words as rows and dhlabids as columns.
+    """
+    return _fetch_frequency_triplets(urns, cutoff).to_sparse_counts()
+
+
 def get_word_frequencies(
     urns: List[str], cutoff: int = 0, words: List[str] | None = None
 ) -> DataFrame:
@@ -747,15 +851,52 @@ def urn_collocation(
         frequency for words collocated with ``word``.
     """
 
-    params = {
-        "urn": urns,
-        "word": word,
-        "before": before,
-        "after": after,
-        "samplesize": samplesize,
-    }
-    r = api_post(BASE_URL + "/urncolldist_urn", json=params)
-    return pd.read_json(StringIO(r.json()))
+    def request(batch, batch_samplesize=samplesize):
+        params = {
+            "urn": batch,
+            "word": word,
+            "before": before,
+            "after": after,
+            "samplesize": batch_samplesize,
+        }
+        r = api_post(BASE_URL + "/urncolldist_urn", json=params)
+        return pd.read_json(StringIO(r.json()))
+
+    batch_size = sharding_settings()["batch_size"]
+    if urns is None or len(urns) <= batch_size:
+        return request(urns)
+    batches = shard(list(urns), batch_size)
+    parts = fan_out(
+        lambda args: request(*args),
+        list(zip(batches, split_samplesize(samplesize, batches))),
+        desc="urncolldist_urn",
+    )
+    return _merge_collocations(parts)
+
+
+def _merge_collocations(parts: List[DataFrame]) -> DataFrame:
+    """Sum the collocation counts of several batches of URNs.
+
+    Other numeric columns (the distances) are averaged, weighted by the counts.
+    If no batch has any collocations, e.g. for an unknown word, the result is
+    an empty frame with the columns of the batches, or just ``counts``.
+    """
+    found = [part for part in parts if not part.empty]
+    if not found:
+        for part in parts:
+            if len(part.columns):
+                return part.iloc[:0]
+        return DataFrame({"counts": pd.Series(dtype="int64")})
+    df = pd.concat(found)
+    if "counts" not in df.columns:
+        return df.groupby(level=0).sum()
+
+    others = [c for c in df.columns if c != "counts" and pd.api.types.is_numeric_dtype(df[c])]
+    weighted = df[others].mul(df["counts"], axis=0)
+    weighted["counts"] = df["counts"]
+    res = weighted.groupby(level=0).sum()
+    res[others] = res[others].div(res["counts"], axis=0)
+    return res[[c for c in df.columns if c in res.columns]]
 
 
 def totals(top_words: int = 50000) -> DataFrame:
@@ -790,15 +931,51 @@ def concordance(
     """
     if words is None:
         return pd.DataFrame(columns=["index", "docid", "urn", "conc"])  # exit condition
-    else:
-        params = {"urns": urns, "query": words, "window": window, "limit": limit}
-        r = api_post(BASE_URL + "/conc", json=params)
-    return pd.DataFrame(r.json())
+
+    def request(batch):
+        return _concordance_batch(batch, words, window, limit)
+
+    return run_sharded(request, urns, concat_frames, desc="conc")
 
 
 konkordans = concordance # Function alias
 
 
+def _concordance_batch(urns: list | None, words: str, window: int, limit: int) -> DataFrame:
+    params = {"urns": urns, "query": words, "window": window, "limit": limit}
+    r = api_post(BASE_URL + "/conc", json=params, stream=True)
+    return read_frame(r)
+
+
+def iter_concordance(
+    urns: list,
+    words: str,
+    window: int = 25,
+    limit: int = 100,
+    batch_size: int = 100,
+    max_workers: int | None = None,
+) -> Iterator[DataFrame]:
+    """Get concordances for a large list of URNs, one page of documents at a time.
+
+    Like :func:`concordance`, but the URNs are requested in pages of ``batch_size``
+    documents, a few pages concurrently, and each page is yielded in order as soon
+    as it is ready. Only a few pages are held in memory at once.
+
+    :param list urns: uniform resource names
+    :param str words: Word(s) to search for.
+    :param int window: number of tokens on either side to show in the collocations, between 1-25.
+    :param int limit: max. number of concordances per document. Maximum value is 1000.
+    :param int batch_size: number of documents per request
+    :param int max_workers: number of pages requested concurrently
+    :return: an iterator of tables of concordances, with the columns of :func:`concordance`
+    """
+    def request(batch):
+        return _concordance_batch(batch, words, window, limit)
+
+    pages = shard(list(urns), batch_size)
+    yield from iter_fan_out(request, pages, max_workers=max_workers, desc="conc")
+
+
 def concordance_counts(
     urns: list | None = None, words: str | None = None, window: int = 25, limit: int = 100
 ) -> DataFrame:
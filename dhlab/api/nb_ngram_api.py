@@ -4,27 +4,52 @@ import networkx as nx
 import requests
 
 from dhlab.constants import GALAXY_API, NGRAM_API
+from dhlab.api.sharding import concat_lists, fan_out, shard_terms
 from dhlab.api.utils import api_get
 
+NGRAM_BATCH_SIZE = 20  #: Max number of terms in one request to the ngram API
+NGRAM_MAX_QUERY_LENGTH = 1000  #: Max length of the ``terms`` query parameter of one request
 
-def get_ngram(terms: str, corpus: str = "avis", lang: str = "nob", session: requests.Session | None = None) -> dict:
+
+def get_ngram(
+    terms: str,
+    corpus: str = "avis",
+    lang: str = "nob",
+    session: requests.Session | None = None,
+    batch_size: int = NGRAM_BATCH_SIZE,
+    max_workers: int | None = None,
+) -> dict:
     """Fetch raw and relative frequencies for the ``terms``.
 
     Call the :py:data:`NGRAM_API`.
     The frequencies are aggregated per year between 1800-2021.
 
+    Long term lists are split into batches of at most ``batch_size`` terms and
+    :py:data:`NGRAM_MAX_QUERY_LENGTH` characters, requested concurrently, and
+    the results are returned in the order of the terms.
+
     :param str terms: comma separated string of words
     :param str corpus: type of documents to search through
+    :param int batch_size: max number of terms per request
+    :param int max_workers: number of batches requested concurrently
     :return: table of annual frequency counts per term
     """
-
-    resp = api_get(
-        NGRAM_API,
-        params={"terms": terms, "corpus": corpus, "lang": lang},
-        session=session
+    batches = shard_terms(
+        [t.strip() for t in terms.split(",")], batch_size, max_chars=NGRAM_MAX_QUERY_LENGTH
     )
 
-    return json.loads(resp.text)
+    def request(batch):
+        resp = api_get(
+            NGRAM_API,
+            params={"terms": ", ".join(batch), "corpus": corpus, "lang": lang},
+            session=session
+        )
+        return json.loads(resp.text)
+
+    if len(batches) <= 1:
+        return request([terms])
+
+    return concat_lists(fan_out(request, batches, max_workers=max_workers, desc="ngram"))
 
 
 def make_word_graph(
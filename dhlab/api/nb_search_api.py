@@ -1,24 +1,25 @@
 from typing import Iterable
 
 import pandas as pd
-import requests
+
+from dhlab.api.utils import get_session
 
 
 def load_picture(url: str):
     """Load the raw image object from a URL."""
-    r = requests.get(url, stream=True)
+    r = get_session().get(url, stream=True)
     r.raw.decode_content = True
     return r.raw
 
 
 def iiif_manifest(urn: str):
     """Fetch the IIIF manifest of the scanned book images"""
-    r = requests.get(f"https://api.nb.no/catalog/v1/iiif/{urn}/manifest")
+    r = get_session().get(f"https://api.nb.no/catalog/v1/iiif/{urn}/manifest")
     return r.json()
 
 
 def mods(urn: str):
-    r = requests.get(f"https://api.nb.no:443/catalog/v1/metadata/{urn}/mods")
+    r = get_session().get(f"https://api.nb.no:443/catalog/v1/metadata/{urn}/mods")
     return r.json()
 
 
@@ -38,12 +39,12 @@ def super_search(
     url = "https://api.nb.no:443/catalog/v1/items"
     number = min(number, 50)
     if term == "":
-        r = requests.get(
+        r = get_session().get(
             url,
             params={"filter": f"mediatype:{mediatype}", "page": page, "size": number},
         )
     else:
-        r = requests.get(
+        r = get_session().get(
             url,
             params={
                 "q": term,
@@ -73,7 +74,7 @@ def get_df(phrases: Iterable, title: str = "aftenposten"):
         "aggs": "year",
         "filter": f"title:{title}",
     }
-    r = requests.get("https://api.nb.no/catalog/v1/items", params=query)
+    r = get_session().get("https://api.nb.no/catalog/v1/items", params=query)
     aggs = r.json()["_embedded"]["aggregations"][0]["buckets"]
     return {x["key"]: x["count"] for x in aggs}
 
@@ -87,7 +88,7 @@ def get_json(phrases, mediatype="aviser"):
         "aggs": "year",
         "searchType": "FULL_TEXT_SEARCH",
     }
-    r = requests.get("https://api.nb.no/catalog/v1/items", params=query)
+    r = get_session().get("https://api.nb.no/catalog/v1/items", params=query)
     aggs = r.json()
     return aggs
 
@@ -100,7 +101,7 @@ def get_data(frase, media="avis", title="jazznytt"):
         "filter": "mediatype:{mt}".format(mt=media),
         "filter": "title:{title}".format(title=title),
     }
-    r = requests.get("https://api.nb.no/catalog/v1/items", params=query)
+    r = get_session().get("https://api.nb.no/catalog/v1/items", params=query)
     return r.json()
 
 
@@ -113,7 +114,7 @@ def get_data_and(frases, title="aftenposten", media="avis"):
         "aggs": "year",
         "filter": "title:{title}".format(title=title),
     }
-    r = requests.get("https://api.nb.no/catalog/v1/items", params=query)
+    r = get_session().get("https://api.nb.no/catalog/v1/items", params=query)
     return r.json()
 
 
@@ -126,7 +127,7 @@ def get_df_pd(frase, media="bøker"):
 def get_konks(urn, phrase, window=1000, n=1000):
     querystring = '"' + phrase + '"'
     query = {"q": querystring, "fragments": n, "fragSize": window}
-    r = requests.get(
+    r = get_session().get(
         "https://api.nb.no/catalog/v1/items/{urn}/contentfragments".format(urn=urn),
         params=query,
     )
@@ -152,7 +153,7 @@ def get_phrase_info(urn, phrase, window=1000, n=1000):
     query = {
         "q": querystring,
     }
-    r = requests.get(
+    r = get_session().get(
         f"https://api.nb.no/catalog/v1/items/{urn}/contentfragments", params=query
     )
     res = r.json()
@@ -0,0 +1,152 @@
+"""Client-side rate limiting of DHLAB API requests.
+
+Each limit is a token bucket: requests take one token each, and tokens are
+refilled at ``rate`` per second up to ``burst``. A bucket is shared by all
+threads, and optionally by all processes using the same lock file:
+
+.. code-block:: python
+
+    from dhlab.api.ratelimit import set_rate_limit
+
+    set_rate_limit("/frequencies", rate=5, burst=10)
+    set_rate_limit("/conc", rate=2, path="/tmp/dhlab_conc.bucket")  # shared between processes
+"""
+
+import os
+import threading
+import time
+
+from dhlab.api.cache import endpoint_matches, endpoint_name
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+class TokenBucket:
+    """Token bucket allowing ``rate`` requests per second, in bursts of up to ``burst``.
+
+    :param float rate: Tokens added per second.
+    :param float burst: Max number of tokens in the bucket. Defaults to ``max(rate, 1)``.
+    :param str path: Lock file keeping the bucket state, to share the bucket between processes.
+        Requires ``fcntl`` (POSIX systems).
+    """
+
+    def __init__(self, rate: float, burst: float | None = None, path: str | None = None):
+        if rate <= 0:
+            raise ValueError("`rate` must be positive")
+        if burst is not None and burst < 1:
+            raise ValueError("`burst` must be at least 1")
+        if path is not None and fcntl is None:
+            raise OSError("Rate limits shared between processes are only supported on POSIX systems.")
+        self.rate = rate
+        self.burst = max(rate, 1.0) if burst is None else burst
+        self.path = path
+        self._lock = threading.Lock()
+        self._tokens = self.burst
+        self._updated = time.time()
+
+    def acquire(self, tokens: float = 1) -> float:
+        """Take ``tokens`` from the bucket, waiting until they are available.
+
+        :return: seconds spent waiting.
+        :raises ValueError: if ``tokens`` is more than the bucket holds, so it would wait forever.
+        """
+        if tokens > self.burst:
+            raise ValueError(f"Cannot take {tokens} tokens from a bucket holding at most {self.burst}")
+        waited = 0.0
+        while True:
+            with self._lock:
+                if self.path is None:
+                    wait = self._take(tokens)
+                else:
+                    wait = self._take_shared(tokens)
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    def _take(self, tokens: float) -> float:
+        """Take tokens if available, else return seconds until they are."""
+        now = time.time()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return 0.0
+        return (tokens - self._tokens) / self.rate
+
+    def _take_shared(self, tokens: float) -> float:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            state = os.read(fd, 64).split()
+            if len(state) == 2:
+                self._tokens, self._updated = float(state[0]), float(state[1])
+            else:
+                self._tokens, self._updated = self.burst, time.time()
+            wait = self._take(tokens)
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.ftruncate(fd, 0)
+            os.write(fd, f"{self._tokens!r} {self._updated!r}".encode())
+            return wait
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+
+class RateLimiter:
+    """Token buckets per endpoint, e.g. ``"/frequencies"``, and optionally one for all requests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: dict[str, TokenBucket] = {}
+        self._global: TokenBucket | None = None
+
+    def set_limit(
+        self, endpoint: str | None, rate: float, burst: float | None = None, path: str | None = None
+    ) -> None:
+        """Limit requests to ``endpoint`` (or to all endpoints if ``None``) to ``rate`` per second."""
+        bucket = TokenBucket(rate, burst=burst, path=path)
+        with self._lock:
+            if endpoint is None:
+                self._global = bucket
+            else:
+                self._buckets[endpoint] = bucket
+
+    def remove_limit(self, endpoint: str | None) -> None:
+        with self._lock:
+            if endpoint is None:
+                self._global = None
+            else:
+                self._buckets.pop(endpoint, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+            self._global = None
+
+    def acquire(self, url: str) -> float:
+        """Wait until a request to ``url`` is allowed. Returns seconds spent waiting."""
+        endpoint = endpoint_name(url)
+        with self._lock:
+            buckets = [b for name, b in self._buckets.items() if endpoint_matches(endpoint, [name])]
+            if self._global is not None:
+                buckets.append(self._global)
+        return sum(bucket.acquire() for bucket in buckets)
+
+
+rate_limiter = RateLimiter()  #: Rate limiter applied to all API calls
+
+
+def set_rate_limit(
+    endpoint: str | None, rate: float, burst: float | None = None, path: str | None = None
+) -> None:
+    """Limit the request rate to ``endpoint``, see :py:meth:`RateLimiter.set_limit`."""
+    rate_limiter.set_limit(endpoint, rate, burst=burst, path=path)
+
+
+def clear_rate_limits() -> None:
+    """Remove all rate limits."""
+    rate_limiter.clear()
@@ -0,0 +1,179 @@
+"""Split long URN lists into batches, and request the batches concurrently.
+
+Functions in :py:mod:`dhlab.api.dhlab_api` that post a whole corpus in one
+request body use :func:`run_sharded` to keep each request below
+``batch_size`` URNs. Corpora no larger than one batch are requested as before,
+in a single call.
+"""
+
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List
+
+import pandas as pd
+from pandas import DataFrame
+from tqdm import tqdm
+
+_lock = threading.Lock()
+_settings = {
+    "batch_size": 5000,
+    "max_workers": 4,
+    "progress": True,
+}
+
+
+def configure_sharding(
+    batch_size: int | None = None,
+    max_workers: int | None = None,
+    progress: bool | None = None,
+) -> None:
+    """Configure how URN lists are split.
+
+    :param int batch_size: Max number of URNs per request.
+    :param int max_workers: Number of batches requested concurrently.
+    :param bool progress: Show a tqdm progress bar when a list is split in several batches.
+    """
+    with _lock:
+        if batch_size is not None:
+            if batch_size < 1:
+                raise ValueError("`batch_size` must be a positive integer")
+            _settings["batch_size"] = batch_size
+        if max_workers is not None:
+            _settings["max_workers"] = max_workers
+        if progress is not None:
+            _settings["progress"] = progress
+
+
+def sharding_settings() -> dict:
+    """Current sharding settings."""
+    with _lock:
+        return dict(_settings)
+
+
+def shard(items: List, size: int) -> List[List]:
+    """Split ``items`` into consecutive batches of at most ``size`` elements."""
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+def iter_fan_out(
+    func: Callable,
+    items: Iterable,
+    max_workers: int | None = None,
+    progress: bool | None = None,
+    desc: str | None = None,
+    ordered: bool = True,
+) -> Iterator:
+    """Call ``func`` on each of ``items`` on a pool of worker threads.
+
+    The results are yielded in the order of ``items``, each as soon as it and
+    all results before it are done, or with ``ordered=False`` in the order they
+    are done, so a slow call does not hold back the others. At most ``2 * max_workers`` calls are
+    submitted ahead of the consumer, so results are not piling up in memory
+    when they are consumed slower than they arrive. Pending calls are
+    cancelled if the generator is closed early.
+    """
+    items = list(items)
+    settings = sharding_settings()
+    max_workers = settings["max_workers"] if max_workers is None else max_workers
+    progress = settings["progress"] if progress is None else progress
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = deque()
+    try:
+        remaining = iter(items)
+        with tqdm(total=len(items), desc=desc, disable=not progress) as bar:
+            for item in islice(remaining, 2 * max_workers):
+                pending.append(executor.submit(func, item))
+            while pending:
+                if ordered:
+                    done = [pending.popleft()]
+                else:
+                    done = wait(pending, return_when=FIRST_COMPLETED).done
+                    for future in done:
+                        pending.remove(future)
+                for future in done:
+                    result = future.result()
+                    for item in islice(remaining, 1):
+                        pending.append(executor.submit(func, item))
+                    bar.update(1)
+                    yield result
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def shard_terms(terms: List[str], max_terms: int, max_chars: int | None = None) -> List[List[str]]:
+    """Split ``terms`` into consecutive batches of at most ``max_terms`` terms,
+    and at most ``max_chars`` characters when joined with ``", "``."""
+    batches = []
+    batch = []
+    length = 0
+    for term in terms:
+        extra = len(term) + (2 if batch else 0)
+        if batch and (len(batch) >= max_terms or (max_chars is not None and length + extra > max_chars)):
+            batches.append(batch)
+            batch, length, extra = [], 0, len(term)
+        batch.append(term)
+        length += extra
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def fan_out(
+    func: Callable,
+    items: Iterable,
+    max_workers: int | None = None,
+    progress: bool | None = None,
+    desc: str | None = None,
+) -> List:
+    """Call ``func`` on each of ``items`` on a pool of worker threads.
+
+    :return: the results, in the order of ``items``.
+    """
+    return list(iter_fan_out(func, items, max_workers=max_workers, progress=progress, desc=desc))
+
+
+def run_sharded(
+    func: Callable,
+    urns: List | None,
+    merge: Callable[[List], object],
+    desc: str | None = None,
+):
+    """Call ``func(batch)`` for each batch of ``urns``, and ``merge`` the list of results.
+
+    If ``urns`` fits in one batch, ``func(urns)`` is returned directly.
+    """
+    batch_size = sharding_settings()["batch_size"]
+    if urns is None or len(urns) <= batch_size:
+        return func(urns)
+
+    return merge(fan_out(func, shard(list(urns), batch_size), desc=desc))
+
+
+def split_samplesize(samplesize: int, batches: List[List]) -> List[int]:
+    """Split ``samplesize`` over ``batches`` in proportion to their lengths.
+
+    The shares are rounded by largest remainder, so they sum to ``samplesize``,
+    except that every batch gets at least 1.
+    """
+    total = sum(len(batch) for batch in batches)
+    shares = [divmod(samplesize * len(batch), total) for batch in batches]
+    sizes = [quotient for quotient, _ in shares]
+    by_remainder = sorted(range(len(batches)), key=lambda i: -shares[i][1])
+    for i in by_remainder[: samplesize - sum(sizes)]:
+        sizes[i] += 1
+    return [max(size, 1) for size in sizes]
+
+
+def concat_lists(parts: List[List]) -> List:
+    """Merge batch results that are JSON lists."""
+    return [x for part in parts for x in part]
+
+
+def concat_frames(parts: List[DataFrame]) -> DataFrame:
+    """Merge batch results with one row per document."""
+    return pd.concat(parts, ignore_index=True)
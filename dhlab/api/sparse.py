@@ -0,0 +1,147 @@
+"""Sparse word-by-document count matrices."""
+
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from scipy import sparse
+
+
+class SparseCounts:
+    """Word frequencies per document, as a ``scipy.sparse`` CSR matrix.
+
+    Rows are words and columns are documents, like the frames returned by
+    :func:`~dhlab.api.dhlab_api.get_document_frequencies`.
+
+    :param matrix: a scipy sparse matrix with one row per word and one column per document.
+    :param words: the words, in row order.
+    :param docs: the document identifiers (dhlabids), in column order.
+    """
+
+    def __init__(self, matrix, words, docs):
+        self.matrix = sparse.csr_matrix(matrix)
+        self.words = np.asarray(words, dtype=object)
+        self.docs = np.asarray(docs)
+        if self.matrix.shape != (len(self.words), len(self.docs)):
+            raise ValueError(
+                f"Matrix shape {self.matrix.shape} does not match "
+                f"{len(self.words)} words and {len(self.docs)} documents"
+            )
+
+    @classmethod
+    def from_codes(cls, rows, cols, values, words, docs) -> "SparseCounts":
+        """Build from flat arrays of word codes (``rows``), document codes (``cols``) and counts.
+
+        Counts for the same word and document are added up.
+        """
+        matrix = sparse.coo_matrix(
+            (np.asarray(values), (np.asarray(rows), np.asarray(cols))),
+            shape=(len(words), len(docs)),
+        )
+        return cls(matrix.tocsr(), words, docs)
+
+    @classmethod
+    def from_triplets(cls, words, docs, values) -> "SparseCounts":
+        """Build from flat arrays of words, document identifiers and counts."""
+        rows, vocab = pd.factorize(np.asarray(words, dtype=object))
+        cols, doc_ids = pd.factorize(np.asarray(docs))
+        return cls.from_codes(rows, cols, values, vocab, doc_ids)
+
+    @classmethod
+    def from_dict(cls, structure: dict) -> "SparseCounts":
+        """Build from nested dicts, ``{dhlabid: {word: frequency, ...}, ...}``."""
+        lengths = np.fromiter((len(d) for d in structure.values()), dtype=np.int64, count=len(structure))
+        total = int(lengths.sum())
+        words = np.fromiter(chain.from_iterable(structure.values()), dtype=object, count=total)
+        values = np.fromiter(
+            chain.from_iterable(d.values() for d in structure.values()), dtype=np.int64, count=total
+        )
+        rows, vocab = pd.factorize(words)
+        cols = np.repeat(np.arange(len(structure)), lengths)
+        return cls.from_codes(rows, cols, values, vocab, list(structure))
+
+    @classmethod
+    def from_frame(cls, df: DataFrame) -> "SparseCounts":
+        """Build from a (sparse or dense) word by document frame."""
+        if all(isinstance(dtype, pd.SparseDtype) for dtype in df.dtypes) and len(df.columns):
+            matrix = df.sparse.to_coo()
+        else:
+            matrix = sparse.csr_matrix(df.fillna(0).to_numpy())
+        return cls(matrix, df.index, df.columns)
+
+    @property
+    def shape(self) -> tuple:
+        return self.matrix.shape
+
+    @property
+    def nnz(self) -> int:
+        """Number of stored (non-zero) counts."""
+        return self.matrix.nnz
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def __repr__(self) -> str:
+        return f"<SparseCounts: {len(self.words)} words x {len(self.docs)} documents, {self.nnz} counts>"
+
+    def sum(self) -> pd.Series:
+        """Total frequency of each word over all documents."""
+        return pd.Series(np.asarray(self.matrix.sum(axis=1)).ravel(), index=pd.Index(self.words))
+
+    def doc_sizes(self) -> pd.Series:
+        """Total number of counted tokens in each document."""
+        return pd.Series(np.asarray(self.matrix.sum(axis=0)).ravel(), index=pd.Index(self.docs))
+
+    def select(self, words=None, docs=None) -> "SparseCounts":
+        """Subset of the words and/or documents, in the given order. Unknown labels are skipped."""
+        matrix, selected_words, selected_docs = self.matrix, self.words, self.docs
+        if words is not None:
+            rows = pd.Index(self.words).get_indexer(list(words))
+            rows = rows[rows >= 0]
+            matrix, selected_words = matrix[rows], self.words[rows]
+        if docs is not None:
+            cols = pd.Index(self.docs).get_indexer(list(docs))
+            cols = cols[cols >= 0]
+            matrix, selected_docs = matrix[:, cols], self.docs[cols]
+        return SparseCounts(matrix, selected_words, selected_docs)
+
+    def relative(self) -> "SparseCounts":
+        """Relative frequencies: counts divided by the number of counted tokens in each document."""
+        sizes = np.asarray(self.matrix.sum(axis=0), dtype=float).ravel()
+        sizes[sizes == 0] = 1
+        return SparseCounts(self.matrix @ sparse.diags(1 / sizes), self.words, self.docs)
+
+    def top_k(self, k: int = 10) -> DataFrame:
+        """The ``k`` most frequent words in each document.
+
+        :return: a long table with columns ``dhlabid``, ``word`` and ``freq``,
+            sorted by document, then by decreasing frequency.
+        """
+        coo = self.matrix.tocoo()
+        order = np.lexsort((-coo.data, coo.col))
+        cols = coo.col[order]
+        # Rank of each count within its document
+        starts = np.searchsorted(cols, cols, side="left")
+        keep = order[np.arange(len(order)) - starts < k]
+        return DataFrame(
+            {
+                "dhlabid": self.docs[coo.col[keep]],
+                "word": self.words[coo.row[keep]],
+                "freq": coo.data[keep],
+            }
+        )
+
+    def rename_docs(self, mapping: dict) -> "SparseCounts":
+        """Replace document identifiers found in ``mapping``, e.g. with titles."""
+        docs = np.array([mapping.get(d, d) for d in self.docs], dtype=object)
+        return SparseCounts(self.matrix, self.words, docs)
+
+    def to_frame(self) -> DataFrame:
+        """Sparse DataFrame with words as index and documents as columns, without densifying."""
+        return pd.DataFrame.sparse.from_spmatrix(
+            self.matrix, index=pd.Index(self.words), columns=pd.Index(self.docs)
+        )
+
+    def to_dense_frame(self) -> DataFrame:
+        return pd.DataFrame(self.matrix.toarray(), index=pd.Index(self.words), columns=pd.Index(self.docs))
@@ -0,0 +1,128 @@
+"""Incremental decoding of large JSON responses.
+
+Lists returned by the API, e.g. from ``/frequencies`` or ``/conc``, are decoded
+item by item as the response body arrives, without building the whole JSON
+document in memory first.
+"""
+
+import codecs
+import json
+from typing import Iterable, Iterator
+
+import requests
+from pandas import DataFrame
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+
+
+def iter_text(response: requests.Response, chunk_size: int = 1 << 16) -> Iterator[str]:
+    """Decode the body of a (streamed) ``response`` to text, chunk by chunk."""
+    decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+def iter_array_items(chunks: Iterable[str], depth: int = 1) -> Iterator:
+    """Yield the JSON values nested ``depth`` arrays deep in a JSON document.
+
+    With ``depth=1`` the elements of a top level list are yielded,
+    with ``depth=2`` the elements of each list in a top level list, and so on.
+
+    :param chunks: the JSON document, in consecutive pieces of text.
+    :raises ValueError: if the document is not nested lists down to ``depth``.
+    """
+    chunks = iter(chunks)
+    buf = ""
+    pos = 0
+    level = 0
+    eof = False
+
+    while True:
+        if pos >= len(buf):
+            if eof:
+                break
+            buf, pos = buf[pos:], 0
+            try:
+                buf += next(chunks)
+            except StopIteration:
+                eof = True
+            continue
+
+        char = buf[pos]
+        if char in _WHITESPACE or char == ",":
+            pos += 1
+        elif char == "[" and level < depth:
+            level += 1
+            pos += 1
+        elif char == "]":
+            level -= 1
+            pos += 1
+        elif level == depth:
+            try:
+                value, end = _decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                end = None
+            # A value ending at the end of the buffer may be cut off, e.g. a number
+            if end is None or (end == len(buf) and not eof):
+                if eof:
+                    raise json.JSONDecodeError("Incomplete JSON value", buf, pos)
+                buf, pos = buf[pos:], 0
+                try:
+                    buf += next(chunks)
+                except StopIteration:
+                    eof = True
+                continue
+            yield value
+            pos = end
+        else:
+            raise ValueError(f"Expected a JSON list at depth {level}, found {char!r}")
+
+    if level != 0:
+        raise json.JSONDecodeError("Unterminated JSON list", buf, pos)
+
+
+def read_frame(response: requests.Response) -> DataFrame:
+    """Build a DataFrame from a streamed JSON ``response``.
+
+    A list of records (dicts) or rows (lists) is read into columns as the records arrive.
+    Other JSON documents are decoded in one go, like ``pd.DataFrame(response.json())``.
+    """
+    chunks = iter_text(response)
+    head = ""
+    for chunk in chunks:
+        head += chunk
+        if head.strip():
+            break
+
+    def body():
+        yield head
+        yield from chunks
+
+    if not head.lstrip().startswith("["):
+        return DataFrame(json.loads("".join(body())))
+
+    columns = {}
+    rows = []
+    n = 0
+    for item in iter_array_items(body(), depth=1):
+        if isinstance(item, dict):
+            for key, value in item.items():
+                if key not in columns:
+                    columns[key] = [None] * n
+                columns[key].append(value)
+            n += 1
+            for values in columns.values():
+                if len(values) < n:
+                    values.append(None)
+        else:
+            rows.append(item)
+
+    if rows:
+        return DataFrame(rows)
+    return DataFrame(columns)
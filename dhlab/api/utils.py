@@ -1,8 +1,398 @@
+import random
+import threading
+import time
+import weakref
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from dhlab.api.cache import endpoint_name, get_cache
+from dhlab.api.ratelimit import rate_limiter
+
 
 class DHLabApiError(requests.exceptions.HTTPError):
     pass
 
+
+class CircuitOpenError(DHLabApiError):
+    """Raised without contacting the API when it has recently failed repeatedly."""
+
+
+# Shared, pooled HTTP session
+
+class _ConnectionStats:
+    """Thread-safe counters for requests sent and connections opened."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._requests = 0
+            self._opened = 0
+
+    def request_sent(self):
+        with self._lock:
+            self._requests += 1
+
+    def connection_opened(self):
+        with self._lock:
+            self._opened += 1
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "connections_opened": self._opened,
+                "connections_reused": max(self._requests - self._opened, 0),
+            }
+
+
+def _counting_pool_class(base: type, stats: _ConnectionStats) -> type:
+    """Subclass a urllib3 connection pool so that every opened socket is counted."""
+
+    class CountingConnection(base.ConnectionCls):
+        def connect(self):
+            stats.connection_opened()
+            return super().connect()
+
+    class CountingPool(base):
+        ConnectionCls = CountingConnection
+
+    return CountingPool
+
+
+class _CountingHTTPAdapter(HTTPAdapter):
+    """``HTTPAdapter`` that reports requests and new connections to a ``_ConnectionStats``."""
+
+    def __init__(self, stats: _ConnectionStats, **kwargs):
+        self._stats = stats
+        self._pool_classes = {
+            "http": _counting_pool_class(HTTPConnectionPool, stats),
+            "https": _counting_pool_class(HTTPSConnectionPool, stats),
+        }
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = self._pool_classes
+
+    def proxy_manager_for(self, *args, **kwargs):
+        manager = super().proxy_manager_for(*args, **kwargs)
+        manager.pool_classes_by_scheme = self._pool_classes
+        return manager
+
+    def send(self, *args, **kwargs):
+        self._stats.request_sent()
+        return super().send(*args, **kwargs)
+
+
+class SessionManager:
+    """Thread-safe owner of the ``requests.Session`` shared by all API calls.
+
+    The session is created lazily on first use, and keeps a pool of open
+    connections per host, so consecutive calls to the same host reuse the
+    TCP/TLS connection instead of opening a new one.
+
+    :param int pool_connections: number of per-host connection pools to keep.
+    :param int pool_maxsize: max number of connections kept open per host.
+    :param bool pool_block: block when all ``pool_maxsize`` connections to a host are busy,
+        instead of opening an extra, throwaway connection.
+    :param bool keep_alive: keep connections open between requests.
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        pool_block: bool = False,
+        keep_alive: bool = True,
+    ):
+        self._lock = threading.Lock()
+        self._session: requests.Session | None = None
+        self._stats = _ConnectionStats()
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+
+    def configure(
+        self,
+        pool_connections: int | None = None,
+        pool_maxsize: int | None = None,
+        pool_block: bool | None = None,
+        keep_alive: bool | None = None,
+        close_current: bool = True,
+    ) -> None:
+        """Change the pool settings. A new session is built on next use.
+
+        :param bool close_current: close the current session now. With ``False`` it is
+            retired instead: requests already running on it finish, and its connections
+            are closed once nothing refers to it.
+        """
+        with self._lock:
+            if pool_connections is not None:
+                self.pool_connections = pool_connections
+            if pool_maxsize is not None:
+                self.pool_maxsize = pool_maxsize
+            if pool_block is not None:
+                self.pool_block = pool_block
+            if keep_alive is not None:
+                self.keep_alive = keep_alive
+            if close_current:
+                self._close()
+            else:
+                self._session = None
+
+    @property
+    def session(self) -> requests.Session:
+        """The shared session, created on first access."""
+        with self._lock:
+            if self._session is None:
+                self._session = self._build_session()
+            return self._session
+
+    def _build_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = _CountingHTTPAdapter(
+            self._stats,
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block,
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        # close the pooled connections of a retired session when it is collected
+        weakref.finalize(session, adapter.close)
+        if not self.keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
+    def stats(self) -> dict:
+        """Number of requests sent, and connections opened versus reused."""
+        return self._stats.as_dict()
+
+    def reset_stats(self) -> None:
+        self._stats.reset()
+
+    def close(self) -> None:
+        """Close all pooled connections."""
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+session_manager = SessionManager()  #: Session manager used by default for all API calls
+
+
+def get_session() -> requests.Session:
+    """Get the shared, pooled session used by default for API calls."""
+    return session_manager.session
+
+
+def configure_session(**kwargs) -> None:
+    """Configure the shared session, see :py:class:`SessionManager` for options."""
+    session_manager.configure(**kwargs)
+
+
+def connection_stats() -> dict:
+    """Number of requests sent through the shared session, and connections opened versus reused."""
+    return session_manager.stats()
+
+
+# Retries and circuit breaker
+
+#: POST endpoints that only query data, and are safe to send again
+IDEMPOTENT_POST_ENDPOINTS = frozenset({
+    "/build_corpus",
+    "/conc",
+    "/conc_word_urn",
+    "/conccount",
+    "/dispersion",
+    "/evaluate",
+    "/find_urn",
+    "/frequencies",
+    "/geo_data",
+    "/get_metadata",
+    "/identifiers",
+    "/ngram_book",
+    "/ngram_newspapers",
+    "/ngram_periodicals",
+    "/paradigms",
+    "/places",
+    "/reference_words",
+    "/urn_frequencies",
+    "/urncolldist",
+    "/urncolldist_urn",
+    "/word_forms",
+})
+
+
+class RetryPolicy:
+    """When and how long to wait before sending a failed request again.
+
+    :param int total: Max number of retries. ``0`` disables retrying.
+    :param float backoff_factor: Base of the exponential backoff, in seconds.
+        Retry ``n`` waits up to ``backoff_factor * 2 ** n`` seconds.
+    :param float backoff_max: Max number of seconds to wait between attempts.
+    :param bool jitter: Wait a random time between 0 and the backoff ("full jitter"),
+        so that parallel workers do not retry in lockstep.
+    :param status_forcelist: Response status codes to retry.
+    :param bool respect_retry_after: Wait as long as the ``Retry-After`` header asks, up to ``backoff_max``.
+    :param allowed_methods: Methods that are always safe to retry.
+    :param idempotent_endpoints: POST endpoints that are safe to retry,
+        see :py:obj:`IDEMPOTENT_POST_ENDPOINTS`.
+    """
+
+    def __init__(
+        self,
+        total: int = 3,
+        backoff_factor: float = 0.5,
+        backoff_max: float = 30.0,
+        jitter: bool = True,
+        status_forcelist=(429, 500, 502, 503, 504),
+        respect_retry_after: bool = True,
+        allowed_methods=("GET", "HEAD", "OPTIONS"),
+        idempotent_endpoints=IDEMPOTENT_POST_ENDPOINTS,
+    ):
+        self.total = total
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.status_forcelist = frozenset(status_forcelist)
+        self.respect_retry_after = respect_retry_after
+        self.allowed_methods = frozenset(m.upper() for m in allowed_methods)
+        self.idempotent_endpoints = frozenset(idempotent_endpoints)
+
+    def is_retryable(self, method: str, url: str, idempotent: bool | None = None) -> bool:
+        """Check if a request can safely be sent more than once."""
+        if idempotent is not None:
+            return idempotent
+        if method.upper() in self.allowed_methods:
+            return True
+        return method.upper() == "POST" and endpoint_name(url) in self.idempotent_endpoints
+
+    def backoff(self, attempt: int, response: requests.Response | None = None) -> float:
+        """Seconds to wait before retry number ``attempt`` (counting from 0)."""
+        if self.respect_retry_after and response is not None:
+            retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is not None:
+                return min(retry_after, self.backoff_max)
+
+        delay = min(self.backoff_factor * 2**attempt, self.backoff_max)
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+
+def _parse_retry_after(value) -> float | None:
+    """Seconds to wait from a ``Retry-After`` header, given as seconds or as an HTTP date."""
+    if not isinstance(value, str):
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """Fail fast when a host keeps failing.
+
+    After ``failure_threshold`` consecutive failures, requests to the host raise
+    :py:class:`CircuitOpenError` immediately. After ``reset_timeout`` seconds a
+    single trial request is let through: the circuit closes again if it succeeds.
+
+    :param int failure_threshold: Consecutive failures before the circuit opens.
+        ``0`` disables the circuit breaker.
+    :param float reset_timeout: Seconds to wait before trying the host again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = {}
+        self._opened_at = {}
+
+    @staticmethod
+    def _host(url: str) -> str:
+        return urlsplit(url).netloc
+
+    def before_request(self, url: str) -> None:
+        """Raise :py:class:`CircuitOpenError` if requests to the host of ``url`` should not be sent."""
+        host = self._host(url)
+        with self._lock:
+            opened_at = self._opened_at.get(host)
+            if opened_at is None:
+                return
+            if time.monotonic() - opened_at < self.reset_timeout:
+                raise CircuitOpenError(
+                    f"The DHLab API at {host} failed {self._failures.get(host, 0)} times in a row."
+                    f" Not sending new requests for {self.reset_timeout:.0f} seconds."
+                )
+            # Half open: let this request through as a trial, and hold back the others
+            self._opened_at[host] = time.monotonic()
+
+    def record_success(self, url: str) -> None:
+        host = self._host(url)
+        with self._lock:
+            self._failures.pop(host, None)
+            self._opened_at.pop(host, None)
+
+    def record_failure(self, url: str) -> None:
+        if self.failure_threshold <= 0:
+            return
+        host = self._host(url)
+        with self._lock:
+            self._failures[host] = self._failures.get(host, 0) + 1
+            if self._failures[host] >= self.failure_threshold:
+                self._opened_at[host] = time.monotonic()
+
+    def state(self, url: str) -> str:
+        """``"closed"``, ``"open"`` or ``"half-open"`` for the host of ``url``."""
+        host = self._host(url)
+        with self._lock:
+            opened_at = self._opened_at.get(host)
+        if opened_at is None:
+            return "closed"
+        if time.monotonic() - opened_at < self.reset_timeout:
+            return "open"
+        return "half-open"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._failures.clear()
+            self._opened_at.clear()
+
+
+retry_policy = RetryPolicy()  #: Retry policy used for all API calls
+circuit_breaker = CircuitBreaker()  #: Circuit breaker used for all API calls
+
+
+def configure_retries(**kwargs) -> None:
+    """Replace the retry policy, see :py:class:`RetryPolicy` for options."""
+    global retry_policy
+    retry_policy = RetryPolicy(**kwargs)
+
+
+def configure_circuit_breaker(failure_threshold: int = 5, reset_timeout: float = 30.0) -> None:
+    """Replace the circuit breaker, see :py:class:`CircuitBreaker` for options."""
+    global circuit_breaker
+    circuit_breaker = CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=reset_timeout)
+
+
 def validate_response_status(response: requests.Response) -> None:
     if response.status_code != 200:
         raise DHLabApiError(
@@ -10,27 +400,90 @@ def validate_response_status(response: requests.Response) -> None:
             + "There is an error connecting to the DHLab API. This is most likely not an error in your code,"
             + " but with the DHLab library or API. Try running the code again, and if that doesn't work, try to"
             + " reinstall/update the dhlab package (e.g. by running: 'pip install --upgrade dhlab').\nIf the error"
-            + " persists, then please leave an issue at https://github.com/NationalLibraryOfNorway/DHLAB/issues/."
+            + " persists, then please leave an issue at https://github.com/NationalLibraryOfNorway/DHLAB/issues/.",
+            response=response,
         )
 
+
+def _send(
+    session: requests.Session,
+    method: str,
+    url: str,
+    params: dict | None,
+    json: dict | None,
+    idempotent: bool | None,
+    stream: bool = False,
+) -> requests.Response:
+    """Send a request, retrying transient failures according to :py:obj:`retry_policy`."""
+    policy = retry_policy
+    breaker = circuit_breaker
+    retryable = policy.is_retryable(method, url, idempotent)
+    attempt = 0
+
+    while True:
+        breaker.before_request(url)
+        rate_limiter.acquire(url)
+        try:
+            res = session.request(method, url, params=params, json=json, stream=stream)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            breaker.record_failure(url)
+            if not retryable or attempt >= policy.total:
+                raise
+            time.sleep(policy.backoff(attempt))
+            attempt += 1
+            continue
+
+        if res.status_code not in policy.status_forcelist:
+            breaker.record_success(url)
+            return res
+
+        breaker.record_failure(url)
+        if not retryable or attempt >= policy.total:
+            return res
+        res.close()
+        time.sleep(policy.backoff(attempt, res))
+        attempt += 1
+
 def api_request(
     method: str,
     url: str,
     params: dict | None = None,
     json: dict | None = None,
-    session: requests.Session | None = None
+    session: requests.Session | None = None,
+    idempotent: bool | None = None,
+    stream: bool = False,
 ):
+    """Send a request to the API, and check that it succeeded.
+
+    Transient failures are retried according to :py:obj:`retry_policy`.
+    POST requests are only retried if ``idempotent`` is true, or if
+    ``idempotent`` is ``None`` and the endpoint is in :py:obj:`IDEMPOTENT_POST_ENDPOINTS`.
+
+    With ``stream=True`` the body is not downloaded until it is read,
+    e.g. with :func:`dhlab.api.streaming.iter_text`. Responses that are
+    stored in the response cache are always downloaded in full.
+    """
     if session is None:
-        session = requests.Session()
+        session = get_session()
+
+    cache = get_cache()
+    if cache is not None and not cache.is_enabled_for(url):
+        cache = None
+    if cache is not None:
+        cached = cache.get(method, url, params, json)
+        if cached is not None:
+            return cached
 
-    res = session.request(method, url, params=params, json=json)
+    res = _send(session, method, url, params, json, idempotent, stream=stream and cache is None)
     validate_response_status(res)
 
-    return res
+    if cache is not None:
+        cache.set(method, url, params, json, res)
 
-def api_get(url: str, params: dict | None = None, session: requests.Session | None = None):
-    return api_request("GET", url, params=params, session=session)
+    return res
 
-def api_post(url: str, json: dict | None = None, session: requests.Session | None = None):
-    return api_request("POST", url, json=json, session=session)
+def api_get(url: str, params: dict | None = None, session: requests.Session | None = None, stream: bool = False):
+    return api_request("GET", url, params=params, session=session, stream=stream)
 
+def api_post(url: str, json: dict | None = None, session: requests.Session | None = None, stream: bool = False):
+    return api_request("POST", url, json=json, session=session, stream=stream)
@@ -5,3 +5,6 @@ import os
 BASE_URL = os.getenv("NB_DHLAB_BASE_URL", "https://api.nb.no/dhlab")  #: REST-API URL adress to fulltext query functions
 NGRAM_API =  os.getenv("NB_DHLAB_NGRAM_API", "https://api.nb.no/dhlab/nb_ngram/ngram/query") #: URL adress for API calls to ngram-databases
 GALAXY_API = os.getenv("NB_DHLAB_GALAXY_API", "https://api.nb.no/dhlab/nb_ngram_galaxies/galaxies/query")  #: URL adress for word galaxy API queries
+CACHE_PATH = os.getenv("NB_DHLAB_CACHE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "dhlab", "api_cache.sqlite"))  #: Default file for the opt-in API response cache
+NGRAM_CACHE_PATH = os.getenv("NB_DHLAB_NGRAM_CACHE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "dhlab", "ngram_cache.sqlite"))  #: Default file for the opt-in disk cache of ngram series
+NGRAM_STORE_PATH = os.getenv("NB_DHLAB_NGRAM_STORE_PATH", os.path.join(os.path.expanduser("~"), ".cache", "dhlab", "ngram_store"))  #: Default directory of the local ngram time-series store
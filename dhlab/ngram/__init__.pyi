@@ -3,3 +3,4 @@ from .ngram import (
     NgramBook as NgramBook,
     NgramNews as NgramNews,
 )
+from .store import NgramStore as NgramStore
@@ -0,0 +1,145 @@
+"""Cache of ngram series from the :py:data:`~dhlab.constants.NGRAM_API`, per term.
+
+The ngram API returns the whole yearly series of each term. The series are
+kept per ``(term, corpus, lang)``, with both the relative and the absolute
+frequencies, so :func:`~dhlab.ngram.nb_ngram.nb_ngram` only requests terms it
+has not seen before, and a change of years or mode is a local slice.
+
+The series are kept in memory for the process. :func:`enable_ngram_disk_cache`
+adds a SQLite file, so they also survive between sessions. Series expire after
+the ``ttl`` of the cache in both tiers, and ``nb_ngram(..., use_cache=False)``
+requests them again right away.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from dhlab.constants import NGRAM_CACHE_PATH
+
+_Key = Tuple[str, str, str]
+
+
+class NgramSeriesCache:
+    """Ngram series per ``(term, corpus, lang)``.
+
+    A series is the ``values`` list of the API, ``[{"x": year, "y": relative, "f": absolute}, ...]``.
+    Terms the API has no series for are cached as empty lists.
+
+    :param str path: SQLite file for the disk tier. ``None`` keeps the series in memory only.
+    :param ttl: Seconds before a series expires, in memory and on disk. ``None`` means never.
+    """
+
+    def __init__(self, path: str | None = None, ttl: float | None = 30 * 24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self._memory: Dict[_Key, Tuple[List[dict], float]] = {}
+        self._lock = threading.Lock()
+        self._conn = None
+        if path is not None:
+            if path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            with self._conn:
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS ngram_series ("
+                    " term TEXT, corpus TEXT, lang TEXT, series TEXT, created REAL,"
+                    " PRIMARY KEY (term, corpus, lang))"
+                )
+
+    @staticmethod
+    def key(term: str, corpus: str, lang: str | None) -> _Key:
+        return (term, corpus, lang or "")
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def get_many(self, terms: Iterable[str], corpus: str, lang: str | None) -> Dict[str, List[dict]]:
+        """Cached series of ``terms``. Terms that are not cached, or have expired, are left out."""
+        found = {}
+        missing = []
+        now = time.time()
+        with self._lock:
+            for term in terms:
+                entry = self._memory.get(self.key(term, corpus, lang))
+                if entry is None or self._expired(entry[1], now):
+                    missing.append(term)
+                else:
+                    found[term] = entry[0]
+
+            if self._conn is not None and missing:
+                for term in missing:
+                    row = self._conn.execute(
+                        "SELECT series, created FROM ngram_series WHERE term = ? AND corpus = ? AND lang = ?",
+                        self.key(term, corpus, lang),
+                    ).fetchone()
+                    if row is None or self._expired(row[1], now):
+                        continue
+                    found[term] = json.loads(row[0])
+                    self._memory[self.key(term, corpus, lang)] = (found[term], row[1])
+        return found
+
+    def set_many(self, series: Dict[str, List[dict]], corpus: str, lang: str | None) -> None:
+        """Store the series of several terms."""
+        now = time.time()
+        with self._lock:
+            for term, values in series.items():
+                self._memory[self.key(term, corpus, lang)] = (values, now)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO ngram_series VALUES (?, ?, ?, ?, ?)",
+                        [
+                            (*self.key(term, corpus, lang), json.dumps(values), now)
+                            for term, values in series.items()
+                        ],
+                    )
+
+    def clear(self) -> None:
+        """Forget all series, in memory and on disk."""
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute("DELETE FROM ngram_series")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_cache = NgramSeriesCache()
+
+
+def get_ngram_cache() -> NgramSeriesCache:
+    """The ngram series cache used by :func:`~dhlab.ngram.nb_ngram.nb_ngram`."""
+    return _cache
+
+
+def enable_ngram_disk_cache(path: str | None = None, ttl: float | None = 30 * 24 * 3600) -> NgramSeriesCache:
+    """Keep ngram series in a SQLite file, as well as in memory.
+
+    :param str path: Defaults to :py:obj:`~dhlab.constants.NGRAM_CACHE_PATH`.
+    :param ttl: Seconds before a series expires. ``None`` means never.
+    """
+    global _cache
+    _cache.close()
+    _cache = NgramSeriesCache(path=NGRAM_CACHE_PATH if path is None else path, ttl=ttl)
+    return _cache
+
+
+def disable_ngram_disk_cache() -> None:
+    """Keep ngram series in memory only. The file is kept on disk."""
+    global _cache
+    _cache.close()
+    _cache = NgramSeriesCache()
+
+
+def clear_ngram_cache() -> None:
+    """Forget all cached ngram series."""
+    _cache.clear()
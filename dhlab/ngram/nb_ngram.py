@@ -1,7 +1,9 @@
+import numpy as np
 import pandas as pd
 from pandas import DataFrame
 
 from dhlab.api.nb_ngram_api import get_ngram
+from dhlab.ngram.cache import get_ngram_cache
 
 
 def nb_ngram(
@@ -11,12 +13,16 @@ def nb_ngram(
     years: tuple = (1810, 2010),
     mode: str = "relative",
     lang: str = "nob",
+    use_cache: bool = True,
 ):
     """Extract N-gram frequencies from given `terms` and `years`.
     `lang` param is not supported for corpus=`avis` and will be set to None if `avis` is passed.
 
     The `lang` param is not supported for `corpus="avis"` and will be set to None if `avis` is passed.
 
+    The series are kept in the :py:mod:`ngram cache <dhlab.ngram.cache>`. Pass
+    `use_cache=False` to request them again and refresh the cache.
+
     Returns:
         A sorted Pandas DataFrame indexed by year, with columns for each term.
 
@@ -27,7 +33,7 @@ def nb_ngram(
         lang = None
 
     df = ngram_conv(
-        get_ngram(terms, corpus=corpus, lang=lang),
+        cached_ngrams(terms, corpus=corpus, lang=lang, use_cache=use_cache),
         smooth=smooth,
         years=years,
         mode=mode,
@@ -36,6 +42,61 @@ def nb_ngram(
     return df.sort_index()
 
 
+def cached_ngrams(
+    terms: str, corpus: str = "bok", lang: str | None = "nob", use_cache: bool = True
+) -> list:
+    """Like :func:`~dhlab.api.nb_ngram_api.get_ngram`, but only the terms that are not in the
+    :py:mod:`ngram cache <dhlab.ngram.cache>` are requested.
+
+    The series are cached under the requested terms, also when the API answers with
+    another spelling of the key.
+
+    :param bool use_cache: ``False`` requests all the terms again and replaces their cached series
+    :return: the ngram payload, ``[{"key": term, "values": [...]}, ...]``, for the terms with a series
+
+    :meta private:
+    """
+    requested = [t.strip() for t in terms.split(",") if t.strip()]
+    cache = get_ngram_cache()
+    series = cache.get_many(requested, corpus, lang) if use_cache else {}
+    missing = [t for t in dict.fromkeys(requested) if t not in series]
+
+    if missing:
+        payload = get_ngram(", ".join(missing), corpus=corpus, lang=lang)
+        fetched = dict(_match_requested(missing, payload))
+        cache.set_many(fetched, corpus, lang)
+        series.update(fetched)
+
+    return [{"key": k, "values": series[k]} for k in dict.fromkeys(requested) if series.get(k)]
+
+
+def _match_requested(requested: list, payload: list):
+    """Pair each requested term with its series in the ngram ``payload``.
+
+    The API answers with one entry per term, in order, and codes terms without a
+    series as empty lists. If the lengths differ, the entries are matched by key,
+    ignoring case and surrounding space. Terms without a match get an empty series.
+
+    :meta private:
+    """
+    if len(payload) == len(requested):
+        for term, ngram in zip(requested, payload):
+            yield term, ngram["values"] if ngram else []
+        return
+
+    def normal(key):
+        return str(key).strip().casefold()
+
+    by_key = {}
+    for ngram in payload:
+        # empty ngrams are coded as empty lists
+        if ngram:
+            by_key.setdefault(ngram["key"], ngram["values"])
+            by_key.setdefault(normal(ngram["key"]), ngram["values"])
+    for term in requested:
+        yield term, by_key.get(term, by_key.get(normal(term), []))
+
+
 ## tar tilbake til original den her virker ikke LGJ
 def ngram_conv_old(
     ngrams, smooth: int = 1, years: tuple = (1810, 2013), mode: str = "relative"
@@ -60,6 +121,82 @@ def ngram_conv_old(
     return pd.DataFrame(ngc).rolling(window=smooth, win_type="triang").mean()
 
 
+def triang(window: int) -> np.ndarray:
+    """Triangular window weights, the same as ``scipy.signal.windows.triang(window)``
+
+    :meta private:
+    """
+    n = np.arange(1, (window + 1) // 2 + 1)
+    if window % 2 == 0:
+        w = (2 * n - 1.0) / window
+        return np.concatenate([w, w[::-1]])
+    w = 2 * n / (window + 1.0)
+    return np.concatenate([w, w[-2::-1]])
+
+
+def rolling_triang(values: np.ndarray, window: int) -> np.ndarray:
+    """Triangular-weighted rolling mean over the rows of ``values``, like
+    ``DataFrame.rolling(window, win_type="triang").mean()``
+
+    The first ``window - 1`` rows, and windows with missing values, are ``nan``.
+
+    :meta private:
+    """
+    values = np.asarray(values, dtype=float)
+    if window <= 1:
+        return values.copy()
+    weights = triang(window)
+    result = np.full(values.shape, np.nan)
+    if len(values) >= window:
+        windows = np.lib.stride_tricks.sliding_window_view(values, window, axis=0)
+        result[window - 1 :] = windows @ (weights / weights.sum())
+    return result
+
+
+def smooth_triang(frame: DataFrame, window: int) -> DataFrame:
+    """:func:`rolling_triang` of a frame, keeping its index and columns
+
+    :meta private:
+    """
+    return DataFrame(rolling_triang(frame.to_numpy(dtype=float), window), index=frame.index, columns=frame.columns)
+
+
+def decode_ngrams(ngrams, years: tuple = (1810, 2013), mode: str = "relative"):
+    """Decode an ngram payload into a (years x terms) array
+
+    :param ngrams: the payload of :func:`~dhlab.api.nb_ngram_api.get_ngram`,
+        ``[{"key": term, "values": [{"x": year, "y": relative, "f": absolute}, ...]}, ...]``
+    :return: the sorted years, the terms, and the array of frequencies, ``nan`` where a term has no value
+
+    :meta private:
+    """
+    arg = "y" if mode.startswith("rel") or mode == "y" else "f"
+    first, last = int(years[0]), int(years[1])
+
+    columns = {}
+    parts = []
+    for x in ngrams:
+        # empty ngrams are coded as empty lists
+        if x != [] and x["values"]:
+            col = columns.setdefault(x["key"], len(columns))
+            points = x["values"]
+            year = np.fromiter((int(z["x"]) for z in points), dtype=np.int64, count=len(points))
+            value = np.fromiter((z[arg] for z in points), dtype=float, count=len(points))
+            parts.append((np.full(len(points), col), year, value))
+
+    if not parts:
+        return np.array([], dtype=np.int64), list(columns), np.empty((0, len(columns)))
+
+    cols, year, value = (np.concatenate(p) for p in zip(*parts))
+    in_range = (year >= first) & (year <= last)
+    cols, year, value = cols[in_range], year[in_range], value[in_range]
+
+    index, rows = np.unique(year, return_inverse=True)
+    matrix = np.full((len(index), len(columns)), np.nan)
+    matrix[rows, cols] = value
+    return index, list(columns), matrix
+
+
 def ngram_conv(
     ngrams,
     smooth: int = 1,
@@ -69,7 +206,7 @@ def ngram_conv(
     """Construct a dataframe with ngram mean frequencies per year over a given time period.
 
     Args:
-        ngrams: To be filled in.
+        ngrams: The payload of `get_ngram`.
         smooth: Smoothing factor for the graph visualisation.
         years: Tuple with start and end years for the time period of interest
         mode: Frequency measure.
@@ -79,20 +216,5 @@ def ngram_conv(
 
     :meta private:
     """
-    ngc = {}
-    # check if relative frequency or absolute frequency is in question
-    if mode.startswith("rel") or mode == "y":
-        arg = "y"
-    else:
-        arg = "f"
-    for x in ngrams:
-        # check if x is a non empty ngram - empty ngrams are coded as empty lists
-        # if x is non emtpy it accepts keys - look at alternative isinstance(x, dict)?
-        if x != []:
-            ngc[x["key"]] = {
-                z["x"]: z[arg]
-                for z in x["values"]
-                if int(z["x"]) <= int(years[1]) and int(z["x"]) >= int(years[0])
-            }
-
-    return pd.DataFrame(ngc).rolling(window=smooth, win_type="triang").mean()
+    index, terms, matrix = decode_ngrams(ngrams, years=years, mode=mode)
+    return DataFrame(rolling_triang(matrix, smooth), index=index, columns=terms)
@@ -1,7 +1,7 @@
 from datetime import datetime
 
 from dhlab.api.dhlab_api import ngram_book, ngram_news
-from dhlab.ngram.nb_ngram import nb_ngram
+from dhlab.ngram.nb_ngram import nb_ngram, smooth_triang
 from dhlab.text.dhlab_object import DhlabObj
 
 
@@ -63,6 +63,9 @@ class Ngram(DhlabObj):
         # Set default lang for 'bok'-corpus
         if doctype == "avis":
             lang = None
+        self.doctype = doctype
+        self.mode = mode
+        self._ngram_lang = lang
 
         ngram_df = nb_ngram(
             terms=", ".join(words),
@@ -87,9 +90,39 @@ class Ngram(DhlabObj):
     def ngram(self, frame):
         self.frame = frame
 
+    def add(self, words):
+        """Add words to the frame. Words already fetched in this session are not requested again.
+
+        :param words: words to add
+        :type words: str or list of str
+        """
+        if isinstance(words, str):
+            words = [words]
+        new = [w for w in words if w not in self.frame.columns]
+        if new:
+            ngram_df = self._fetch(new)
+            added = ngram_df.columns.difference(self.frame.columns, sort=False)
+            self.frame = self.frame.join(ngram_df[added], how="outer")
+            words = [self.words] if isinstance(self.words, str) else list(self.words or [])
+            self.words = words + new
+        return self
+
+    def _fetch(self, words):
+        """Frequencies of ``words`` with the query of this ngram, indexed by year as strings"""
+        ngram_df = nb_ngram(
+            terms=", ".join(words),
+            corpus=self.doctype,
+            years=(self.from_year, self.to_year),
+            smooth=1,
+            lang=self._ngram_lang,
+            mode=self.mode,
+        )
+        ngram_df.index = ngram_df.index.astype(str)
+        return ngram_df
+
     def plot(self, smooth=4, **kwargs):
         """:param smooth: smoothing the curve"""
-        grf = self.frame.rolling(window=smooth, win_type="triang").mean()
+        grf = smooth_triang(self.frame, smooth)
         grf.plot(**kwargs)
 
     def compare(self, another_ngram):
@@ -185,6 +218,19 @@ class NgramBook(Ngram):
         )
         # self.cohort =  (self.ngram.transpose()/self.ngram.transpose().sum()).transpose()
 
+    def _fetch(self, words):
+        """Frequencies of ``words`` in the books matching the metadata of this ngram"""
+        return ngram_book(
+            word=words,
+            title=self.title,
+            publisher=self.publisher,
+            lang=self.lang,
+            city=self.city,
+            period=(self.from_year, self.to_year),
+            ddk=self.ddk,
+            topic=self.subject,
+        )
+
 
 class NgramNews(Ngram):
     def __init__(
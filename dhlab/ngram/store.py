@@ -0,0 +1,211 @@
+"""Local store of ngram time series, refreshed with only the new periods.
+
+The ``/ngram_book``, ``/ngram_periodicals`` and ``/ngram_newspapers``
+endpoints return the whole requested period on every call. An
+:class:`NgramStore` keeps the series of each term in a Parquet file,
+and a manifest with the last period fetched for each term and query
+filter. A refresh of a watchlist then only requests the periods after
+those, through the ``period`` parameter, and appends them.
+
+Layout of the store directory::
+
+    manifest.json
+    <query key>/<term>.parquet
+
+where the query key identifies the document type and metadata filters.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List
+from urllib.parse import quote
+
+import pandas as pd
+from pandas import DataFrame
+
+from dhlab.api.dhlab_api import _ngram_doc
+from dhlab.constants import NGRAM_STORE_PATH
+from dhlab.text.dhlab_object import import_pyarrow
+
+DOCTYPES = ("book", "periodicals", "newspapers")
+
+
+def _today(like: int) -> int:
+    """Today as a date (``YYYYMMDD``) or a year (``YYYY``), in the format of the period ``like``"""
+    return int(time.strftime("%Y%m%d" if len(str(like)) == 8 else "%Y"))
+
+
+class NgramStore:
+    """Ngram series per term, document type and metadata filter, on disk.
+
+    >>> store = NgramStore()
+    >>> store.refresh(["demokrati", "frihet"], doctype="newspapers", first=19000101)  # doctest: +SKIP
+    >>> store.get(["demokrati", "frihet"], doctype="newspapers")  # doctest: +SKIP
+
+    :param str path: Directory of the store.
+        Defaults to :py:obj:`~dhlab.constants.NGRAM_STORE_PATH`.
+    """
+
+    def __init__(self, path: str | None = None):
+        import_pyarrow()
+        self.path = NGRAM_STORE_PATH if path is None else path
+        os.makedirs(self.path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._manifest = self._read_manifest()
+
+    def __repr__(self) -> str:
+        n_terms = sum(len(q["terms"]) for q in self._manifest.values())
+        return f"NgramStore({self.path!r}, {len(self._manifest)} queries, {n_terms} series)"
+
+    @staticmethod
+    def query_key(doctype: str, filters: dict) -> str:
+        """Directory name for a document type and its metadata ``filters``"""
+        query = json.dumps({"doctype": doctype, **filters}, sort_keys=True, default=str)
+        return f"{doctype}-" + hashlib.sha1(query.encode()).hexdigest()[:12]
+
+    def last_periods(self, doctype: str = "book", **filters) -> Dict[str, str]:
+        """The last period fetched for each stored term of a query"""
+        query = self._manifest.get(self.query_key(doctype, filters), {})
+        return dict(query.get("terms", {}))
+
+    def refresh(
+        self,
+        words: Iterable[str] | str,
+        doctype: str = "book",
+        first: int = 1810,
+        last: int | None = None,
+        max_workers: int | None = None,
+        **filters,
+    ) -> Dict[str, int]:
+        """Fetch the new periods of ``words`` and append them to the store.
+
+        New terms are fetched from ``first`` to ``last``. Stored terms are fetched
+        from the last period the API returned for them to ``last``; that period is
+        requested again, since it may have been incomplete, and its row is replaced.
+        Terms without any counts are not recorded, and are fetched from ``first``
+        the next time.
+
+        :param words: Terms to refresh, as a list or a comma separated string.
+        :param str doctype: ``"book"``, ``"periodicals"`` or ``"newspapers"``.
+        :param int first: First year (``YYYY``) or date (``YYYYMMDD``) of new terms.
+        :param int last: Last year or date to fetch. Defaults to today,
+            in the format of the period each term is fetched from.
+        :raises ValueError: if a term's first period and ``last`` are not in the same format.
+        :param int max_workers: Number of batches requested concurrently.
+        :param filters: Metadata filters of the ``/ngram_*`` endpoint,
+            like ``title``, ``lang`` or ``publisher``.
+        :return: The number of new or updated rows per term.
+        """
+        if doctype not in DOCTYPES:
+            raise ValueError(f"`doctype` must be one of {DOCTYPES}")
+        if isinstance(words, str):
+            words = [w.strip() for w in words.split(",")]
+        words = list(dict.fromkeys(words))
+
+        key = self.query_key(doctype, filters)
+        stored = self.last_periods(doctype, **filters)
+
+        # one batched request per start period; after the first refresh that is usually one
+        starts: Dict[int, List[str]] = {}
+        for word in words:
+            start = int(stored[word]) if word in stored else first
+            starts.setdefault(start, []).append(word)
+
+        periods = {}
+        for start, group in starts.items():
+            end = _today(start) if last is None else last
+            if len(str(start)) != len(str(end)):
+                raise ValueError(
+                    f"The period {start} of {group[0]!r} and the last period {end} are not in the same format"
+                )
+            if start <= end:
+                periods[start] = end
+
+        updated = {}
+        for start, end in periods.items():
+            group = starts[start]
+            frame = _ngram_doc(
+                doctype, word=group, period=(start, end), max_workers=max_workers, **filters
+            )
+            fetched = {}
+            for word in group:
+                rows = frame[word].dropna() if word in frame.columns else pd.Series(dtype=float)
+                updated[word] = self._append(key, word, rows)
+                if len(rows):
+                    fetched[word] = str(rows.index.astype(str).max())
+            self._update_manifest(key, doctype, filters, fetched)
+        return updated
+
+    def get(self, words: Iterable[str] | str, doctype: str = "book", **filters) -> DataFrame:
+        """Stored series of ``words``, one column per term and one row per period.
+
+        Terms that are not in the store are left out.
+        """
+        if isinstance(words, str):
+            words = [w.strip() for w in words.split(",")]
+        key = self.query_key(doctype, filters)
+        columns = {}
+        for word in dict.fromkeys(words):
+            path = self._term_path(key, word)
+            if os.path.exists(path):
+                columns[word] = pd.read_parquet(path).set_index("period").freq
+        if not columns:
+            return DataFrame()
+        return pd.concat(columns, axis=1).sort_index()
+
+    def drop(self, words: Iterable[str] | str, doctype: str = "book", **filters) -> None:
+        """Remove the series of ``words`` from the store"""
+        if isinstance(words, str):
+            words = [w.strip() for w in words.split(",")]
+        key = self.query_key(doctype, filters)
+        with self._lock:
+            terms = self._manifest.get(key, {}).get("terms", {})
+            for word in words:
+                terms.pop(word, None)
+                path = self._term_path(key, word)
+                if os.path.exists(path):
+                    os.remove(path)
+            self._write_manifest()
+
+    def _term_path(self, key: str, word: str) -> str:
+        return os.path.join(self.path, key, quote(word, safe="") + ".parquet")
+
+    def _append(self, key: str, word: str, rows: pd.Series) -> int:
+        """Add ``rows`` (period -> frequency) to the series of ``word``, replacing stored periods"""
+        if not len(rows):
+            return 0
+        path = self._term_path(key, word)
+        new = DataFrame({"period": rows.index.astype(str), "freq": rows.to_numpy(dtype=float)})
+        if os.path.exists(path):
+            old = pd.read_parquet(path)
+            new = pd.concat([old[~old.period.isin(new.period)], new], ignore_index=True)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        new.sort_values("period").to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+        return len(rows)
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.path, "manifest.json")
+
+    def _read_manifest(self) -> dict:
+        if not os.path.exists(self._manifest_path()):
+            return {}
+        with open(self._manifest_path(), encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_manifest(self) -> None:
+        tmp = self._manifest_path() + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._manifest, f, ensure_ascii=False, indent=1, default=str)
+        os.replace(tmp, self._manifest_path())
+
+    def _update_manifest(self, key: str, doctype: str, filters: dict, periods: Dict[str, str]) -> None:
+        with self._lock:
+            query = self._manifest.setdefault(
+                key, {"doctype": doctype, "filters": filters, "terms": {}}
+            )
+            query["terms"].update(periods)
+            self._write_manifest()
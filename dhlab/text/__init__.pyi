@@ -4,7 +4,11 @@ from .conc_coll import (
     Concordance as Concordance,
     Counts as Counts,
 )
-from .corpus import Corpus as Corpus
+from .corpus import (
+    Corpus as Corpus,
+    CorpusBuilder as CorpusBuilder,
+    LazyCorpus as LazyCorpus,
+)
 from .dispersion import Dispersion as Dispersion
 from .geo_data import GeoData as GeoData
 from .parse import (
@@ -0,0 +1,131 @@
+"""Association measures between collocations and a reference frequency list.
+
+Each collocate is scored from a 2x2 contingency table: its count in the
+collocation window against the rest of the window, and its frequency in the
+reference corpus against the rest of the reference. All measures are computed
+on aligned NumPy arrays, so a reference is indexed once and can score any
+number of collocation sets.
+"""
+
+from typing import Iterable, List
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, Series
+
+MEASURES = ["relevance", "pmi", "g2", "chi2", "dice", "t_score", "assoc"]
+
+
+def top_k(values, k: int) -> np.ndarray:
+    """Positions of the ``k`` largest of ``values``, largest first. ``nan`` is ranked last."""
+    values = np.asarray(values, dtype=float)
+    values = np.where(np.isnan(values), -np.inf, values)
+    k = min(k, len(values))
+    if k <= 0:
+        return np.array([], dtype=np.int64)
+    part = np.argpartition(-values, k - 1)[:k]
+    return part[np.argsort(-values[part], kind="stable")]
+
+
+def _xlogx_ratio(observed: np.ndarray, expected: np.ndarray) -> np.ndarray:
+    """``observed * log(observed / expected)``, with ``0 * log(0) = 0``."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(observed > 0, observed * np.log(observed / expected), 0.0)
+
+
+class AssociationScorer:
+    """Score collocation counts against a reference frequency list.
+
+    :param reference: frequencies indexed by word, e.g. from :func:`~dhlab.api.dhlab_api.totals`.
+        A DataFrame is reduced to its first column.
+    """
+
+    def __init__(self, reference: "Series | DataFrame"):
+        if isinstance(reference, DataFrame):
+            reference = reference.iloc[:, 0]
+        if not reference.index.is_unique:
+            reference = reference.groupby(level=0).sum()
+        self.words = pd.Index(reference.index)
+        self.frequencies = reference.to_numpy(dtype=float)
+        self.total = float(np.nansum(self.frequencies))
+
+    def align(self, words: Iterable) -> np.ndarray:
+        """Reference frequencies of ``words``, ``nan`` for words not in the reference."""
+        positions = self.words.get_indexer(pd.Index(words))
+        return np.append(self.frequencies, np.nan)[positions]
+
+    def score_arrays(
+        self,
+        counts: np.ndarray,
+        reference: np.ndarray,
+        measures: List[str] | None = None,
+        exponent: float = 1.1,
+    ) -> dict:
+        """Association measures from aligned arrays of collocation ``counts`` and ``reference`` frequencies.
+
+        :param measures: names from :py:data:`MEASURES`, defaults to all
+        :param exponent: exponent of the ``assoc`` measure
+        :return: a dict of arrays, one per measure
+        """
+        measures = MEASURES if measures is None else measures
+        unknown = set(measures) - set(MEASURES)
+        if unknown:
+            raise ValueError(f"Unknown association measures: {sorted(unknown)}")
+
+        a = np.asarray(counts, dtype=float)
+        r = np.asarray(reference, dtype=float)
+        r0 = np.nan_to_num(r)
+
+        # Contingency table: collocation window (row 1) vs reference (row 2),
+        # the collocate (column 1) vs all other words (column 2)
+        n_coll = a.sum()
+        n_ref = self.total
+        n = n_coll + n_ref
+        o11, o12 = a, n_coll - a
+        o21, o22 = r0, n_ref - r0
+        c1 = o11 + o21
+        c2 = n - c1
+        e11 = n_coll * c1 / n
+        e12 = n_coll * c2 / n
+        e21 = n_ref * c1 / n
+        e22 = n_ref * c2 / n
+
+        rel_coll = a / n_coll if n_coll else np.zeros_like(a)
+        rel_ref = r / n_ref if n_ref else np.full_like(r, np.nan)
+
+        scores = {}
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for measure in measures:
+                if measure == "relevance":
+                    scores[measure] = rel_coll / rel_ref
+                elif measure == "pmi":
+                    scores[measure] = np.log2(o11 / e11)
+                elif measure == "g2":
+                    scores[measure] = 2 * (
+                        _xlogx_ratio(o11, e11)
+                        + _xlogx_ratio(o12, e12)
+                        + _xlogx_ratio(o21, e21)
+                        + _xlogx_ratio(o22, e22)
+                    )
+                elif measure == "chi2":
+                    scores[measure] = n * (o11 * o22 - o12 * o21) ** 2 / (n_coll * n_ref * c1 * c2)
+                elif measure == "dice":
+                    scores[measure] = 2 * o11 / (n_coll + c1)
+                elif measure == "t_score":
+                    scores[measure] = (o11 - e11) / np.sqrt(o11)
+                elif measure == "assoc":
+                    # Like dhlab.legacy.nbtext.compute_assoc, on relative frequencies
+                    scores[measure] = rel_coll**exponent / ((rel_coll + np.nan_to_num(rel_ref)) / 2)
+        return scores
+
+    def score(
+        self, counts: Series, measures: List[str] | None = None, exponent: float = 1.1
+    ) -> DataFrame:
+        """Association measures of collocation ``counts``, a Series indexed by word
+
+        :return: a DataFrame indexed like ``counts``, with one column per measure
+        """
+        scores = self.score_arrays(
+            counts.to_numpy(dtype=float), self.align(counts.index), measures=measures, exponent=exponent
+        )
+        return DataFrame(scores, index=counts.index)
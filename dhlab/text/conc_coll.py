@@ -1,15 +1,23 @@
+import json
 import re
+
 import pandas as pd
 from pandas import DataFrame
-from typing import List, TYPE_CHECKING
+from typing import Iterator, List, TYPE_CHECKING
 from dhlab.api.dhlab_api import (
     concordance,
+    iter_concordance,
     get_document_frequencies,
+    get_sparse_frequencies,
     urn_collocation,
     word_concordance,
     concordance_counts,
 )
-from dhlab.text.dhlab_object import DhlabObj
+from dhlab.api.sharding import iter_fan_out
+from dhlab.api.sparse import SparseCounts
+from dhlab.text.association import AssociationScorer, top_k
+from dhlab.text.dhlab_object import DhlabObj, import_pyarrow
+from dhlab.text.kwic import all_hits, sort_kwic, split_kwic
 from dhlab.text.utils import urnlist
 
 if TYPE_CHECKING:
@@ -22,6 +30,12 @@ def make_link(row):
     return r
 
 
+def make_links(urns: pd.Series) -> pd.Series:
+    """Vectorized :func:`make_link` for a column of URNs"""
+    urns = urns.astype(str)
+    return "<a target='_blank' href = 'https://urn.nb.no/" + urns + "'>" + urns + "</a>"
+
+
 # find hits a cell
 def find_hits(x):
     return " ".join(re.findall("<b>(.+?)</b", x))
@@ -50,16 +64,122 @@ class Concordance(DhlabObj):
             self.concordance = pd.DataFrame()
             self.corpus = None
         else:
-            self.concordance = concordance(
-                urns=urnlist(corpus), words=query, window=window, limit=limit
+            self.concordance = self._from_api(
+                concordance(urns=urnlist(corpus), words=query, window=window, limit=limit)
             )
-            self.concordance["link"] = self.concordance.urn.apply(make_link)
-            self.concordance = self.concordance[["link", "urn", "docid", "conc"]]
-            self.concordance.columns = ["link", "urn", "dhlabid", "concordance"]
             self.corpus = corpus
 
         super().__init__(self.concordance)
 
+    def kwic(self) -> pd.DataFrame:
+        """Keyword in context view, with the concordances split in ``left``, ``hit`` and ``right``"""
+        return pd.concat(
+            [self.frame[["link", "urn", "dhlabid"]], split_kwic(self.frame.concordance)], axis=1
+        )
+
+    def sort_by_context(self, by: str = "right", depth: int = 3, case: bool = False) -> "Concordance":
+        """Sort the concordances alphabetically by the words next to the hit
+
+        :param by: ``"left"`` or ``"right"`` context
+        :param depth: number of context words to sort by
+        :param case: tell upper and lower case apart
+        """
+        kwic = split_kwic(self.frame.concordance.reset_index(drop=True))
+        order = sort_kwic(kwic, by=by, depth=depth, case=case).index
+        return self.from_df(self.frame.iloc[order])
+
+    @staticmethod
+    def _from_api(conc: pd.DataFrame) -> pd.DataFrame:
+        """Select and rename the columns of a `/conc` response, and add links"""
+        conc = conc[["urn", "docid", "conc"]].copy()
+        conc.insert(0, "link", make_links(conc.urn))
+        conc.columns = ["link", "urn", "dhlabid", "concordance"]
+        return conc
+
+    @classmethod
+    def iter_batches(
+        cls,
+        corpus: "Corpus",
+        query: str,
+        window: int = 20,
+        limit: int = 500,
+        batch_size: int = 100,
+        max_workers: int | None = None,
+        arrow: bool = False,
+    ) -> Iterator:
+        """Get concordances for a large corpus, one batch of documents at a time
+
+        Each batch has the columns of ``Concordance.frame``, and a ``hit`` column with the
+        matched words. Only a few batches are held in memory at once.
+
+        :param corpus: target corpus
+        :param query: word or list or words
+        :param window: how many tokens to consider around the target word
+        :param limit: max number of hits per document
+        :param batch_size: number of documents per request
+        :param max_workers: number of batches requested concurrently
+        :param arrow: yield ``pyarrow.RecordBatch`` instead of ``pandas.DataFrame``
+        """
+        if arrow:
+            pa = import_pyarrow()
+        batches = iter_concordance(
+            urnlist(corpus),
+            words=query,
+            window=window,
+            limit=limit,
+            batch_size=batch_size,
+            max_workers=max_workers,
+        )
+        for batch in batches:
+            if batch.empty:
+                continue
+            conc = cls._from_api(batch)
+            conc["hit"] = all_hits(conc.concordance)
+            if arrow:
+                yield pa.RecordBatch.from_pandas(conc, preserve_index=False)
+            else:
+                yield conc
+
+    @classmethod
+    def write_batches(cls, corpus: "Corpus", query: str, path, format: str | None = None, **kwargs) -> int:
+        """Write the concordances of a large corpus straight to a Parquet or JSON lines file
+
+        :param corpus: target corpus
+        :param query: word or list or words
+        :param path: output file
+        :param format: ``"parquet"`` or ``"jsonl"``, defaults to the file suffix
+        :param kwargs: the other arguments of :py:meth:`iter_batches`
+        :return: the number of concordances written
+        """
+        if format is None:
+            format = "parquet" if str(path).endswith(".parquet") else "jsonl"
+        if format not in ("parquet", "jsonl"):
+            raise ValueError("`format` must be 'parquet' or 'jsonl'")
+
+        rows = 0
+        if format == "jsonl":
+            with open(path, "w", encoding="utf-8") as f:
+                for batch in cls.iter_batches(corpus, query, **kwargs):
+                    batch.to_json(f, orient="records", lines=True, force_ascii=False)
+                    rows += len(batch)
+            return rows
+
+        pa = import_pyarrow()
+        writer = None
+        try:
+            for batch in cls.iter_batches(corpus, query, **kwargs):
+                table = pa.Table.from_pandas(
+                    batch, schema=None if writer is None else writer.schema, preserve_index=False
+                )
+                if writer is None:
+                    writer = pa.parquet.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+                rows += len(batch)
+        finally:
+            if writer is not None:
+                writer.close()
+        return rows
+
     def show(self, n: int = 10, style: bool = True):
         result = self.concordance.sample(min(n, self.size))
 
@@ -90,6 +210,8 @@ class Collocations(DhlabObj):
         samplesize: int = 20000,
         alpha: bool = False,
         ignore_caps: bool = False,
+        max_workers: int | None = None,
+        provenance: bool = False,
     ):
         """Create collocations object
 
@@ -109,23 +231,40 @@ class Collocations(DhlabObj):
         :type alpha: bool, optional
         :param ignore_caps: Ignore capitalized letters, defaults to False
         :type ignore_caps: bool, optional
+        :param max_workers: number of words requested concurrently, defaults to
+            the ``max_workers`` of :func:`~dhlab.api.sharding.configure_sharding`
+        :type max_workers: int, optional
+        :param provenance: Add a column of counts for each of the `words`, defaults to False
+        :type provenance: bool, optional
         """
         if isinstance(words, str):
             words = [words]
 
         if corpus is not None and words is not None:
-            coll = pd.concat(
-                [
-                    urn_collocation(
-                        urns=urnlist(corpus),
-                        word=w,
-                        before=before,
-                        after=after,
-                        samplesize=samplesize,
-                    )
-                    for w in words
-                ]
-            )[["counts"]]
+            urns = urnlist(corpus)
+
+            def collocate(word):
+                coll = urn_collocation(
+                    urns=urns, word=word, before=before, after=after, samplesize=samplesize
+                )
+                return word, coll.get("counts", pd.Series(dtype="int64"))
+
+            # Add up the counts of each word as they arrive, in any order
+            counts = pd.Series(dtype="int64")
+            seeds = {}
+            results = iter_fan_out(
+                collocate, words, max_workers=max_workers, desc="Collocations", ordered=False
+            )
+            for word, part in results:
+                part = part.groupby(level=0).sum()
+                counts = counts.add(part, fill_value=0)
+                if provenance:
+                    seeds[word] = part
+
+            coll = counts.astype("int64").to_frame("counts")
+            if provenance:
+                seeds = {word: seeds[word] for word in dict.fromkeys(words)}
+                coll = coll.join(pd.DataFrame(seeds).fillna(0).astype("int64"))
         else:
             coll = pd.DataFrame()
 
@@ -145,19 +284,48 @@ class Collocations(DhlabObj):
         self.after = after
 
         if self.reference is not None:
-            teller = self.coll.counts / self.coll.counts.sum()
-            divisor = self.reference.iloc[:, 0] / self.reference.iloc[:, 0].sum()
-            self.coll["relevance"] = teller / divisor
+            self.coll["relevance"] = self.associations(measures=["relevance"])["relevance"]
 
         super().__init__(self.coll)
 
     def show(self, sortby: str = "counts", n: int = 20):
         return self.coll.sort_values(by=sortby, ascending=False).head(n)
 
-    def keywordlist(self, top: int = 200, counts: int = 5, relevance: float = 10):
-        mask = self.coll[self.coll.counts > counts]
-        mask = mask[mask.relevance > relevance]
-        return list(mask.sort_values(by="counts", ascending=False).head(200).index)
+    def associations(
+        self,
+        measures: list[str] | None = None,
+        reference: pd.DataFrame | None = None,
+        exponent: float = 1.1,
+    ) -> pd.DataFrame:
+        """Association measures of the collocates against a reference frequency list
+
+        :param measures: any of ``"relevance"``, ``"pmi"``, ``"g2"``, ``"chi2"``,
+            ``"dice"``, ``"t_score"`` and ``"assoc"``, defaults to all
+        :param reference: reference frequency list, defaults to the one given to the constructor
+        :param exponent: exponent of the ``"assoc"`` measure, like ``compute_assoc`` in ``dhlab.legacy.nbtext``
+        :return: a DataFrame with one column per measure, indexed like ``.coll``
+        """
+        if reference is not None:
+            scorer = AssociationScorer(reference)
+        else:
+            if self.reference is None:
+                raise ValueError("No reference frequency list given")
+            if self._scorer is None:
+                self._scorer = AssociationScorer(self.reference)
+            scorer = self._scorer
+        return scorer.score(self.coll.counts, measures=measures, exponent=exponent)
+
+    def keywordlist(
+        self, top: int = 200, counts: int = 5, relevance: float = 10, by: str = "counts"
+    ):
+        """The `top` collocates with more than `counts` occurrences and a relevance above `relevance`
+
+        :param by: column to rank by, e.g. ``"counts"`` or ``"relevance"``
+        """
+        mask = (self.coll.counts > counts).to_numpy() & (self.coll.relevance > relevance).to_numpy()
+        candidates = self.coll.index[mask]
+        ranked = top_k(self.coll[by].to_numpy()[mask], top)
+        return list(candidates[ranked])
 
     @classmethod
     def from_df(cls, df: pd.DataFrame):
@@ -171,6 +339,15 @@ class Collocations(DhlabObj):
         obj.frame = df
         return obj
 
+    @property
+    def reference(self):
+        return self._reference
+
+    @reference.setter
+    def reference(self, reference):
+        self._reference = reference
+        self._scorer = None
+
 
 class Counts(DhlabObj):
     """Provide counts for a corpus - shouldn't be too large"""
@@ -181,6 +358,7 @@ class Counts(DhlabObj):
         words: list[str] | None = None,
         cutoff: int = 0,
         sparse: bool = True,
+        backend: str = "pandas",
     ):
         """Get frequency list for Corpus
 
@@ -188,8 +366,20 @@ class Counts(DhlabObj):
         :param words: list of words to be counted, defaults to None
         :param cutoff: frequency cutoff, will not include words with frequency < cutoff
         :param sparse: return a sparse matrix for memory efficiency
+        :param backend: ``"pandas"`` to hold the counts in a DataFrame, or ``"scipy"`` to hold
+            whole-document counts in a :py:class:`~dhlab.api.sparse.SparseCounts` CSR matrix
+            (``.matrix``). The DataFrame is then only built when ``.frame`` is used.
         """
-        if corpus is None and words is None:
+        self._frame = None
+        self.matrix = None
+
+        if backend not in ("pandas", "scipy"):
+            raise ValueError("`backend` must be 'pandas' or 'scipy'")
+
+        if backend == "scipy" and corpus is not None and words is None:
+            self.matrix = get_sparse_frequencies(urns=urnlist(corpus), cutoff=cutoff)
+            self.title_dct = self._title_dct(corpus)
+        elif corpus is None and words is None:
             self.freq = pd.DataFrame()
             self.title_dct = None
         elif corpus is not None:
@@ -208,22 +398,45 @@ class Counts(DhlabObj):
             )
 
             # Include dhlab and title link in object
-            try:
-                self.title_dct = {
-                    k: v for k, v in zip(corpus.frame.dhlabid, corpus.frame.title)
-                }
-            except:
-                self.title_dct = None
+            self.title_dct = self._title_dct(corpus)
 
             # Add relative frequencies if available
             if words is not None:
                 self.relfreq = self.freq.relfreq
                 self.freq = self.freq.freq
 
-        super().__init__(self.freq)
+        super().__init__(self._frame)
+
+    @staticmethod
+    def _title_dct(corpus):
+        try:
+            return {k: v for k, v in zip(corpus.frame.dhlabid, corpus.frame.title)}
+        except:
+            return None
+
+    @property
+    def frame(self):
+        # Built on first use from the sparse matrix of the scipy backend
+        if self._frame is None and self.matrix is not None:
+            self._frame = self.matrix.to_frame()
+        return self._frame
+
+    @frame.setter
+    def frame(self, frame):
+        self._frame = frame
+
+    freq = frame
+
+    def _sparse_counts(self) -> SparseCounts:
+        """The counts as a SparseCounts matrix, converted from the frame if necessary."""
+        if self.matrix is None:
+            return SparseCounts.from_frame(self.frame)
+        return self.matrix
 
     def is_sparse(self):
         """Function to report sparsity of counts frame"""
+        if self.matrix is not None:
+            return True
         try:
             density = self.freq.sparse.density
             if density:
@@ -239,37 +452,49 @@ class Counts(DhlabObj):
         :return: frequency list for Corpus
         """
 
-        # Needed since Pandas seems to make sparse matrices dense when summing
+        # Pandas makes sparse matrices dense when summing, so sum the scipy matrix instead
         if self.is_sparse() == True:
-            # convert to coo matrix for iteration
-            coo_matrix = self.freq.sparse.to_coo()
-
-            # get the words and their indices
-            rowidx = {idx: word for idx, word in enumerate(list(self.freq.index))}
-
-            # build a freq dictionary by looping
-            freqDict = dict()
-
-            for i, j, v in zip(coo_matrix.row, coo_matrix.col, coo_matrix.data):
-                word = rowidx[i]
-                if word in freqDict:
-                    freqDict[word] += v
-                else:
-                    freqDict[word] = v
-
-            df = (
-                pd.DataFrame(freqDict.items(), columns=["word", "freq"])
-                .set_index("word")
-                .sort_values(by="freq", ascending=False)
-            )
+            totals = self._sparse_counts().sum()
+            df = totals[totals != 0].to_frame("freq").sort_values(by="freq", ascending=False)
             df.index.name = None
             return self.from_df(df)
         else:
             return self.from_df(self.counts.sum(axis=1).to_frame("freq"))
 
+    def select(self, words: list[str] | None = None, docs: list | None = None) -> "Counts":
+        """Subset of the counts for the given ``words`` and/or documents (dhlabids)."""
+        if self.matrix is not None:
+            return self.from_sparse_counts(self.matrix.select(words=words, docs=docs), self.title_dct)
+        df = self.frame
+        if words is not None:
+            df = df.loc[df.index.intersection(words, sort=False)]
+        if docs is not None:
+            df = df[df.columns.intersection(docs, sort=False)]
+        obj = self.from_df(df)
+        obj.title_dct = self.title_dct
+        return obj
+
+    def relative(self) -> "Counts":
+        """Relative frequencies, the counts divided by the number of counted tokens per document."""
+        if self.matrix is not None:
+            return self.from_sparse_counts(self.matrix.relative(), self.title_dct)
+        if self.is_sparse():
+            obj = self.from_df(SparseCounts.from_frame(self.frame).relative().to_frame())
+        else:
+            obj = self.from_df(self.frame / self.frame.sum(axis=0))
+        obj.title_dct = self.title_dct
+        return obj
+
+    def top(self, k: int = 10) -> pd.DataFrame:
+        """The ``k`` most frequent words of each document, as a table of
+        ``dhlabid``, ``word`` and ``freq``."""
+        return self._sparse_counts().top_k(k)
+
     def display_names(self):
         "Display data with record names as column titles."
         assert self.title_dct is not None, "No titles available"
+        if self.matrix is not None and self._frame is None:
+            return self.matrix.rename_docs(self.title_dct).to_frame()
         return self.frame.rename(self.title_dct, axis=1)
 
     def display_rel_names(self):
@@ -283,6 +508,87 @@ class Counts(DhlabObj):
         obj.frame = df
         return obj
 
+    @classmethod
+    def from_sparse_counts(cls, matrix: SparseCounts, title_dct: dict | None = None):
+        """Typecast a SparseCounts matrix to Counts with the scipy backend"""
+        obj = Counts()
+        obj.matrix = matrix
+        obj.frame = None
+        obj.title_dct = title_dct
+        return obj
+
+    def _to_arrow(self):
+        """The counts as a table of non-zero ``word``, ``dhlabid``, ``freq`` (COO) entries.
+
+        The documents, in column order, are kept in the schema metadata.
+        """
+        pa = import_pyarrow()
+        matrix = self._sparse_counts()
+        coo = matrix.matrix.tocoo()
+        table = pa.table(
+            {
+                "word": pa.array(matrix.words[coo.row], type=pa.string()),
+                "dhlabid": pa.array(matrix.docs[coo.col]),
+                "freq": pa.array(coo.data),
+            }
+        )
+        docs = json.dumps(matrix.docs.tolist(), ensure_ascii=False, default=str)
+        return table.replace_schema_metadata({"dhlab.counts.docs": docs})
+
+    @classmethod
+    def _from_arrow(cls, table, docs: list | None = None):
+        metadata = table.schema.metadata or {}
+        stored_docs = metadata.get(b"dhlab.counts.docs")
+        if docs is None and stored_docs is not None:
+            docs = json.loads(stored_docs)
+        words = table.column("word").to_numpy(zero_copy_only=False)
+        dhlabids = table.column("dhlabid").to_numpy(zero_copy_only=False)
+        rows, vocab = pd.factorize(words)
+        if docs is None:
+            cols, docs = pd.factorize(dhlabids)
+        else:
+            cols = pd.Index(docs).get_indexer(dhlabids)
+        matrix = SparseCounts.from_codes(rows, cols, table.column("freq").to_numpy(), vocab, docs)
+        return cls.from_sparse_counts(matrix)
+
+    def to_parquet(self, path, compression: str = "snappy"):
+        "Write the non-zero counts to a Parquet file, as columns ``word``, ``dhlabid`` and ``freq``"
+        pa = import_pyarrow()
+        pa.parquet.write_table(self._to_arrow(), path, compression=compression)
+
+    def to_feather(self, path, compression: str = "lz4"):
+        "Write the non-zero counts to an Arrow IPC (Feather) file, like ``to_parquet``"
+        pa = import_pyarrow()
+        pa.feather.write_feather(self._to_arrow(), path, compression=compression)
+
+    @classmethod
+    def from_parquet(cls, path, columns: list | None = None, memory_map: bool = False):
+        """Import counts written by ``to_parquet``, with the scipy backend
+
+        :param path: Parquet file
+        :param columns: only read the counts of these documents (dhlabids), defaults to all
+        :param memory_map: memory map the file instead of reading it into memory
+        """
+        pa = import_pyarrow()
+        filters = None if columns is None else [("dhlabid", "in", list(columns))]
+        table = pa.parquet.read_table(path, filters=filters, memory_map=memory_map)
+        return cls._from_arrow(table, docs=columns)
+
+    @classmethod
+    def from_feather(cls, path, columns: list | None = None, memory_map: bool = True):
+        """Import counts written by ``to_feather``, with the scipy backend
+
+        :param path: Arrow IPC (Feather) file
+        :param columns: only read the counts of these documents (dhlabids), defaults to all
+        :param memory_map: memory map the file instead of reading it into memory
+        """
+        pa = import_pyarrow()
+        table = pa.feather.read_table(path, memory_map=memory_map)
+        if columns is not None:
+            docs = pa.array(list(columns), type=table.schema.field("dhlabid").type)
+            table = table.filter(pa.compute.is_in(table.column("dhlabid"), value_set=docs))
+        return cls._from_arrow(table, docs=columns)
+
     ### Legacy properties and methods ###
 
     @property
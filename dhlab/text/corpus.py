@@ -1,15 +1,21 @@
 # Allow lazy evaluation of parent class type within staticmethod
 from __future__ import annotations
 
-from typing import List, Union
+import time
+from typing import Iterator, List, Tuple, Union
 
+import numpy as np
 import pandas as pd
 from pandas import DataFrame
-from tqdm import tqdm
 
 import dhlab.text.conc_coll as dh
+from dhlab.api import utils as api_utils
 from dhlab.api.dhlab_api import document_corpus, evaluate_documents, get_metadata
+from dhlab.api.sharding import iter_fan_out
+from dhlab.api.utils import CircuitOpenError
+from dhlab.constants import BASE_URL
 from dhlab.text.dhlab_object import DhlabObj
+from dhlab.text.metadata_index import MetadataIndex
 from dhlab.text.utils import urnlist
 
 
@@ -52,6 +58,7 @@ class Corpus(DhlabObj):
         limit_by_year: bool = False,
         order_by: str | None = "random",
         allow_duplicates: bool = False,
+        max_workers: int | None = None,
     ):
         """Create Corpus
 
@@ -80,6 +87,8 @@ class Corpus(DhlabObj):
             Example: ``"nob"`` or ``"nno"``
         :param int limit: number of items to sample.
         :param bool limit_by_year: sample from each year in the query year range.
+        :param int max_workers: number of years requested concurrently with ``limit_by_year``.
+            Defaults to the ``max_workers`` of :func:`~dhlab.api.sharding.configure_sharding`.
         """
 
         if (
@@ -101,37 +110,30 @@ class Corpus(DhlabObj):
         ):
 
             if limit_by_year == True and from_year and to_year:
-                year_range = range(from_year, to_year)
-
-                years = []
-
-                for year in tqdm(year_range):
-                    from_year = year
-                    to_year = year+1
-
-                    year_corpus = document_corpus(
-                        doctype,
-                        author,
-                        freetext,
-                        fulltext,
-                        from_year,
-                        to_year,
-                        from_timestamp,
-                        to_timestamp,
-                        title,
-                        ddk,
-                        subject,
-                        publisher,
-                        literaryform,
-                        genres,
-                        city,
-                        lang,
-                        limit,
-                        order_by,
+                query = dict(
+                    doctype=doctype,
+                    author=author,
+                    freetext=freetext,
+                    fulltext=fulltext,
+                    from_timestamp=from_timestamp,
+                    to_timestamp=to_timestamp,
+                    title=title,
+                    ddk=ddk,
+                    subject=subject,
+                    publisher=publisher,
+                    literaryform=literaryform,
+                    genres=genres,
+                    city=city,
+                    lang=lang,
+                    limit=limit,
+                    order_by=order_by,
+                )
+                years = [
+                    frame
+                    for _, frame in _iter_year_corpora(
+                        query, range(from_year, to_year), max_workers
                     )
-
-                    years.append(year_corpus)
-                
+                ]
                 self.frame = pd.concat(years).reset_index(drop=True)
 
             else:
@@ -164,6 +166,39 @@ class Corpus(DhlabObj):
         if not allow_duplicates:
             self._check_for_urn_duplicates()
 
+    @classmethod
+    def iter_by_year(
+        cls,
+        from_year: int,
+        to_year: int,
+        max_workers: int | None = None,
+        allow_duplicates: bool = False,
+        **query,
+    ) -> Iterator[Tuple[int, Corpus]]:
+        """Build a corpus sampled per year, and yield the part of each year as soon as it is ready
+
+        The years are requested concurrently, and yielded in order:
+
+        .. code-block:: python
+
+            corpus = Corpus()
+            for year, part in Corpus.iter_by_year(1800, 2020, doctype="digibok", limit=10):
+                corpus.add(part)
+
+        :param int from_year: first year
+        :param int to_year: end year (exclusive), like ``Corpus(limit_by_year=True)``
+        :param int max_workers: number of years requested concurrently
+        :param bool allow_duplicates: keep duplicate URNs within a year
+        :param query: the other arguments of :py:class:`Corpus`, e.g. ``doctype`` and ``limit``
+        """
+        query.setdefault("limit", 10)
+        query.setdefault("order_by", "random")
+        for year, frame in _iter_year_corpora(query, range(from_year, to_year), max_workers):
+            part = cls.from_df(frame.reset_index(drop=True))
+            if not allow_duplicates and "urn" in part.frame.columns:
+                part._check_for_urn_duplicates()
+            yield year, part
+
     @property
     def corpus(self):
         return self.frame
@@ -173,12 +208,32 @@ class Corpus(DhlabObj):
         self.frame = frame
 
     @classmethod
-    def from_identifiers(cls, identifiers: List[Union[str, int]]):
-        """Construct Corpus from list of identifiers"""
+    def from_identifiers(cls, identifiers: List[Union[str, int]], lazy: bool = False):
+        """Construct Corpus from list of identifiers
+
+        :param identifiers: URNs or dhlabids
+        :param lazy: return a :py:class:`LazyCorpus`, which only fetches
+            the metadata when the frame is used
+        """
+        if lazy:
+            return LazyCorpus(identifiers)
         corpus = Corpus()
         corpus.extend_from_identifiers(identifiers=identifiers)
         return corpus
 
+    @property
+    def frame(self) -> DataFrame:
+        """The metadata of the documents. Rows added with :py:meth:`add` are merged in on first use."""
+        builder = getattr(self, "_builder", None)
+        if builder is not None:
+            self._frame = builder.to_frame()
+        return self._frame
+
+    @frame.setter
+    def frame(self, frame: DataFrame):
+        self._frame = frame
+        self._builder = None
+
     @classmethod
     def from_df(cls, df: DataFrame, check_for_urn: bool = False) -> Corpus | pd.Series:
         """Typecast Pandas DataFrame to Corpus class
@@ -232,11 +287,24 @@ class Corpus(DhlabObj):
         return df[cols].fillna(0)
 
     def add(self, new_corpus: Union[DataFrame, Corpus]):
-        """Utility for appending Corpus or DataFrame to self"""
-        if isinstance(new_corpus, Corpus):
-            new_corpus = new_corpus.frame
-        self.frame = pd.concat([self.frame, new_corpus])
-        self._drop_urn_duplicates()
+        """Utility for appending Corpus or DataFrame to self
+
+        The corpus keeps a :py:class:`CorpusBuilder` between calls, so adding
+        rows costs time proportional to the new rows, and the frame is
+        assembled once, when it is next used. The builder is dropped when the
+        frame is replaced; after other in-place edits that reorder or remove
+        rows of ``.frame``, assign it back (``corpus.frame = corpus.frame``).
+        """
+        builder = getattr(self, "_builder", None)
+        in_sync = builder is not None and (
+            builder._frame is None  # rows added since the frame was last used
+            or (builder._frame is self._frame and len(self._frame) == len(builder))
+        )
+        if not in_sync:
+            # one pass over the current rows, then only the new ones
+            builder = CorpusBuilder(self.frame)
+        builder.add(new_corpus)
+        self._builder = builder
 
     def sample(self, n: int = 5):
         """Create random subkorpus with `n` entries"""
@@ -246,14 +314,59 @@ class Corpus(DhlabObj):
 
     def only_one_author(self):
         """Only select items with one author"""
-        mask = self.frame.author.apply(lambda x: len(x.split("/"))) == 1
+        mask = self.metadata_index.count_parts("author") == 1
         return self.from_df(self.frame[mask])
 
     def only_one_language(self):
         """Only select items with one language"""
-        mask = self.frame.langs.apply(lambda x: len(x.split("/"))) == 1
+        mask = self.metadata_index.count_parts("langs") == 1
         return self.from_df(self.frame[mask])
 
+    @property
+    def metadata_index(self) -> MetadataIndex:
+        """Cached indexes of the metadata columns, used by :py:meth:`mask` and :py:meth:`filter`
+
+        Rebuilt when the frame is replaced, or changes length. ``add`` and duplicate
+        removal rebuild it too. After other in-place edits of ``.frame``, such as
+        assigning to a column, call ``corpus.metadata_index.invalidate()``.
+        """
+        index = getattr(self, "_metadata_index", None)
+        if index is None or not index.is_valid_for(self.frame):
+            index = self._metadata_index = MetadataIndex(self.frame)
+        return index
+
+    def mask(
+        self, year_range: tuple | None = None, regex: bool = True, **fields
+    ) -> np.ndarray:
+        """Boolean array marking the documents that match all the filters
+
+        :param year_range: first and last year, inclusive
+        :param regex: match the ``fields`` as regular expressions, like ``str.contains``.
+            If ``False``, match exact ``"/"``-separated parts, e.g. one of several authors.
+        :param fields: column name and pattern, e.g. ``author="Ibsen"``, or a list of
+            values with ``regex=False``
+        """
+        index = self.metadata_index
+        mask = np.ones(len(self.frame), dtype=bool)
+        if year_range is not None:
+            mask &= index.between("year", int(year_range[0]), int(year_range[1]))
+        for key, val in fields.items():
+            if regex:
+                mask &= index.contains(key, val)
+            else:
+                mask &= index.has(key, val)
+        return mask
+
+    def filter(self, year_range: tuple | None = None, regex: bool = True, **fields) -> Corpus:
+        """Subcorpus of the documents matching all the filters, see :py:meth:`mask`
+
+        .. code-block:: python
+
+            corpus.filter(year_range=(1900, 1920), author="Ibsen|Bjørnson", langs="nob")
+        """
+        mask = self.mask(year_range=year_range, regex=regex, **fields)
+        return self.from_df(self.frame.iloc[np.flatnonzero(mask)])
+
     def conc(self, words: str | None, window: int = 20, limit: int = 500) -> dh.Concordance:
         """Get concodances of `words` in corpus"""
         return dh.Concordance(
@@ -294,7 +407,7 @@ class Corpus(DhlabObj):
     @staticmethod
     def _is_Corpus(corpus: "Corpus") -> bool:
         """Check if `input` is Corpus or DataFrame"""
-        if type(corpus) not in [DataFrame, Corpus]:
+        if not isinstance(corpus, (DataFrame, Corpus)):
             raise TypeError("Input is not Corpus or DataFrame")
         return isinstance(corpus, Corpus) | isinstance(corpus, DataFrame)
 
@@ -303,10 +416,7 @@ class Corpus(DhlabObj):
         """Add two Corpus objects"""
         if not self._is_Corpus(other):
             raise TypeError("Input is not Corpus or DataFrame")
-        new = self.from_df(pd.concat([self.frame, other.frame]).reset_index(drop=True))
-        new._drop_urn_duplicates()
-
-        return new
+        return self.from_df(CorpusBuilder(self).add(other).to_frame())
 
     def _make_subcorpus(self, **kwargs) -> Corpus | pd.Series | None:
         dct = kwargs.copy()
@@ -317,21 +427,7 @@ class Corpus(DhlabObj):
                 print(f"Key {key} not in corpus")
                 return None
 
-        # Make result dataframe
-        res = self.frame.copy()
-
-        # Get year range
-        if year_range is not None:
-            y1 = int(year_range[0])
-            y2 = int(year_range[1])
-
-            # Apply year range
-            res = res.loc[res["year"] >= y1].loc[res["year"] <= y2]
-
-        for key, val in dct.items():
-            res = res.loc[res[key].str.contains(val)]
-
-        return self.from_df(res)
+        return self.filter(year_range=year_range, **dct)
 
     def make_subcorpus(self, authors: str | None = None, title: str | None = None) -> Corpus | pd.Series | None:
         """Make subcorpus based on author and title
@@ -402,13 +498,268 @@ class Corpus(DhlabObj):
         """Drop duplicate URNs in corpus
 
         dhlab sometimes contains multiple versions of the text for a text object.
-        Usually these are different OCR results. This method drops all but the last as this is usually the best.
+        Usually these are different OCR results. This method keeps the one with the highest
+        dhlabid, as this is usually the best; rows without a dhlabid lose to rows with one,
+        and of equal dhlabids the later row wins, the same rule as :py:class:`CorpusBuilder`.
         Dhlabid is always unique."""
 
         if len(self.frame) == 0:
             return
 
-        self.frame.sort_values(by="dhlabid", inplace=True)
+        self._metadata_index = None
+        self._builder = None
+        self.frame.sort_values(by="dhlabid", inplace=True, kind="stable", na_position="first")
         self.frame.drop_duplicates(subset="urn", inplace=True, keep="last")
         if reset_index:
             self.frame.reset_index(drop=True, inplace=True)
+
+
+class CorpusBuilder:
+    """Append-optimized builder for a Corpus without duplicate URNs
+
+    Keeps a hash index from each URN to the row with the highest dhlabid,
+    like :py:meth:`Corpus._drop_urn_duplicates`: rows without a dhlabid lose to rows
+    with one, and of equal dhlabids the later row wins. Adding rows costs time
+    proportional to the new rows. The frame is only assembled by :py:meth:`to_frame`.
+
+    .. code-block:: python
+
+        builder = CorpusBuilder()
+        for author in authors:
+            builder.add(Corpus(author=author, limit=10))
+        corpus = builder.to_corpus()
+    """
+
+    def __init__(self, corpus: Union[DataFrame, Corpus, None] = None):
+        self._chunks: List[DataFrame] = []
+        # urn -> (dhlabid, chunk number, row position in chunk)
+        self._best: dict = {}
+        self._frame: DataFrame | None = None
+        if corpus is not None:
+            self.add(corpus)
+
+    def __len__(self):
+        return len(self._best)
+
+    def add(self, new_corpus: Union[DataFrame, Corpus]) -> CorpusBuilder:
+        """Add the rows of a Corpus or DataFrame. A URN already added is replaced if
+        the new row has the same or a higher dhlabid."""
+        frame = new_corpus.frame if isinstance(new_corpus, Corpus) else new_corpus
+        if len(frame) == 0:
+            if not self._chunks:
+                self._chunks.append(frame)
+            return self
+
+        urns = frame["urn"].tolist()
+        if "dhlabid" in frame.columns:
+            dhlabids = pd.to_numeric(frame["dhlabid"], errors="coerce").fillna(-np.inf).tolist()
+        else:
+            dhlabids = [-np.inf] * len(urns)
+
+        chunk = len(self._chunks)
+        best = self._best
+        for pos, (urn, dhlabid) in enumerate(zip(urns, dhlabids)):
+            current = best.get(urn)
+            if current is None or dhlabid >= current[0]:
+                best[urn] = (dhlabid, chunk, pos)
+
+        self._chunks.append(frame)
+        self._frame = None
+        return self
+
+    def to_frame(self) -> DataFrame:
+        """The deduplicated corpus frame, sorted by dhlabid"""
+        if self._frame is not None:
+            return self._frame
+        if not self._best:
+            return self._chunks[0].iloc[:0].copy() if self._chunks else pd.DataFrame(columns=["urn"])
+
+        keep = np.array([(chunk, pos) for _, chunk, pos in self._best.values()], dtype=np.int64)
+        parts = []
+        for chunk in np.unique(keep[:, 0]):
+            positions = np.sort(keep[keep[:, 0] == chunk, 1])
+            parts.append(self._chunks[chunk].iloc[positions])
+        frame = pd.concat(parts, ignore_index=True)
+        if "dhlabid" in frame.columns:
+            frame = frame.sort_values(by="dhlabid", kind="stable", na_position="first", ignore_index=True)
+
+        # Continue from the compacted frame
+        best = self._best
+        self._chunks = [frame]
+        self._best = {urn: (best[urn][0], 0, pos) for pos, urn in enumerate(frame["urn"].tolist())}
+        self._frame = frame
+        return frame
+
+    def to_corpus(self) -> Corpus:
+        """The deduplicated Corpus"""
+        return Corpus.from_df(self.to_frame())
+
+
+class LazyCorpus(Corpus):
+    """Corpus that only holds the identifiers (URNs or dhlabids) of its documents
+
+    The metadata is fetched with :func:`~dhlab.api.dhlab_api.get_metadata`, in
+    batches, the first time ``.frame`` is used, and kept. ``sample``, ``+`` and
+    duplicate removal only need the identifiers and do not fetch anything.
+    Counting, concordances and collocations need URNs: a corpus made from URNs
+    does not fetch anything for them either, while one made from dhlabids
+    fetches its metadata once to look up the URNs.
+    """
+
+    def __init__(self, identifiers: List[Union[str, int]] | None = None):
+        """
+        :param identifiers: URNs or dhlabids
+        """
+        identifiers = [] if identifiers is None else identifiers
+        if pd.api.types.infer_dtype(identifiers, skipna=False) == "integer":
+            self._identifiers = np.asarray(identifiers, dtype=np.int64)
+        else:
+            self._identifiers = np.array(identifiers, dtype=object)
+        self._frame = None
+        self._builder = None
+
+    @property
+    def identifiers(self) -> np.ndarray:
+        """The URNs, or the identifiers the corpus was made from if the metadata is not fetched"""
+        if self.is_loaded and "urn" in self.frame.columns:
+            return self.frame.urn.to_numpy(dtype=object)
+        return self._identifiers
+
+    @property
+    def frame(self) -> DataFrame:
+        if self._frame is None:
+            if len(self._identifiers) and self._has_dhlabids:
+                self._frame = get_metadata(dhlabids=self._identifiers.tolist())
+            elif len(self._identifiers):
+                self._frame = get_metadata(urns=self._identifiers.tolist())
+            else:
+                self._frame = pd.DataFrame(columns=["urn"])
+        if self._builder is not None:
+            self._frame = self._builder.to_frame()
+        return self._frame
+
+    @frame.setter
+    def frame(self, frame: DataFrame):
+        self._frame = frame
+        self._builder = None
+
+    @property
+    def is_loaded(self) -> bool:
+        """Whether the metadata has been fetched"""
+        return self._frame is not None
+
+    @property
+    def _has_dhlabids(self) -> bool:
+        return self._identifiers.dtype.kind == "i"
+
+    @property
+    def size(self):
+        return len(self.identifiers)
+
+    def __len__(self):
+        return len(self.identifiers)
+
+    def __repr__(self) -> str:
+        if self.is_loaded:
+            return super().__repr__()
+        return f"<LazyCorpus: {len(self.identifiers)} documents, metadata not fetched>"
+
+    def _repr_html_(self) -> Union[str, None]:
+        if self.is_loaded:
+            return super()._repr_html_()
+        return None
+
+    def urnlist(self) -> list:
+        """The URNs, as a list. A corpus made from dhlabids fetches its metadata to look them up."""
+        if self._has_dhlabids:
+            return self.frame.urn.tolist()
+        return self.identifiers.tolist()
+
+    def sample(self, n: int = 5):
+        """Create random subkorpus with `n` entries"""
+        if self.is_loaded:
+            return super().sample(n)
+        n = min(n, self.size)
+        return LazyCorpus(np.random.choice(self.identifiers, n, replace=False))
+
+    def __add__(self, other: Corpus):
+        """Add two Corpus objects, without fetching metadata if both are lazy"""
+        if isinstance(other, LazyCorpus) and not (self.is_loaded or other.is_loaded):
+            new = LazyCorpus(np.concatenate([self.identifiers, other.identifiers]).tolist())
+            new._drop_urn_duplicates()
+            return new
+        return Corpus.from_df(self.frame) + other
+
+    def _check_for_urn_duplicates(self):
+        self._drop_urn_duplicates()
+
+    def _drop_urn_duplicates(self, reset_index=True):
+        if self.is_loaded:
+            return super()._drop_urn_duplicates(reset_index=reset_index)
+        self._identifiers = pd.unique(self._identifiers)
+
+    def count(self, words: list[str] | None = None, cutoff: int = 0, sparse: bool = True):
+        """Get word frequencies for corpus"""
+        return dh.Counts(self.urnlist(), words, cutoff, sparse)
+
+    def freq(self, words: list[str] | None = None, cutoff: int = 0, sparse: bool = True):
+        """Get word frequencies for corpus"""
+        return dh.Counts(self.urnlist(), words, cutoff, sparse)
+
+    def conc(self, words: str | None, window: int = 20, limit: int = 500) -> dh.Concordance:
+        """Get concodances of `words` in corpus"""
+        return dh.Concordance(corpus=self.urnlist(), query=words, window=window, limit=limit)
+
+    def coll(
+        self,
+        words: str | list[str] | None = None,
+        before: int = 10,
+        after: int = 10,
+        reference: pd.DataFrame | None = None,
+        samplesize: int = 20000,
+        alpha: bool = False,
+        ignore_caps: bool = False,
+    ) -> dh.Collocations:
+        """Get collocations of `words` in corpus"""
+        return dh.Collocations(
+            corpus=self.urnlist(),
+            words=words,
+            before=before,
+            after=after,
+            reference=reference,
+            samplesize=samplesize,
+            alpha=alpha,
+            ignore_caps=ignore_caps,
+        )
+
+
+def _iter_year_corpora(
+    query: dict, years: range, max_workers: int | None = None, retries: int = 2
+) -> Iterator[Tuple[int, DataFrame]]:
+    """Request ``document_corpus`` for each of ``years`` concurrently, and yield the frames in year order.
+
+    Failed requests are already retried by :py:obj:`~dhlab.api.utils.retry_policy`.
+    Years that were not sent because the circuit breaker was open are requested again,
+    one at a time once the breaker lets a trial request through, up to ``retries`` times.
+    """
+
+    def year_corpus(year):
+        return document_corpus(**query, from_year=year, to_year=year + 1)
+
+    def try_year_corpus(year):
+        try:
+            return year_corpus(year)
+        except CircuitOpenError as error:
+            return error
+
+    results = iter_fan_out(try_year_corpus, years, max_workers=max_workers, desc="Years")
+    for year, frame in zip(years, results):
+        for _ in range(retries):
+            if not isinstance(frame, CircuitOpenError):
+                break
+            while api_utils.circuit_breaker.state(BASE_URL) == "open":
+                time.sleep(0.5)
+            frame = try_year_corpus(year)
+        if isinstance(frame, CircuitOpenError):
+            raise frame
+        yield year, frame
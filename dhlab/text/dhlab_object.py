@@ -1,9 +1,32 @@
 from abc import ABC
-from typing import Union
+from typing import List, Union
 
 import pandas as pd
 
 
+def import_pyarrow():
+    """Import pyarrow with its Parquet and Feather modules, which are optional dependencies."""
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.feather
+        import pyarrow.parquet
+    except ImportError as err:
+        raise ImportError(
+            "Parquet and Feather files require pyarrow: pip install 'dhlab[arrow]'"
+        ) from err
+    return pyarrow
+
+
+def _with_index_columns(schema, columns: List[str] | None) -> List[str] | None:
+    """Add the stored pandas index columns of ``schema`` to a ``columns`` projection."""
+    if columns is None:
+        return None
+    metadata = schema.pandas_metadata or {}
+    index = [c for c in metadata.get("index_columns", []) if isinstance(c, str)]
+    return [c for c in index if c not in columns] + list(columns)
+
+
 class DhlabObj(ABC):
     """DHLAB base class
 
@@ -71,6 +94,16 @@ class DhlabObj(ABC):
         "Write to excel"
         self.frame.to_excel(path, index=None)
 
+    def to_parquet(self, path, compression: str = "snappy"):
+        "Write to a Parquet file"
+        pa = import_pyarrow()
+        pa.parquet.write_table(pa.Table.from_pandas(self.frame), path, compression=compression)
+
+    def to_feather(self, path, compression: str = "lz4"):
+        "Write to an Arrow IPC (Feather) file"
+        pa = import_pyarrow()
+        pa.feather.write_feather(pa.Table.from_pandas(self.frame), path, compression=compression)
+
     # @abstractmethod
     def from_df(cls, df):
         "Typecast Pandas DataFrame to dhlab class"
@@ -81,3 +114,32 @@ class DhlabObj(ABC):
         "Import corpus from csv"
         df = pd.read_csv(path)
         return cls.from_df(df)
+
+    @classmethod
+    def from_parquet(cls, path, columns: List[str] | None = None, memory_map: bool = False):
+        """Import from a Parquet file
+
+        :param path: file written by ``to_parquet``
+        :param columns: only read these columns, defaults to all
+        :param memory_map: memory map the file instead of reading it into memory
+        """
+        pa = import_pyarrow()
+        table = pa.parquet.read_table(
+            path, columns=columns, memory_map=memory_map, use_pandas_metadata=True
+        )
+        return cls.from_df(table.to_pandas())
+
+    @classmethod
+    def from_feather(cls, path, columns: List[str] | None = None, memory_map: bool = True):
+        """Import from an Arrow IPC (Feather) file
+
+        :param path: file written by ``to_feather``
+        :param columns: only read these columns, defaults to all
+        :param memory_map: memory map the file instead of reading it into memory
+        """
+        pa = import_pyarrow()
+        schema = pa.ipc.open_file(path).schema
+        table = pa.feather.read_table(
+            path, columns=_with_index_columns(schema, columns), memory_map=memory_map
+        )
+        return cls.from_df(table.to_pandas())
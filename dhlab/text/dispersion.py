@@ -1,14 +1,142 @@
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+import numpy as np
 import pandas as pd
 
-from dhlab.api.dhlab_api import get_dispersion
+from dhlab.api.dhlab_api import get_chunks, get_dispersion
+from dhlab.api.sharding import fan_out
+from dhlab.api.sparse import SparseCounts
 from dhlab.text.dhlab_object import DhlabObj
 
 
+def _wordbags(wordbag) -> Dict[str, List[str]]:
+    """Normalize a word, list of words or dict of wordbags to ``{name: [words]}``"""
+    if isinstance(wordbag, str):
+        return {wordbag: [wordbag]}
+    if isinstance(wordbag, list):
+        return {w: [w] for w in wordbag}
+    if isinstance(wordbag, dict):
+        return {k: list(v) for k, v in wordbag.items()}
+    return {}
+
+
+@lru_cache(maxsize=4096)
+def _fetch_dispersion(urn: str, words: Tuple[str, ...], window: int, pr: int) -> pd.Series:
+    return get_dispersion(urn, words=list(words), window=window, pr=pr)
+
+
+def _cached_dispersion(urn: str, words: Tuple[str, ...], window: int, pr: int) -> pd.Series:
+    """A copy of the cached dispersion, so callers can modify it"""
+    return _fetch_dispersion(urn, words, window, pr).copy()
+
+
+@lru_cache(maxsize=64)
+def _cached_chunks(urn: str, chunk_size: int) -> SparseCounts:
+    chunks = get_chunks(urn=urn, chunk_size=chunk_size)
+    if isinstance(chunks, dict):
+        chunks = list(chunks.values())
+    return SparseCounts.from_dict({i: chunk for i, chunk in enumerate(chunks)})
+
+
+def clear_dispersion_cache() -> None:
+    """Forget the dispersions and chunk frequencies fetched so far in this process"""
+    _fetch_dispersion.cache_clear()
+    _cached_chunks.cache_clear()
+
+
+class LocalDispersion:
+    """Dispersion curves computed locally from the chunk frequencies of a document
+
+    The frequencies of each chunk of ``chunk_size`` tokens are fetched once with
+    :func:`~dhlab.api.dhlab_api.get_chunks`, and cached for the process. Curves for
+    any words and any window that is a multiple of ``chunk_size`` are then summed
+    up locally, without new requests.
+
+    :param urn: uniform resource name
+    :param chunk_size: the resolution, in tokens, of the windows
+    """
+
+    def __init__(self, urn: str, chunk_size: int = 100):
+        self.urn = urn
+        self.chunk_size = chunk_size
+        self.chunks = _cached_chunks(urn, chunk_size)
+
+    def __len__(self):
+        """Number of chunks in the document"""
+        return len(self.chunks.docs)
+
+    def chunk_counts(self, words: List[str]) -> np.ndarray:
+        """Summed frequency of ``words`` in each chunk"""
+        selected = self.chunks.select(words=words)
+        return np.asarray(selected.matrix.sum(axis=0)).ravel()
+
+    def _chunks_per(self, tokens: int, name: str) -> int:
+        if tokens < self.chunk_size or tokens % self.chunk_size:
+            raise ValueError(f"`{name}` must be a multiple of the chunk size, {self.chunk_size}")
+        return tokens // self.chunk_size
+
+    def curve(self, words: List[str], window: int = 1000, pr: int = 100) -> pd.Series:
+        """Counts of ``words`` in windows of ``window`` tokens, one window every ``pr`` tokens"""
+        width = self._chunks_per(window, "window")
+        step = self._chunks_per(pr, "pr")
+        n = len(self)
+        totals = np.concatenate([[0], np.cumsum(self.chunk_counts(words))])
+        starts = np.arange(0, max(n - width, 0) + 1, step)
+        return pd.Series(totals[np.minimum(starts + width, n)] - totals[starts])
+
+    def dispersion(self, wordbag, window: int = 1000, pr: int = 100) -> pd.DataFrame:
+        """Curves for a word, a list of words or a dict of wordbags, one column each"""
+        return pd.DataFrame(
+            {name: self.curve(words, window=window, pr=pr) for name, words in _wordbags(wordbag).items()}
+        )
+
+
+def dispersion_matrices(
+    urns: List[str],
+    wordbag,
+    window: int = 1000,
+    pr: int = 100,
+    max_workers: int | None = None,
+) -> Dict[str, pd.DataFrame]:
+    """Dispersion of several words or wordbags in several documents
+
+    The server sums the counts of all the words in one request, so each word
+    (or wordbag) is a separate request. All the requests, for all documents,
+    run concurrently, and the results are kept in a process-wide cache.
+
+    :param urns: uniform resource names
+    :param wordbag: a word, a list of words, or a dict of named lists of words
+    :param window: The number of tokens to search through per row
+    :param pr: defaults to 100
+    :param max_workers: number of concurrent requests
+    :return: a dict from each URN to a frame with one row per window and one column per word
+    """
+    bags = _wordbags(wordbag)
+    calls = [(urn, name, tuple(words)) for urn in urns for name, words in bags.items()]
+
+    def request(call):
+        urn, _, words = call
+        return _cached_dispersion(urn, words, window, pr)
+
+    results = fan_out(request, calls, max_workers=max_workers, desc="dispersion")
+
+    matrices = {urn: {} for urn in urns}
+    for (urn, name, _), series in zip(calls, results):
+        matrices[urn][name] = series
+    return {urn: pd.DataFrame(columns) for urn, columns in matrices.items()}
+
+
 class Dispersion(DhlabObj):
     """Count occurrences of words in the given URN object."""
 
     def __init__(
-        self, urn: str | None = None, wordbag: list | None = None, window: int = 1000, pr: int = 100
+        self,
+        urn: str | None = None,
+        wordbag: list | None = None,
+        window: int = 1000,
+        pr: int = 100,
+        max_workers: int | None = None,
     ):
         """Wrapper class for get_dispersion
 
@@ -20,26 +148,45 @@ class Dispersion(DhlabObj):
         :type window: int, optional
         :param pr: defaults to 100
         :type pr: int, optional
+        :param max_workers: number of words requested concurrently
+        :type max_workers: int, optional
         """
-        if isinstance(wordbag, list):
-            dispersion = {
-                w: get_dispersion(urn, words=[w], window=window, pr=pr) for w in wordbag
-            }
-        elif isinstance(wordbag, dict):
-            dispersion = {
-                w: get_dispersion(urn, words=wordbag[w], window=window, pr=pr)
-                for w in wordbag
-            }
-        elif isinstance(wordbag, str):
-            dispersion = {
-                wordbag: get_dispersion(urn, words=[wordbag], window=window, pr=pr)
-            }
+        if urn is not None and _wordbags(wordbag):
+            self.dispersion = dispersion_matrices(
+                [urn], wordbag, window=window, pr=pr, max_workers=max_workers
+            )[urn]
         else:
-            dispersion = {}
-        self.dispersion = pd.DataFrame(dispersion)
+            self.dispersion = pd.DataFrame({})
 
         super().__init__(self.dispersion)
 
+    @classmethod
+    def from_urns(
+        cls,
+        urns: List[str],
+        wordbag,
+        window: int = 1000,
+        pr: int = 100,
+        max_workers: int | None = None,
+    ) -> Dict[str, "Dispersion"]:
+        """Dispersions of the same words in several documents, requested concurrently
+
+        :return: a dict from each URN to its Dispersion
+        """
+        matrices = dispersion_matrices(urns, wordbag, window=window, pr=pr, max_workers=max_workers)
+        return {urn: cls.from_df(df) for urn, df in matrices.items()}
+
+    @classmethod
+    def local(
+        cls, urn: str, wordbag, window: int = 1000, pr: int = 100, chunk_size: int = 100
+    ) -> "Dispersion":
+        """Dispersion computed locally from cached chunk frequencies, see :py:class:`LocalDispersion`
+
+        Changing ``window`` or ``pr`` for the same document does not make new requests.
+        """
+        engine = LocalDispersion(urn, chunk_size=chunk_size)
+        return cls.from_df(engine.dispersion(wordbag, window=window, pr=pr))
+
     def plot(self, **kwargs):
         self.dispersion.plot(**kwargs)
 
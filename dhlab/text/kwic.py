@@ -0,0 +1,81 @@
+"""Keyword in context (KWIC) views of concordances.
+
+The concordances from the ``/conc`` endpoint mark the matched words with
+``<b>...</b>``. The functions here split a whole column of concordances into
+left context, hit and right context with pandas string methods, instead of
+parsing each row in Python.
+"""
+
+import re
+
+from pandas import DataFrame, Series
+
+_KWIC = re.compile(r"^(?P<left>.*?)<b>(?P<hit>.*?)</b>(?P<right>.*)$", flags=re.S)
+_TAG = r"</?b>"
+
+
+def all_hits(conc: Series) -> Series:
+    """The words inside ``<b>...</b>`` in each concordance, joined by spaces"""
+    hits = conc.str.extractall("<b>(.+?)</b")[0].groupby(level=0).agg(" ".join)
+    return hits.reindex(conc.index, fill_value="")
+
+
+def split_kwic(conc: Series) -> DataFrame:
+    """Split concordances into ``left``, ``hit`` and ``right`` context
+
+    The split is made at the first marked hit. The hits of lines with more
+    than one are joined in ``hit``, and the markup is removed from ``right``.
+    Lines without markup are all ``left`` context.
+
+    :param conc: concordances, like ``Concordance.frame.concordance``
+    :return: a DataFrame indexed like ``conc``, with string columns ``left``,
+        ``hit`` and ``right``, and the number of hits in ``n_hits``
+    """
+    conc = conc.astype("string")
+    parts = conc.str.extract(_KWIC)
+    n_hits = conc.str.count("<b>").fillna(0).astype("int64")
+
+    no_hit = parts.left.isna()
+    parts.loc[no_hit, "left"] = conc[no_hit]
+    parts = parts.fillna("")
+
+    several = n_hits > 1
+    if several.any():
+        parts.loc[several, "hit"] = all_hits(conc[several])
+        parts.loc[several, "right"] = parts.right[several].str.replace(_TAG, "", regex=True)
+
+    parts = parts.astype("string")
+    parts["left"] = parts.left.str.strip()
+    parts["right"] = parts.right.str.strip()
+    parts["n_hits"] = n_hits
+    return parts
+
+
+def context_word(kwic: DataFrame, side: str = "right", position: int = 1) -> Series:
+    """The word at ``position`` (1 is next to the hit) in the ``left`` or ``right`` context"""
+    if side not in ("left", "right"):
+        raise ValueError("`side` must be 'left' or 'right'")
+    if position < 1:
+        raise ValueError("`position` must be 1 or more")
+    if side == "right":
+        pattern = r"^\s*(?:\S+\s+){%d}(\S+)" % (position - 1)
+    else:
+        pattern = r"(\S+)(?:\s+\S+){%d}\s*$" % (position - 1)
+    return kwic[side].str.extract(pattern, expand=False).fillna("")
+
+
+def sort_kwic(kwic: DataFrame, by: str = "right", depth: int = 3, case: bool = False) -> DataFrame:
+    """Sort KWIC lines alphabetically by the context words next to the hit
+
+    :param kwic: a frame from :func:`split_kwic`
+    :param by: ``"left"`` to sort by the words before the hit, closest first,
+        or ``"right"`` by the words after it
+    :param depth: number of context words to sort by
+    :param case: tell upper and lower case apart
+    """
+    keys = {}
+    for position in range(1, depth + 1):
+        word = context_word(kwic, by, position)
+        keys[f"_{by}{position}"] = word if case else word.str.lower()
+    order = DataFrame(keys).reset_index(drop=True).sort_values(list(keys), kind="stable").index
+    return kwic.iloc[order]
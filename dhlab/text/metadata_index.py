@@ -0,0 +1,113 @@
+"""Cached indexes for filtering corpus metadata.
+
+Metadata fields such as author, title, langs, genres and city repeat the same
+few values over many documents. :class:`MetadataIndex` factorizes each field
+once, so a regex only has to be matched against the distinct values, and keeps
+an inverted index of the ``"/"``-separated parts of multi-valued fields. The
+filters return boolean masks over the rows of the frame, which are combined
+with ``&``/``|`` and applied once.
+"""
+
+from typing import Dict, Iterable, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+
+class MetadataIndex:
+    """Lazily built indexes over the columns of a metadata frame.
+
+    :param frame: the metadata, e.g. ``Corpus.frame``. It is not copied. If it is
+        modified in place, call :meth:`invalidate` before the next lookup.
+    :param str sep: separator of multi-valued fields, like ``"Ibsen, Henrik/Bjørnson, Bjørnstjerne"``.
+    """
+
+    def __init__(self, frame: DataFrame, sep: str = "/"):
+        self.frame = frame
+        self.sep = sep
+        self._codes: Dict[str, Tuple[np.ndarray, pd.Index]] = {}
+        self._inverted: Dict[str, Dict[str, np.ndarray]] = {}
+        self._numbers: Dict[str, np.ndarray] = {}
+        self._len = len(frame)
+
+    def invalidate(self) -> None:
+        """Forget the indexes, after ``frame`` has been modified in place. They are rebuilt as needed."""
+        self._codes.clear()
+        self._inverted.clear()
+        self._numbers.clear()
+        self._len = len(self.frame)
+
+    def is_valid_for(self, frame: DataFrame) -> bool:
+        """Check if the index was built for ``frame``, and it still has the same length.
+
+        This is a cheap check that does not look at the data; edits that keep the
+        length are not noticed, see :meth:`invalidate`.
+        """
+        return frame is self.frame and len(frame) == self._len
+
+    def codes(self, column: str) -> Tuple[np.ndarray, pd.Index]:
+        """Categorical codes of ``column`` and the distinct values they refer to. Missing values are ``-1``."""
+        if column not in self._codes:
+            self._codes[column] = pd.factorize(self.frame[column].to_numpy())
+        return self._codes[column]
+
+    def _take(self, column: str, per_value: np.ndarray, missing) -> np.ndarray:
+        """Map an array with one entry per distinct value of ``column`` onto the rows."""
+        codes, _ = self.codes(column)
+        return np.append(per_value, missing)[codes]
+
+    def contains(self, column: str, pattern: str, case: bool = True, regex: bool = True) -> np.ndarray:
+        """Rows where ``column`` contains ``pattern``, like ``frame[column].str.contains(pattern)``.
+
+        Missing values do not match.
+        """
+        _, uniques = self.codes(column)
+        matched = pd.Series(uniques, dtype=object).astype(str).str.contains(pattern, case=case, regex=regex)
+        return self._take(column, matched.to_numpy(dtype=bool), False)
+
+    def inverted(self, column: str) -> Dict[str, np.ndarray]:
+        """Row positions for each ``sep``-separated part of the values of ``column``."""
+        if column not in self._inverted:
+            codes, uniques = self.codes(column)
+            rows_of_code = pd.Series(np.arange(len(codes))).groupby(codes).indices
+            index: Dict[str, list] = {}
+            for code, value in enumerate(uniques):
+                for part in str(value).split(self.sep):
+                    index.setdefault(part.strip(), []).append(rows_of_code.get(code, []))
+            self._inverted[column] = {
+                part: np.sort(np.concatenate(rows)) for part, rows in index.items()
+            }
+        return self._inverted[column]
+
+    def has(self, column: str, values: Union[str, Iterable[str]]) -> np.ndarray:
+        """Rows where one of the ``sep``-separated parts of ``column`` is one of ``values``."""
+        if isinstance(values, str):
+            values = [values]
+        index = self.inverted(column)
+        mask = np.zeros(len(self.frame), dtype=bool)
+        for value in values:
+            mask[index.get(value, [])] = True
+        return mask
+
+    def count_parts(self, column: str) -> np.ndarray:
+        """Number of ``sep``-separated parts in each row of ``column``, 0 for missing values."""
+        _, uniques = self.codes(column)
+        parts = pd.Series(uniques, dtype=object).astype(str).str.count(self.sep) + 1
+        return self._take(column, parts.to_numpy(dtype=np.int64), 0)
+
+    def numbers(self, column: str) -> np.ndarray:
+        """``column`` as floats, with ``nan`` for values that are not numbers."""
+        if column not in self._numbers:
+            self._numbers[column] = pd.to_numeric(self.frame[column], errors="coerce").to_numpy(dtype=float)
+        return self._numbers[column]
+
+    def between(self, column: str, low=None, high=None) -> np.ndarray:
+        """Rows where ``low <= column <= high``. Either bound may be ``None``."""
+        values = self.numbers(column)
+        mask = ~np.isnan(values)
+        if low is not None:
+            mask &= values >= low
+        if high is not None:
+            mask &= values <= high
+        return mask
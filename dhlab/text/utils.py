@@ -5,7 +5,9 @@ import dhlab as dh
 
 def urnlist(corpus):
     """Try to pull out a list of URNs from corpus"""
-    if isinstance(corpus, dh.Corpus):
+    if isinstance(corpus, dh.LazyCorpus):
+        _urnlist = corpus.urnlist()
+    elif isinstance(corpus, dh.Corpus):
         _urnlist = list(corpus.corpus.urn)
     elif isinstance(corpus, DataFrame):
         _urnlist = list(corpus.urn)
@@ -0,0 +1,62 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from dhlab.api import utils
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Serve the queued responses of the server, or ``200 {}`` when the queue is empty."""
+
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def _respond(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+        self.server.received.append((self.command, self.path, body))
+
+        if self.server.responses:
+            status, headers, payload = self.server.responses.pop(0)
+        else:
+            status, headers, payload = 200, {}, {}
+
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = _respond
+    do_POST = _respond
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def local_server():
+    """A local HTTP server. Queue responses as ``(status, headers, json_payload)`` in ``.responses``."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.responses = []
+    server.received = []
+    server.url = f"http://127.0.0.1:{server.server_port}"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fast_retries():
+    """Retry without waiting, and start every test with a closed circuit breaker."""
+    policy, breaker = utils.retry_policy, utils.circuit_breaker
+    utils.configure_retries(backoff_factor=0, respect_retry_after=False)
+    utils.configure_circuit_breaker()
+    yield
+    utils.retry_policy, utils.circuit_breaker = policy, breaker
@@ -0,0 +1,80 @@
+import asyncio
+import threading
+import time
+import unittest.mock
+
+import pandas as pd
+
+from dhlab.api import aio, dhlab_api
+from dhlab.api.utils import session_manager
+
+
+def test_returns_same_frame() -> None:
+    """The coroutine should return what the blocking function returns"""
+    frame = pd.DataFrame({"urn": ["URN:NBN:no-nb_digibok_2008051404065"]})
+    with unittest.mock.patch.object(dhlab_api, "get_metadata", return_value=frame) as mock:
+        result = asyncio.run(aio.get_metadata(urns=list(frame.urn)))
+
+    assert result is frame
+    mock.assert_called_once_with(urns=list(frame.urn), dhlabids=None)
+
+
+def test_concurrency_is_bounded() -> None:
+    """No more than the configured number of requests should run at once"""
+    lock = threading.Lock()
+    running = {"now": 0, "max": 0}
+
+    def fake_concordance(**kwargs):
+        with lock:
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+        time.sleep(0.02)
+        with lock:
+            running["now"] -= 1
+        return pd.DataFrame()
+
+    async def main():
+        return await asyncio.gather(*[aio.concordance(urns=[str(i)], words="og") for i in range(8)])
+
+    aio.set_concurrency(3)
+    try:
+        with unittest.mock.patch.object(dhlab_api, "concordance", side_effect=fake_concordance):
+            results = asyncio.run(main())
+    finally:
+        aio.set_concurrency(10)
+
+    assert len(results) == 8
+    assert 1 < running["max"] <= 3
+
+
+def test_set_concurrency_lets_running_calls_finish() -> None:
+    """Raising the limit mid-flight should not close the session a running call uses"""
+    started, resume = threading.Event(), threading.Event()
+    sessions = []
+
+    def fake_concordance(**kwargs):
+        session = session_manager.session
+        session.close = unittest.mock.Mock(wraps=session.close)
+        sessions.append(session)
+        started.set()
+        resume.wait(5)
+        return pd.DataFrame()
+
+    async def main():
+        task = asyncio.ensure_future(aio.concordance(urns=["a"], words="og"))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        aio.set_concurrency(session_manager.pool_maxsize + 5)
+        assert session_manager.session is not sessions[0]
+        resume.set()
+        return await task
+
+    pool_maxsize = session_manager.pool_maxsize
+    try:
+        with unittest.mock.patch.object(dhlab_api, "concordance", side_effect=fake_concordance):
+            result = asyncio.run(main())
+    finally:
+        aio.set_concurrency(10)
+        session_manager.configure(pool_maxsize=pool_maxsize)
+
+    assert result.empty
+    sessions[0].close.assert_not_called()
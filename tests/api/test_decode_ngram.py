@@ -0,0 +1,38 @@
+import pandas as pd
+import pytest
+
+from dhlab.api.dhlab_api import _decode_word_periods
+from dhlab.api.utils import DHLabApiError
+
+
+def legacy_decode(payload):
+    df = pd.DataFrame.from_dict(payload, orient="index")
+    df.index = df.index.map(lambda x: tuple(x.split()))
+    columns = df.index.levels[0]
+    df = pd.concat([df.loc[x] for x in columns], axis=1)
+    df.columns = columns
+    return df
+
+
+def test_decode_matches_legacy_decoding() -> None:
+    payload = {"b 1901": 3, "a 1900": 5, "a 1902": 1, "b 1900": 2, "c 19000101": 7}
+    df = _decode_word_periods(payload)
+
+    assert list(df.columns) == ["a", "b", "c"]
+    assert list(df.index) == sorted(df.index)
+    pd.testing.assert_frame_equal(df, legacy_decode(payload).loc[df.index], check_names=False)
+
+
+def test_decode_keeps_words_with_spaces() -> None:
+    df = _decode_word_periods({"til og med 1900": 4})
+    assert df.loc["1900", "til og med"] == 4
+
+
+def test_decode_empty_payload() -> None:
+    assert _decode_word_periods({}).empty
+
+
+@pytest.mark.parametrize("payload", [{"a": 1}, {"a": 1, "b 1900": 2}])
+def test_decode_rejects_keys_without_period(payload) -> None:
+    with pytest.raises(DHLabApiError):
+        _decode_word_periods(payload)
@@ -0,0 +1,171 @@
+import time
+import unittest.mock
+from json import dumps
+
+import pandas as pd
+import pytest
+import requests
+
+from dhlab.api import dhlab_api
+from dhlab.api.nb_ngram_api import get_ngram
+from dhlab.api.sharding import (
+    configure_sharding,
+    iter_fan_out,
+    shard,
+    shard_terms,
+    sharding_settings,
+    split_samplesize,
+)
+from dhlab.text.conc_coll import Collocations
+
+
+@pytest.fixture
+def small_batches():
+    settings = sharding_settings()
+    configure_sharding(batch_size=2, progress=False)
+    yield
+    configure_sharding(**settings)
+
+
+def _post_returning(func):
+    """Mock of api_post, answering with ``func(json)``."""
+
+    def post(url, json=None, session=None, stream=False):
+        response = requests.Response()
+        response.status_code = 200
+        response._content = dumps(func(json)).encode()
+        response._content_consumed = True
+        return response
+
+    return unittest.mock.patch.object(dhlab_api, "api_post", side_effect=post)
+
+
+def test_shard() -> None:
+    assert shard([1, 2, 3, 4, 5], 2) == [[1, 2], [3, 4], [5]]
+
+
+def test_split_samplesize() -> None:
+    """The shares sum to the samplesize, and no batch gets 0"""
+    batches = shard(list("abcde"), 2)
+    assert split_samplesize(30, batches) == [12, 12, 6]
+    assert split_samplesize(7, batches) == [3, 3, 1]
+    assert split_samplesize(5, batches) == [2, 2, 1]
+    assert split_samplesize(1, batches) == [1, 1, 1]
+
+
+def test_metadata_rows_are_concatenated_in_order(small_batches) -> None:
+    """Each batch is one request, and the rows keep the order of the urns"""
+    urns = [f"URN:NBN:no-nb_digibok_{i}" for i in range(5)]
+    with _post_returning(lambda body: {"urn": body["urns"]}) as post:
+        df = dhlab_api.get_metadata(urns=urns)
+
+    assert post.call_count == 3
+    assert list(df.urn) == urns
+    assert list(df.index) == list(range(5))
+
+
+def test_frequency_columns_are_concatenated(small_batches) -> None:
+    """Documents from all batches should become columns of the same frame"""
+    urns = ["a", "b", "c"]
+    ids = {"a": 1, "b": 2, "c": 3}
+    with _post_returning(lambda body: [[[ids[u], "og", ids[u]], [ids[u], u, 1]] for u in body["urns"]]):
+        df = dhlab_api.get_document_frequencies(urns)
+
+    assert sorted(df.columns) == [1, 2, 3]
+    assert df.loc["og"].sort_index().tolist() == [1, 2, 3]
+    assert df.loc["c", 3] == 1
+    assert df.loc["c", 1] == 0
+
+
+def test_collocation_counts_are_summed(small_batches) -> None:
+    """Counts of the same collocate in several batches should be summed"""
+    def collocations(body):
+        frame = pd.DataFrame({"counts": [2, 1], "dist": [1.0, 4.0]}, index=["og", body["urn"][0]])
+        return frame.to_json()
+
+    with _post_returning(collocations) as post:
+        df = dhlab_api.urn_collocation(urns=["a", "b", "c"], samplesize=30)
+
+    assert [call.kwargs["json"]["samplesize"] for call in post.call_args_list] == [20, 10]
+    assert df.loc["og", "counts"] == 4
+    assert df.loc["og", "dist"] == 1.0
+    assert df.loc["c", "counts"] == 1
+
+
+def test_collocations_of_several_words_are_summed_as_they_arrive() -> None:
+    """Collocations of several seed words are requested concurrently, and summed in any order"""
+    delays = {"hus": 0.1, "båt": 0.0, "kirke": 0.05}
+    arrived = []
+
+    def collocations(body):
+        word = body["word"]
+        time.sleep(delays[word])
+        arrived.append(word)
+        return pd.DataFrame({"counts": [len(word), 1]}, index=["og", word + "s"]).to_json()
+
+    with _post_returning(collocations) as post:
+        coll = Collocations(
+            ["URN:NBN:no-nb_digibok_1"], words=["hus", "båt", "kirke"], max_workers=3, provenance=True
+        )
+
+    assert post.call_count == 3
+    assert arrived[0] == "båt"
+    assert coll.frame.loc["og"].tolist() == [11, 3, 3, 5]
+    assert list(coll.frame.columns) == ["counts", "hus", "båt", "kirke"]
+    assert coll.frame.loc["huss", "båt"] == 0
+
+
+def test_iter_fan_out_in_completion_order() -> None:
+    def slow(x):
+        time.sleep(x / 20)
+        return x
+
+    assert list(iter_fan_out(slow, [3, 1, 2], max_workers=3, progress=False, ordered=False)) == [1, 2, 3]
+    assert list(iter_fan_out(slow, [3, 1, 2], max_workers=3, progress=False)) == [3, 1, 2]
+
+
+def test_collocations_of_unknown_word_are_empty(small_batches) -> None:
+    """All batches empty should give an empty frame, not an error"""
+    with _post_returning(lambda body: pd.DataFrame().to_json()):
+        df = dhlab_api.urn_collocation(urns=["a", "b", "c"], word="ukjent")
+
+    assert df.empty
+    assert "counts" in df.columns
+
+
+def test_shard_terms() -> None:
+    assert shard_terms(["a", "b", "c"], 2) == [["a", "b"], ["c"]]
+    assert shard_terms(["aaaa", "bbbb", "cc"], 10, max_chars=10) == [["aaaa", "bbbb"], ["cc"]]
+    assert shard_terms([], 2) == []
+
+
+def test_ngram_batches_are_joined_on_period() -> None:
+    def answer(json):
+        # each word is counted in its own years
+        return {f"{w} {1900 + i}": i + 1 for i, w in enumerate(json["word"])}
+
+    with _post_returning(answer) as post:
+        df = dhlab_api.ngram_book("b,a,c", period=(1900, 1910), batch_size=2)
+
+    assert post.call_count == 2
+    assert all(call.kwargs["json"]["period"] == (1900, 1910) for call in post.call_args_list)
+    assert list(df.columns) == ["a", "b", "c"]
+    assert list(df.index) == ["1900", "1901"]
+    assert df.loc["1901", "a"] == 2 and df.loc["1900", "c"] == 1
+    assert pd.isna(df.loc["1901", "c"])
+
+
+def test_get_ngram_batches_are_concatenated() -> None:
+    session = unittest.mock.MagicMock(spec=requests.Session)
+
+    def request(method, url, params=None, **kwargs):
+        response = unittest.mock.MagicMock()
+        response.status_code = 200
+        response.text = dumps([{"key": t, "values": []} for t in params["terms"].split(", ")])
+        return response
+
+    session.request.side_effect = request
+    result = get_ngram("a, b, c, d, e", session=session, batch_size=2)
+
+    assert session.request.call_count == 3
+    assert [x["key"] for x in result] == ["a", "b", "c", "d", "e"]
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+
+from dhlab.api.dhlab_api import _create_sparse_matrix
+from dhlab.api.sparse import SparseCounts
+
+STRUCTURE = {
+    100000001: {"og": 3, "hus": 1},
+    100000002: {"og": 2, "båt": 5},
+}
+
+
+def test_sparse_matrix_matches_dense_frame() -> None:
+    """The sparse frame should hold the same counts as the dense frame"""
+    df = _create_sparse_matrix(STRUCTURE)
+    expected = pd.DataFrame(STRUCTURE).fillna(0).astype(int)
+
+    assert all(isinstance(dtype, pd.SparseDtype) for dtype in df.dtypes)
+    pd.testing.assert_frame_equal(df.sparse.to_dense(), expected.loc[df.index])
+
+
+def test_from_triplets_sums_duplicates() -> None:
+    counts = SparseCounts.from_triplets(["og", "og", "hus"], [1, 1, 2], [1, 2, 4])
+
+    assert counts.shape == (2, 2)
+    assert counts.nnz == 2
+    assert counts.to_dense_frame().loc["og", 1] == 3
+
+
+def test_frame_round_trip() -> None:
+    counts = SparseCounts.from_dict(STRUCTURE)
+    again = SparseCounts.from_frame(counts.to_frame())
+
+    assert list(again.words) == list(counts.words)
+    assert list(again.docs) == list(counts.docs)
+    assert np.array_equal(again.matrix.toarray(), counts.matrix.toarray())
+
+
+def test_sum_relative_and_top_k() -> None:
+    counts = SparseCounts.from_dict(STRUCTURE)
+
+    assert counts.sum().to_dict() == {"og": 5, "hus": 1, "båt": 5}
+    assert np.allclose(counts.relative().doc_sizes(), 1.0)
+
+    top = counts.top_k(1)
+    assert top.values.tolist() == [[100000001, "og", 3], [100000002, "båt", 5]]
+
+
+def test_select_keeps_requested_order() -> None:
+    counts = SparseCounts.from_dict(STRUCTURE).select(words=["båt", "og", "ukjent"], docs=[100000002])
+
+    assert list(counts.words) == ["båt", "og"]
+    assert counts.to_dense_frame()[100000002].tolist() == [5, 2]
+
+
+def test_counts_scipy_backend_matches_pandas() -> None:
+    from dhlab.text.conc_coll import Counts
+
+    scipy_counts = Counts.from_sparse_counts(SparseCounts.from_dict(STRUCTURE))
+    pandas_counts = Counts.from_df(_create_sparse_matrix(STRUCTURE))
+
+    assert scipy_counts.is_sparse()
+    pd.testing.assert_frame_equal(scipy_counts.sum().frame, pandas_counts.sum().frame)
+    pd.testing.assert_frame_equal(scipy_counts.frame, pandas_counts.frame)
@@ -0,0 +1,54 @@
+import json
+import unittest.mock
+
+import pandas as pd
+import pytest
+
+from dhlab.api import dhlab_api
+from dhlab.api.streaming import iter_array_items
+
+FREQUENCIES = [
+    [[100000001, "og", 12], [100000001, "[", 3], [100000001, "æ\"ø", 1]],
+    [],
+    [[100000002, "og", 7], [100000002, "hus", 2]],
+]
+
+
+def _pieces(text: str, size: int):
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_items_are_decoded_across_chunk_boundaries(size: int) -> None:
+    """Items should be decoded correctly wherever the chunks are split"""
+    text = json.dumps(FREQUENCIES)
+
+    assert list(iter_array_items(_pieces(text, size), depth=2)) == [x for doc in FREQUENCIES for x in doc]
+    assert list(iter_array_items(_pieces(text, size), depth=1)) == FREQUENCIES
+
+
+def test_numbers_split_between_chunks() -> None:
+    assert list(iter_array_items(["[12", "34, 5", "6]"])) == [1234, 56]
+
+
+def test_truncated_document_raises() -> None:
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_array_items(['[[1, "og", 2], [1, "hu']))
+
+
+def test_document_frequencies_are_streamed(local_server) -> None:
+    """The frame built from the stream should equal the frame built from the parsed JSON"""
+    local_server.responses = [(200, {}, FREQUENCIES)] * 2
+
+    with unittest.mock.patch.object(dhlab_api, "BASE_URL", local_server.url):
+        dense = dhlab_api.get_document_frequencies(["a", "b", "c"])
+        sparse = dhlab_api.get_document_frequencies(["a", "b", "c"], sparse=True)
+
+    expected = pd.DataFrame(
+        {doc[0][0]: {x[1]: x[2] for x in doc} for doc in FREQUENCIES if doc}
+    ).fillna(0)
+    pd.testing.assert_frame_equal(
+        dense.astype(float), expected.loc[dense.index], check_names=False
+    )
+    assert sparse.sparse.density < 1
+    assert (sparse.sparse.to_dense().loc[dense.index] == dense).all().all()
@@ -0,0 +1,59 @@
+import pytest
+
+from dhlab.api import cache as api_cache
+from dhlab.api.cache import ResponseCache
+from dhlab.api.utils import api_get, api_post
+
+
+@pytest.fixture
+def response_cache(tmp_path):
+    cache = api_cache.enable_cache(path=str(tmp_path / "cache.sqlite"))
+    yield cache
+    api_cache.disable_cache()
+
+
+def test_identical_requests_are_served_from_cache(local_server, response_cache) -> None:
+    """The second identical request should not reach the server"""
+    local_server.responses = [(200, {}, {"a": 1})]
+    url = local_server.url + "/frequencies"
+
+    first = api_post(url, json={"urns": ["x"], "cutoff": 0})
+    second = api_post(url, json={"cutoff": 0, "urns": ["x"]})
+
+    assert first.json() == second.json() == {"a": 1}
+    assert len(local_server.received) == 1
+    assert response_cache.stats()["hits"] == 1
+    assert response_cache.stats()["misses"] == 1
+
+
+def test_expired_entries_are_refetched(local_server, response_cache) -> None:
+    """Entries older than the ttl should be requested again"""
+    response_cache.ttl = 0
+    api_get(local_server.url + "/totals/10")
+    api_get(local_server.url + "/totals/10")
+
+    assert len(local_server.received) == 2
+
+
+def test_disabled_endpoint_is_not_cached(local_server, response_cache) -> None:
+    """Requests to a disabled endpoint should always reach the server"""
+    response_cache.disable_endpoint("/conc")
+    api_post(local_server.url + "/conc", json={"query": "og"})
+    api_post(local_server.url + "/conc", json={"query": "og"})
+
+    assert len(local_server.received) == 2
+    assert response_cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, local_server) -> None:
+    """The cache should not grow beyond max_size"""
+    cache = ResponseCache(path=str(tmp_path / "cache.sqlite"), max_size=7)
+    for word in ["a", "b", "c"]:
+        local_server.responses.append((200, {}, word))
+        res = api_get(local_server.url + "/word_form", params={"word": word})
+        cache.set("GET", local_server.url + "/word_form", {"word": word}, None, res)
+
+    assert cache.stats()["size"] <= 7
+    assert cache.get("GET", local_server.url + "/word_form", {"word": "c"}) is not None
+    assert cache.get("GET", local_server.url + "/word_form", {"word": "a"}) is None
+    cache.close()
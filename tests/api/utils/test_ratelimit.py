@@ -0,0 +1,72 @@
+import threading
+import time
+
+import pytest
+
+from dhlab.api.ratelimit import RateLimiter, TokenBucket, clear_rate_limits, set_rate_limit
+from dhlab.api.utils import api_get
+
+
+def test_bucket_allows_burst_then_limits() -> None:
+    """The first `burst` tokens are free, the following wait for the refill"""
+    bucket = TokenBucket(rate=20, burst=3)
+
+    assert sum(bucket.acquire() for _ in range(3)) == 0
+    start = time.monotonic()
+    for _ in range(4):
+        bucket.acquire()
+    assert time.monotonic() - start >= 0.15
+
+
+@pytest.mark.parametrize("rate, burst", [(0, None), (-1, 5), (5, 0), (5, 0.5)])
+def test_bucket_rejects_limits_that_never_refill(rate, burst) -> None:
+    with pytest.raises(ValueError):
+        TokenBucket(rate=rate, burst=burst)
+
+
+def test_bucket_rejects_more_tokens_than_burst() -> None:
+    with pytest.raises(ValueError):
+        TokenBucket(rate=1, burst=2).acquire(3)
+
+
+def test_bucket_is_shared_between_threads() -> None:
+    bucket = TokenBucket(rate=50, burst=1)
+    start = time.monotonic()
+    threads = [threading.Thread(target=bucket.acquire) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert time.monotonic() - start >= 0.09
+
+
+def test_bucket_state_is_shared_through_file(tmp_path) -> None:
+    """Buckets using the same lock file should draw from the same tokens"""
+    path = str(tmp_path / "bucket")
+    first = TokenBucket(rate=1, burst=2, path=path)
+    second = TokenBucket(rate=1, burst=2, path=path)
+
+    first.acquire()
+    first.acquire()
+    assert second._take_shared(1) > 0
+
+
+def test_limits_apply_per_endpoint() -> None:
+    limiter = RateLimiter()
+    limiter.set_limit("/frequencies", rate=1, burst=1)
+
+    assert limiter.acquire("https://api.nb.no/dhlab/frequencies") == 0
+    assert limiter.acquire("https://api.nb.no/dhlab/conc") == 0
+    assert limiter.acquire("https://api.nb.no/dhlab/frequencies") > 0
+
+
+def test_api_request_is_rate_limited(local_server) -> None:
+    set_rate_limit(None, rate=20, burst=1)
+    try:
+        start = time.monotonic()
+        for _ in range(3):
+            api_get(local_server.url + "/totals/10")
+        assert time.monotonic() - start >= 0.09
+    finally:
+        clear_rate_limits()
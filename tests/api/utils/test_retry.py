@@ -0,0 +1,79 @@
+import pytest
+
+from dhlab.api import utils
+from dhlab.api.utils import CircuitOpenError, DHLabApiError, RetryPolicy, api_get, api_post
+
+
+def test_transient_errors_are_retried(local_server) -> None:
+    """A 503 followed by a 200 should succeed"""
+    local_server.responses = [(503, {}, {}), (429, {}, {}), (200, {}, {"ok": True})]
+
+    assert api_get(local_server.url + "/totals/10").json() == {"ok": True}
+    assert len(local_server.received) == 3
+
+
+def test_gives_up_after_total_retries(local_server) -> None:
+    """The error should be raised when the retries are used up"""
+    utils.configure_retries(total=2, backoff_factor=0)
+    local_server.responses = [(502, {}, {})] * 5
+
+    with pytest.raises(DHLabApiError) as error:
+        api_get(local_server.url + "/totals/10")
+
+    assert error.value.response.status_code == 502
+    assert len(local_server.received) == 3
+
+
+def test_only_idempotent_posts_are_retried(local_server) -> None:
+    """POST requests to unknown endpoints should not be sent twice"""
+    local_server.responses = [(503, {}, {}), (200, {}, {})]
+    with pytest.raises(DHLabApiError):
+        api_post(local_server.url + "/unknown", json={})
+    assert len(local_server.received) == 1
+
+    local_server.responses = [(503, {}, {}), (200, {}, {})]
+    assert utils.api_request("POST", local_server.url + "/unknown", json={}, idempotent=True).ok
+
+
+def test_retry_after_header() -> None:
+    """Retry-After should take precedence over the exponential backoff"""
+    class Response:
+        headers = {"Retry-After": "7"}
+
+    policy = RetryPolicy(backoff_factor=100, backoff_max=10)
+    assert policy.backoff(0, Response()) == 7
+    Response.headers = {"Retry-After": "120"}
+    assert policy.backoff(0, Response()) == 10
+
+
+def test_backoff_is_exponential_and_capped() -> None:
+    policy = RetryPolicy(backoff_factor=1, backoff_max=5, jitter=False)
+    assert [policy.backoff(n) for n in range(5)] == [1, 2, 4, 5, 5]
+
+
+def test_circuit_opens_after_repeated_failures(local_server) -> None:
+    """Once open, requests should fail without reaching the server"""
+    utils.configure_retries(total=0)
+    utils.configure_circuit_breaker(failure_threshold=2, reset_timeout=60)
+    local_server.responses = [(500, {}, {})] * 2
+
+    for _ in range(2):
+        with pytest.raises(DHLabApiError):
+            api_get(local_server.url + "/totals/10")
+    with pytest.raises(CircuitOpenError):
+        api_get(local_server.url + "/totals/10")
+
+    assert len(local_server.received) == 2
+    assert utils.circuit_breaker.state(local_server.url) == "open"
+
+
+def test_circuit_closes_after_successful_trial(local_server) -> None:
+    utils.configure_retries(total=0)
+    utils.configure_circuit_breaker(failure_threshold=1, reset_timeout=0)
+    local_server.responses = [(500, {}, {})]
+
+    with pytest.raises(DHLabApiError):
+        api_get(local_server.url + "/totals/10")
+    api_get(local_server.url + "/totals/10")
+
+    assert utils.circuit_breaker.state(local_server.url) == "closed"
@@ -0,0 +1,49 @@
+import requests
+import unittest.mock
+
+from dhlab.api import utils
+from dhlab.api.utils import SessionManager, api_get
+
+
+def test_connections_are_reused(local_server) -> None:
+    """Consecutive requests to the same host should share one pooled connection"""
+    manager = SessionManager(pool_maxsize=2)
+
+    for _ in range(5):
+        api_get(local_server.url + "/totals/10", session=manager.session)
+
+    assert manager.stats() == {"requests": 5, "connections_opened": 1, "connections_reused": 4}
+    manager.close()
+
+
+def test_no_keep_alive_opens_new_connections(local_server) -> None:
+    """With keep_alive=False every request should open a new connection"""
+    manager = SessionManager(keep_alive=False)
+
+    for _ in range(3):
+        api_get(local_server.url, session=manager.session)
+
+    assert manager.stats()["connections_opened"] == 3
+    manager.close()
+
+
+def test_configure_rebuilds_session() -> None:
+    """Changing the pool settings should replace the shared session"""
+    manager = SessionManager()
+    first = manager.session
+    manager.configure(pool_maxsize=20)
+
+    assert manager.session is not first
+    assert manager.session.get_adapter("https://api.nb.no")._pool_maxsize == 20
+    manager.close()
+
+
+def test_shared_session_used_by_default() -> None:
+    """api_request should use the module-level session when none is passed"""
+    session = unittest.mock.MagicMock(spec=requests.Session)
+    session.request.return_value.status_code = 200
+
+    with unittest.mock.patch.object(utils, "get_session", return_value=session):
+        api_get("https://api.nb.no/dhlab/ner_models")
+
+    session.request.assert_called_once()
@@ -1,5 +1,7 @@
+import pandas as pd
 import pytest
 from dhlab import Concordance, Corpus
+from dhlab.text.conc_coll import make_link
 
 
 def test_concordance():
@@ -23,3 +25,78 @@ def test_concordance_sort():
     assert sorted.frame is not None
     assert sorted.frame.columns is not None
     assert "concordance" in sorted.frame.columns
+
+
+@pytest.fixture
+def fake_conc(monkeypatch):
+    def conc_batch(urns, words, window, limit):
+        return pd.DataFrame(
+            {
+                "docid": list(range(len(urns))),
+                "urn": urns,
+                "conc": [f"før <b>{words}</b> etter <b>{words}</b>" for _ in urns],
+            }
+        )
+
+    monkeypatch.setattr("dhlab.api.dhlab_api._concordance_batch", conc_batch)
+
+
+def test_iter_batches(fake_conc):
+    urns = [f"URN:NBN:no-nb_digibok_{i}" for i in range(5)]
+    batches = list(Concordance.iter_batches(urns, "hus", batch_size=2))
+    assert [len(b) for b in batches] == [2, 2, 1]
+    assert batches[0].hit[0] == "hus hus"
+    assert batches[2].link[0] == make_link(urns[4])
+
+
+@pytest.mark.parametrize("suffix", ["parquet", "jsonl"])
+def test_write_batches(fake_conc, tmp_path, suffix):
+    pytest.importorskip("pyarrow")
+    urns = [f"URN:NBN:no-nb_digibok_{i}" for i in range(5)]
+    path = tmp_path / f"conc.{suffix}"
+    assert Concordance.write_batches(urns, "hus", path, batch_size=2) == 5
+
+    if suffix == "parquet":
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_json(path, lines=True)
+    assert df.urn.tolist() == urns
+
+
+def test_kwic_split_and_sort():
+    conc = Concordance.from_df(
+        pd.DataFrame(
+            {
+                "link": ["a", "b", "c"],
+                "urn": ["u1", "u2", "u3"],
+                "dhlabid": [1, 2, 3],
+                "concordance": [
+                    "det gamle <b>hus</b> ved sjøen",
+                    "et <b>hus</b> og et <b>hus</b> til",
+                    "ingen treff her",
+                ],
+            }
+        )
+    )
+    kwic = conc.kwic()
+    assert kwic.loc[0, ["left", "hit", "right"]].tolist() == ["det gamle", "hus", "ved sjøen"]
+    assert kwic.loc[1, ["hit", "right", "n_hits"]].tolist() == ["hus hus", "og et hus til", 2]
+    assert kwic.loc[2, "left"] == "ingen treff her"
+
+    assert conc.sort_by_context("right").frame.dhlabid.tolist() == [3, 2, 1]
+    assert conc.sort_by_context("left").frame.dhlabid.tolist() == [2, 1, 3]
+
+
+def test_future_split_view_keeps_columns_of_second_hit():
+    from dhlab.future.corpus_conc_coll import Concordance as FutureConcordance
+
+    conc = FutureConcordance(
+        {
+            "urn": ["URN:NBN:no-nb_digibok_1", "URN:NBN:no-nb_digibok_2"],
+            "concordance": ["a <b>hus</b> b", "c <b>hus</b> d <b>båt</b> e"],
+        }
+    )
+    view = conc.split_view()
+    assert list(view.columns) == ["left", "hit", "right", "hit2", "right2"]
+    assert view.iloc[1].tolist() == ["c ", "hus", " d ", "båt", " e"]
+    assert pd.isna(view.iloc[0].hit2)
@@ -1,3 +1,5 @@
+import unittest.mock
+
 import dhlab as dh
 import pytest
 import pandas as pd
@@ -114,3 +116,185 @@ class TestCheckForUrnDuplicates:
         c = dh.Corpus()
         c.extend_from_identifiers(urn)
         assert len(c) == 1
+
+
+class TestCorpusByYear:
+    @pytest.fixture
+    def fake_build_corpus(self, monkeypatch):
+        calls = []
+
+        def document_corpus(from_year=None, to_year=None, **query):
+            calls.append(from_year)
+            if from_year == 1901 and calls.count(1901) == 1:
+                raise dh.api.utils.CircuitOpenError("Service unavailable")
+            return pd.DataFrame({"urn": [f"URN:NBN:no-nb_digibok_{from_year}"], "year": [from_year]})
+
+        monkeypatch.setattr("dhlab.text.corpus.document_corpus", document_corpus)
+        return calls
+
+    def test_years_merged_in_order_and_failures_retried(self, fake_build_corpus):
+        c = dh.Corpus(doctype="digibok", from_year=1900, to_year=1905, limit_by_year=True, max_workers=3)
+        assert c.frame.year.tolist() == [1900, 1901, 1902, 1903, 1904]
+        assert fake_build_corpus.count(1901) == 2
+
+    def test_errors_after_transport_retries_are_raised(self, monkeypatch):
+        calls = []
+
+        def document_corpus(from_year=None, to_year=None, **query):
+            calls.append(from_year)
+            raise dh.api.utils.DHLabApiError("Service unavailable")
+
+        monkeypatch.setattr("dhlab.text.corpus.document_corpus", document_corpus)
+        with pytest.raises(dh.api.utils.DHLabApiError):
+            dh.Corpus(doctype="digibok", from_year=1900, to_year=1901, limit_by_year=True)
+        assert calls == [1900]
+
+    def test_iter_by_year(self, fake_build_corpus):
+        years = [(year, part.size) for year, part in dh.Corpus.iter_by_year(1900, 1903, doctype="digibok")]
+        assert years == [(1900, 1), (1901, 1), (1902, 1)]
+
+
+class TestLazyCorpus:
+    def test_identifiers_only_until_frame_is_used(self, monkeypatch):
+        fetched = []
+
+        def get_metadata(urns=None, dhlabids=None):
+            fetched.append((urns, dhlabids))
+            return pd.DataFrame({"dhlabid": dhlabids, "urn": [f"URN:NBN:no-nb_digibok_{i}" for i in dhlabids]})
+
+        monkeypatch.setattr("dhlab.text.corpus.get_metadata", get_metadata)
+
+        c = dh.Corpus.from_identifiers([100000001, 100000002, 100000001], lazy=True)
+        c = c + dh.LazyCorpus([100000003])
+        assert len(c) == 3
+        assert len(c.sample(2)) == 2
+        assert not c.is_loaded and fetched == []
+
+        assert c.frame.urn.tolist()[0] == "URN:NBN:no-nb_digibok_100000001"
+        assert c.frame.dhlabid.tolist() == [100000001, 100000002, 100000003]
+        c.frame
+        assert fetched == [(None, [100000001, 100000002, 100000003])]
+
+    def test_dhlabids_are_resolved_to_urns_once(self, monkeypatch):
+        fetched = []
+        counted = []
+
+        def get_metadata(urns=None, dhlabids=None):
+            fetched.append(dhlabids)
+            return pd.DataFrame({"dhlabid": dhlabids, "urn": [f"URN:NBN:no-nb_digibok_{i}" for i in dhlabids]})
+
+        monkeypatch.setattr("dhlab.text.corpus.get_metadata", get_metadata)
+        monkeypatch.setattr("dhlab.text.conc_coll.Counts", lambda urns, *args: counted.append(urns))
+
+        c = dh.LazyCorpus([100000001, 100000002])
+        c.count()
+        c.freq()
+        assert dh.text.utils.urnlist(c) == ["URN:NBN:no-nb_digibok_100000001", "URN:NBN:no-nb_digibok_100000002"]
+        assert counted == [dh.text.utils.urnlist(c)] * 2
+        assert fetched == [[100000001, 100000002]]
+
+    def test_urns_are_used_without_fetching(self, monkeypatch):
+        monkeypatch.setattr("dhlab.text.corpus.get_metadata", unittest.mock.Mock(side_effect=AssertionError))
+        urns = ["URN:NBN:no-nb_digibok_1", "URN:NBN:no-nb_digibok_2"]
+        assert dh.LazyCorpus(urns).urnlist() == urns
+
+
+class TestCorpusFilter:
+    frame = pd.DataFrame(
+        {
+            "dhlabid": [1, 2, 3, 4],
+            "urn": [f"URN:NBN:no-nb_digibok_{i}" for i in range(4)],
+            "author": ["Ibsen, Henrik", "Ibsen, Henrik/Bjørnson, Bjørnstjerne", "Skram, Amalie", None],
+            "langs": ["nob", "nob/dan", "nob", "nno"],
+            "year": [1880, 1890, 1900, 1910],
+        }
+    )
+
+    def test_filter_matches_str_contains(self):
+        c = dh.Corpus.from_df(self.frame)
+        sub = c.filter(year_range=(1880, 1900), author="Ibsen")
+        assert sub.frame.dhlabid.tolist() == [1, 2]
+        assert c._make_subcorpus(author="Bjørn").frame.dhlabid.tolist() == [2]
+
+    def test_exact_parts_and_counts(self):
+        c = dh.Corpus.from_df(self.frame)
+        assert c.mask(regex=False, author="Bjørnson, Bjørnstjerne").tolist() == [False, True, False, False]
+        assert c.only_one_author().frame.dhlabid.tolist() == [1, 3]
+        assert c.only_one_language().frame.dhlabid.tolist() == [1, 3, 4]
+
+    def test_index_is_kept_until_invalidated(self):
+        c = dh.Corpus.from_df(self.frame.copy())
+        assert c.mask(author="Skram").tolist() == [False, False, True, False]
+        index = c.metadata_index
+        c.mask(author="Ibsen")
+        assert c.metadata_index is index
+
+        c.frame.loc[c.frame.dhlabid == 4, "author"] = "Skram, Amalie"
+        c.metadata_index.invalidate()
+        assert c.mask(author="Skram").tolist() == [False, False, True, True]
+
+        c.frame.sort_values("year", ascending=False, inplace=True)
+        c.metadata_index.invalidate()
+        assert c.mask(author="Skram").tolist() == [True, True, False, False]
+        assert c.mask(year_range=(1905, 1910)).tolist() == [True, False, False, False]
+
+    def test_index_is_rebuilt_when_corpus_changes(self):
+        c = dh.Corpus.from_df(self.frame.copy())
+        assert c.mask(author="Skram").sum() == 1
+        c.add(pd.DataFrame({"dhlabid": [5], "urn": ["URN:NBN:no-nb_digibok_5"], "author": ["Skram, Amalie"]}))
+        assert c.mask(author="Skram").sum() == 2
+
+
+class TestCorpusBuilder:
+    def test_last_dhlabid_wins(self):
+        builder = dh.CorpusBuilder()
+        builder.add(pd.DataFrame({"dhlabid": [5, 2], "urn": ["a", "b"], "title": ["A", "B"]}))
+        builder.add(pd.DataFrame({"dhlabid": [7, 1], "urn": ["a", "b"], "title": ["A2", "B2"]}))
+        assert len(builder) == 2
+
+        frame = builder.to_frame()
+        assert frame.values.tolist() == [[2, "b", "B"], [7, "a", "A2"]]
+
+        builder.add(pd.DataFrame({"dhlabid": [3], "urn": ["c"], "title": ["C"]}))
+        assert builder.to_corpus().frame.urn.tolist() == ["b", "c", "a"]
+
+    def test_missing_dhlabids_resolve_like_drop_duplicates(self):
+        frame = pd.DataFrame(
+            {
+                "dhlabid": [None, 5, None, None, 3, None],
+                "urn": ["a", "a", "b", "b", "c", "c"],
+                "title": ["A1", "A2", "B1", "B2", "C1", "C2"],
+            }
+        )
+        c = dh.Corpus.from_df(frame)
+        c._drop_urn_duplicates()
+        built = dh.CorpusBuilder(frame).to_frame()
+        assert c.frame.title.tolist() == ["B2", "C1", "A2"]
+        pd.testing.assert_frame_equal(built, c.frame)
+
+    def test_builder_is_kept_between_adds(self, monkeypatch):
+        c = dh.Corpus.from_df(pd.DataFrame({"dhlabid": [1, 2], "urn": ["a", "b"]}))
+        built = []
+        original = dh.CorpusBuilder.__init__
+
+        def init(self, corpus=None):
+            built.append(len(corpus) if corpus is not None else 0)
+            original(self, corpus)
+
+        monkeypatch.setattr(dh.CorpusBuilder, "__init__", init)
+        for i in range(3, 6):
+            c.add(pd.DataFrame({"dhlabid": [i], "urn": [f"u{i}"]}))
+        assert len(c.frame) == 5
+        c.add(pd.DataFrame({"dhlabid": [9], "urn": ["a"]}))
+        assert c.frame.urn.tolist() == ["b", "u3", "u4", "u5", "a"]
+        assert built == [2]
+
+        c.frame = c.frame.iloc[:2]
+        c.add(pd.DataFrame({"dhlabid": [10], "urn": ["z"]}))
+        assert c.frame.urn.tolist() == ["b", "u3", "z"]
+        assert built == [2, 2]
+
+    def test_add_matches_drop_duplicates(self):
+        c = dh.Corpus.from_df(pd.DataFrame({"dhlabid": [3, 1], "urn": ["x", "y"]}))
+        c.add(pd.DataFrame({"dhlabid": [4], "urn": ["y"]}))
+        assert c.frame.values.tolist() == [[3, "x"], [4, "y"]]
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import chi2_contingency
+
+from dhlab.text.association import AssociationScorer, top_k
+from dhlab.text.conc_coll import Collocations
+
+REFERENCE = pd.DataFrame({"freq": [1000, 50, 10, 400]}, index=["og", "hus", "tak", "på"])
+COUNTS = pd.Series([30, 12, 6, 2], index=["og", "hus", "tak", "vegg"])
+
+
+def test_measures_match_contingency_tables():
+    scores = AssociationScorer(REFERENCE).score(COUNTS)
+
+    table = [[12, COUNTS.sum() - 12], [50, REFERENCE.freq.sum() - 50]]
+    chi2, *_ = chi2_contingency(table, correction=False)
+    g2, *_ = chi2_contingency(table, correction=False, lambda_="log-likelihood")
+    assert scores.loc["hus", "chi2"] == pytest.approx(chi2)
+    assert scores.loc["hus", "g2"] == pytest.approx(g2)
+    assert scores.loc["hus", "relevance"] == pytest.approx((12 / 50) / (50 / 1460))
+    assert np.isnan(scores.loc["vegg", "relevance"])
+    assert np.isfinite(scores.loc["vegg", "pmi"])
+
+
+def test_top_k_ranks_nan_last():
+    assert top_k([3.0, np.nan, 7.0, 5.0], 3).tolist() == [2, 3, 0]
+
+
+def test_keywordlist_honours_top():
+    coll = Collocations.from_df(COUNTS.to_frame("counts"))
+    coll.reference = REFERENCE
+    coll.coll["relevance"] = coll.associations(measures=["relevance"])["relevance"]
+
+    assert coll.keywordlist(top=1, counts=1, relevance=1) == ["hus"]
+    assert coll.keywordlist(counts=1, relevance=1, by="relevance") == ["tak", "hus"]
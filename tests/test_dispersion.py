@@ -52,3 +52,57 @@ class TestDispersion:
         d = dh.Dispersion(urn, wordbag="han")
         assert isinstance(d.sort(), dh.Dispersion)
         assert len(d.sort()) == len(d)
+
+
+class TestDispersionBatched:
+    def test_one_request_per_word_and_cached(self, monkeypatch, urn):
+        calls = []
+
+        def get_dispersion(urn, words=None, window=300, pr=100):
+            calls.append((urn, tuple(words)))
+            return pd.Series([len(words), 0, 1])
+
+        monkeypatch.setattr("dhlab.text.dispersion.get_dispersion", get_dispersion)
+        dh.text.dispersion.clear_dispersion_cache()
+
+        matrices = dh.Dispersion.from_urns([urn, "other"], {"pron": ["han", "hun"], "og": ["og"]})
+        assert list(matrices[urn].frame.columns) == ["pron", "og"]
+        assert matrices["other"].frame.pron.tolist() == [2, 0, 1]
+        assert len(calls) == 4
+
+        d = dh.Dispersion(urn, wordbag={"pron": ["han", "hun"]})
+        assert d.frame.shape == (3, 1)
+        assert len(calls) == 4
+
+    def test_cached_dispersions_are_copies(self, monkeypatch, urn):
+        monkeypatch.setattr(
+            "dhlab.text.dispersion.get_dispersion", lambda urn, words=None, window=300, pr=100: pd.Series([1, 2, 3])
+        )
+        dh.text.dispersion.clear_dispersion_cache()
+
+        first = dh.text.dispersion._cached_dispersion(urn, ("og",), 300, 100)
+        first.iloc[0] = 99
+        first.name = "changed"
+        again = dh.text.dispersion._cached_dispersion(urn, ("og",), 300, 100)
+        assert again.tolist() == [1, 2, 3] and again.name is None
+
+
+class TestLocalDispersion:
+    def test_rewindowing_is_local(self, monkeypatch, urn):
+        calls = []
+
+        def get_chunks(urn=None, chunk_size=300):
+            calls.append(chunk_size)
+            return [{"han": 1, "og": 2}, {"hun": 3}, {"han": 2}, {"og": 1}, {"han": 1}]
+
+        monkeypatch.setattr("dhlab.text.dispersion.get_chunks", get_chunks)
+        dh.text.dispersion.clear_dispersion_cache()
+
+        d = dh.Dispersion.local(urn, {"pron": ["han", "hun"]}, window=200, pr=100)
+        assert d.frame.pron.tolist() == [4, 5, 2, 1]
+        d = dh.Dispersion.local(urn, ["han"], window=300, pr=200)
+        assert d.frame.han.tolist() == [3, 3]
+        assert calls == [100]
+
+        with pytest.raises(ValueError):
+            dh.Dispersion.local(urn, "han", window=250)
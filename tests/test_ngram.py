@@ -0,0 +1,158 @@
+import pandas as pd
+import pytest
+
+import dhlab as dh
+from dhlab.ngram.cache import NgramSeriesCache, clear_ngram_cache
+from dhlab.ngram.nb_ngram import nb_ngram, ngram_conv
+from dhlab.ngram.store import NgramStore
+
+
+def _series(term, years=range(1990, 2000)):
+    return {"key": term, "values": [{"x": y, "y": len(term) / 100, "f": len(term)} for y in years]}
+
+
+@pytest.fixture
+def fake_ngram_api(monkeypatch):
+    requests = []
+
+    def get_ngram(terms, corpus="avis", lang="nob", session=None):
+        words = [t.strip() for t in terms.split(",")]
+        requests.append(words)
+        return [_series(w) if w != "ukjent" else [] for w in words]
+
+    monkeypatch.setattr("dhlab.ngram.nb_ngram.get_ngram", get_ngram)
+    clear_ngram_cache()
+    yield requests
+    clear_ngram_cache()
+
+
+class TestNgramCache:
+    def test_only_missing_terms_are_requested(self, fake_ngram_api):
+        df = nb_ngram("hus, båt", years=(1990, 1999))
+        assert list(df.columns) == ["hus", "båt"]
+
+        df = nb_ngram("båt, ukjent, tak", years=(1995, 1996), mode="absolute")
+        assert list(df.columns) == ["båt", "tak"]
+        assert df.index.tolist() == [1995, 1996]
+        assert df.loc[1995, "tak"] == 3
+
+        nb_ngram("ukjent, hus", years=(1990, 1991))
+        assert fake_ngram_api == [["hus", "båt"], ["ukjent", "tak"]]
+
+    def test_add_words_to_ngram(self, fake_ngram_api):
+        ngram = dh.Ngram(["hus"], from_year=1990, to_year=1999, doctype="avis")
+        ngram.add(["hus", "båt"])
+        assert list(ngram.frame.columns) == ["hus", "båt"]
+        assert fake_ngram_api == [["hus"], ["båt"]]
+
+    def test_add_words_to_ngram_book(self, fake_ngram_api, monkeypatch):
+        requests = []
+
+        def ngram_book(word=None, **query):
+            requests.append((list(word), query))
+            return pd.DataFrame({w: [len(w), len(w) + 1] for w in word}, index=["1990", "1991"])
+
+        monkeypatch.setattr("dhlab.ngram.ngram.ngram_book", ngram_book)
+        ngram = dh.NgramBook(["hus"], publisher="Gyldendal", from_year=1990, to_year=1991)
+        ngram.add(["hus", "båt"])
+
+        assert list(ngram.frame.columns) == ["hus", "båt"]
+        assert ngram.frame.loc["1991", "båt"] == 4
+        assert [words for words, _ in requests] == [["hus"], ["båt"]]
+        assert requests[1][1]["publisher"] == "Gyldendal"
+        assert requests[1][1]["period"] == (1990, 1991)
+
+    def test_series_are_cached_under_the_requested_term(self, monkeypatch):
+        def get_ngram(terms, corpus="avis", lang="nob", session=None):
+            # the API answers with its own spelling of the key
+            return [_series(t.strip().capitalize()) for t in terms.split(",")]
+
+        monkeypatch.setattr("dhlab.ngram.nb_ngram.get_ngram", get_ngram)
+        clear_ngram_cache()
+        assert list(nb_ngram("hus", years=(1990, 1999)).columns) == ["hus"]
+        assert list(nb_ngram("hus", years=(1990, 1999)).columns) == ["hus"]
+        clear_ngram_cache()
+
+    def test_keys_are_matched_when_entries_are_left_out(self, monkeypatch):
+        monkeypatch.setattr(
+            "dhlab.ngram.nb_ngram.get_ngram", lambda terms, **kwargs: [_series("BÅT ")]
+        )
+        clear_ngram_cache()
+        assert list(nb_ngram("ukjent, båt", years=(1990, 1999)).columns) == ["båt"]
+        clear_ngram_cache()
+
+    def test_use_cache_false_requests_again(self, fake_ngram_api):
+        nb_ngram("hus", years=(1990, 1999))
+        nb_ngram("hus", years=(1990, 1999), use_cache=False)
+        nb_ngram("hus", years=(1990, 1999))
+        assert fake_ngram_api == [["hus"], ["hus"]]
+
+    def test_memory_tier_expires(self):
+        cache = NgramSeriesCache(ttl=-1)
+        cache.set_many({"hus": _series("hus")["values"]}, "bok", "nob")
+        assert cache.get_many(["hus"], "bok", "nob") == {}
+
+    def test_disk_tier(self, tmp_path):
+        cache = NgramSeriesCache(path=str(tmp_path / "ngrams.sqlite"))
+        cache.set_many({"hus": _series("hus")["values"]}, "bok", "nob")
+        cache.close()
+
+        again = NgramSeriesCache(path=str(tmp_path / "ngrams.sqlite"))
+        assert list(again.get_many(["hus", "båt"], "bok", "nob")) == ["hus"]
+        assert again.get_many(["hus"], "avis", None) == {}
+
+
+def test_ngram_conv_matches_pandas_rolling():
+    payload = [_series("hus"), [], _series("båt", years=range(1992, 2005))]
+    expected = pd.DataFrame(
+        {p["key"]: {z["x"]: z["y"] for z in p["values"] if 1990 <= z["x"] <= 2001} for p in payload if p}
+    ).sort_index().rolling(window=3, win_type="triang").mean()
+
+    pd.testing.assert_frame_equal(ngram_conv(payload, smooth=3, years=(1990, 2001)), expected, check_index_type=False)
+
+
+class TestNgramStore:
+    @pytest.fixture
+    def fake_ngram_doc(self, monkeypatch):
+        requests = []
+
+        def ngram_doc(doctype, word=None, period=None, max_workers=None, **filters):
+            requests.append((list(word), period))
+            # the index lags: nothing after 1996
+            years = [str(y) for y in range(period[0], min(period[1], 1996) + 1)]
+            return pd.DataFrame({w: [len(w) + int(y) % 10 for y in years] for w in word if w != "ukjent"}, index=years)
+
+        monkeypatch.setattr("dhlab.ngram.store._ngram_doc", ngram_doc)
+        return requests
+
+    def test_refresh_requests_only_new_periods(self, tmp_path, fake_ngram_doc):
+        pytest.importorskip("pyarrow")
+        store = NgramStore(str(tmp_path))
+        assert store.refresh(["hus", "ukjent"], first=1990, last=1995) == {"hus": 6, "ukjent": 0}
+
+        # a new process sees the same manifest
+        store = NgramStore(str(tmp_path))
+        assert store.last_periods() == {"hus": "1995"}
+        store.refresh(["hus", "ukjent", "båt"], first=1990, last=1998)
+        assert store.last_periods() == {"hus": "1996", "båt": "1996"}
+        store.refresh(["hus"], last=1999)
+        assert fake_ngram_doc == [
+            (["hus", "ukjent"], (1990, 1995)),
+            (["hus"], (1995, 1998)),
+            (["ukjent", "båt"], (1990, 1998)),
+            (["hus"], (1996, 1999)),
+        ]
+
+        df = store.get(["hus", "båt", "ukjent"])
+        assert list(df.columns) == ["hus", "båt"]
+        assert df.index.tolist() == [str(y) for y in range(1990, 1997)]
+        assert df.loc["1996", "hus"] == 9
+        assert store.get(["hus"], title="Aftenposten").empty
+
+    def test_refresh_rejects_mixed_period_formats(self, tmp_path, fake_ngram_doc):
+        pytest.importorskip("pyarrow")
+        store = NgramStore(str(tmp_path))
+        store.refresh(["hus"], first=1990, last=1995)
+        with pytest.raises(ValueError):
+            store.refresh(["hus"], last=19960101)
+        assert len(fake_ngram_doc) == 1
@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from dhlab.api.sparse import SparseCounts
+from dhlab.text.conc_coll import Collocations, Counts
+from dhlab.text.corpus import Corpus
+
+STRUCTURE = {
+    100000001: {"og": 3, "hus": 1},
+    100000002: {"og": 2, "båt": 5},
+    100000003: {},
+}
+
+
+class TestPersistence:
+    def test_corpus_parquet_keeps_dtypes(self, tmp_path):
+        frame = pd.DataFrame(
+            {"dhlabid": [1, 2], "urn": ["URN:NBN:no-nb_digibok_1", "URN:NBN:no-nb_digibok_2"], "year": [1900, 1901]}
+        )
+        path = tmp_path / "corpus.parquet"
+        Corpus.from_df(frame).to_parquet(path)
+
+        pd.testing.assert_frame_equal(Corpus.from_parquet(path).frame, frame)
+        assert list(Corpus.from_parquet(path, columns=["urn"]).frame.columns) == ["urn"]
+
+    def test_collocations_feather_keeps_index(self, tmp_path):
+        frame = pd.DataFrame({"counts": [4, 2]}, index=pd.Index(["og", "hus"], name="word"))
+        path = tmp_path / "coll.feather"
+        Collocations.from_df(frame).to_feather(path)
+
+        pd.testing.assert_frame_equal(Collocations.from_feather(path, columns=["counts"]).frame, frame)
+
+    @pytest.mark.parametrize("fmt", ["parquet", "feather"])
+    def test_counts_round_trip_as_coo(self, tmp_path, fmt):
+        counts = Counts.from_sparse_counts(SparseCounts.from_dict(STRUCTURE))
+        path = tmp_path / f"counts.{fmt}"
+        getattr(counts, f"to_{fmt}")(path)
+
+        loaded = getattr(Counts, f"from_{fmt}")(path, memory_map=True)
+        assert loaded.is_sparse()
+        pd.testing.assert_frame_equal(loaded.frame, counts.frame)
+
+        subset = getattr(Counts, f"from_{fmt}")(path, columns=[100000002])
+        assert subset.matrix.shape == (2, 1)
+        assert subset.frame[100000002].sum() == 7